@@ -1,12 +1,20 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
 from database import get_db
-from models.schemas import BulkUploadResponse, BulkUploadStatus, WilayaResponse, SerieResponse, SessionResponse
+from models.schemas import (
+    BulkUploadResponse, BulkUploadStatus, WilayaResponse, EtablissementResponse, SerieResponse, SessionResponse
+)
 from services.upload_service import UploadService
+from services.publication_service import PublicationService
+from services.rollup_service import RollupService
+from services.partition_service import PartitionService
+from services.archive_service import ArchiveService
+from services.search_projection_service import SearchProjectionService
 from core.security import get_current_user, require_permission
-from models.database import AdminUser, RefWilaya, RefSerie, ExamSession
+from models.database import AdminUser, RefWilaya, RefEtablissement, RefSerie, ExamSession
 
 router = APIRouter(prefix="/admin", tags=["Administration"])
 
@@ -45,9 +53,9 @@ async def upload_bulk_results(
 async def get_upload_status(
     task_id: str,
     db: Session = Depends(get_db),
-    # current_user: AdminUser = Depends(get_current_user)
+    current_user: AdminUser = Depends(get_current_user)
 ):
-    """Récupère le statut d'un upload en cours"""
+    """Récupère le statut d'un upload en cours (administrateur lu dans le cache des jetons)"""
     
     service = UploadService(db)
     status = service.get_upload_status(task_id)
@@ -102,6 +110,81 @@ async def create_serie(
     
     return SerieResponse.from_orm(serie)
 
+@router.put("/wilayas/{wilaya_id}", response_model=WilayaResponse)
+async def update_wilaya(
+    wilaya_id: int,
+    name_fr: str = Form(..., description="Nom en français"),
+    name_ar: str = Form(..., description="Nom en arabe"),
+    db: Session = Depends(get_db),
+    # current_user: AdminUser = Depends(get_current_user)
+):
+    """Renommer une wilaya (recopiée dans la projection de recherche)"""
+    
+    wilaya = db.query(RefWilaya).filter(RefWilaya.id == wilaya_id).first()
+    if not wilaya:
+        raise HTTPException(status_code=404, detail="Wilaya non trouvée")
+    
+    wilaya.name_fr = name_fr
+    wilaya.name_ar = name_ar
+    db.commit()
+    await PublicationService(db).refresh_references(wilaya_id=wilaya.id)
+    db.refresh(wilaya)
+    
+    return WilayaResponse.from_orm(wilaya)
+
+@router.put("/etablissements/{etablissement_id}", response_model=EtablissementResponse)
+async def update_etablissement(
+    etablissement_id: int,
+    name_fr: str = Form(..., description="Nom en français"),
+    name_ar: str = Form(..., description="Nom en arabe"),
+    type_etablissement: Optional[str] = Form(None, description="Type d'établissement (inchangé si absent)"),
+    db: Session = Depends(get_db),
+    # current_user: AdminUser = Depends(get_current_user)
+):
+    """Renommer un établissement (recopié dans la projection de recherche)"""
+    
+    etablissement = db.query(RefEtablissement).filter(RefEtablissement.id == etablissement_id).first()
+    if not etablissement:
+        raise HTTPException(status_code=404, detail="Établissement non trouvé")
+    
+    etablissement.name_fr = name_fr
+    etablissement.name_ar = name_ar
+    if type_etablissement:
+        etablissement.type_etablissement = type_etablissement
+    db.commit()
+    await PublicationService(db).refresh_references(etablissement_id=etablissement.id)
+    db.refresh(etablissement)
+    
+    return EtablissementResponse.from_orm(etablissement)
+
+@router.put("/series/{serie_id}", response_model=SerieResponse)
+async def update_serie(
+    serie_id: int,
+    code: str = Form(..., description="Code de la série (ex: SN)"),
+    name_fr: str = Form(..., description="Nom en français"),
+    name_ar: str = Form(..., description="Nom en arabe"),
+    db: Session = Depends(get_db),
+    # current_user: AdminUser = Depends(get_current_user)
+):
+    """Modifier une série (recopiée dans la projection de recherche)"""
+    
+    serie = db.query(RefSerie).filter(RefSerie.id == serie_id).first()
+    if not serie:
+        raise HTTPException(status_code=404, detail="Série non trouvée")
+    
+    existing = db.query(RefSerie).filter(RefSerie.code == code, RefSerie.id != serie_id).first()
+    if existing:
+        raise HTTPException(status_code=400, detail="Série avec ce code existe déjà")
+    
+    serie.code = code
+    serie.name_fr = name_fr
+    serie.name_ar = name_ar
+    db.commit()
+    await PublicationService(db).refresh_references(serie_id=serie.id)
+    db.refresh(serie)
+    
+    return SerieResponse.from_orm(serie)
+
 @router.post("/sessions", response_model=SessionResponse)
 async def create_session(
     year: int = Form(..., description="Année de l'examen"),
@@ -130,8 +213,138 @@ async def create_session(
     db.commit()
     db.refresh(session)
     
+    # Partition de la session dans exam_results (base partitionnée) ; DDL hors de la boucle d'événements
+    try:
+        await run_in_threadpool(PartitionService(db).create_partition, session.id)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
     return SessionResponse.from_orm(session)
 
+@router.post("/sessions/{session_id}/publish", response_model=SessionResponse, status_code=202)
+async def publish_session(
+    session_id: int,
+    db: Session = Depends(get_db),
+    # current_user: AdminUser = Depends(require_permission("publish_results"))
+):
+    """Publier une session ; classements et données dérivées sont recalculés en tâche de fond"""
+    
+    service = PublicationService(db)
+    session = await service.publish_session(session_id)
+    
+    if not session:
+        raise HTTPException(status_code=404, detail="Session non trouvée")
+    
+    return SessionResponse.from_orm(session)
+
+@router.post("/sessions/{session_id}/archive")
+async def archive_session(
+    session_id: int,
+    db: Session = Depends(get_db),
+    current_user: AdminUser = Depends(require_permission("publish_results"))
+):
+    """Archiver une session : sa partition est détachée de la table des résultats"""
+    
+    try:
+        # DDL (verrous, validation de la contrainte) : hors de la boucle d'événements
+        result = await run_in_threadpool(PartitionService(db).archive_session, session_id)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    if not result:
+        raise HTTPException(status_code=404, detail="Session non trouvée")
+    
+    # Résultats retirés de (ou rendus à) la table : nouvelle génération pour les caches de la session
+    await PublicationService(db).invalidate_sessions([session_id])
+    return result
+
+@router.post("/sessions/{session_id}/unarchive")
+async def unarchive_session(
+    session_id: int,
+    db: Session = Depends(get_db),
+    current_user: AdminUser = Depends(require_permission("publish_results"))
+):
+    """Désarchiver une session : sa partition est rattachée à la table des résultats"""
+    
+    try:
+        # DDL (verrous, validation de la contrainte) : hors de la boucle d'événements
+        result = await run_in_threadpool(PartitionService(db).unarchive_session, session_id)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    if not result:
+        raise HTTPException(status_code=404, detail="Session non trouvée")
+    
+    # Résultats retirés de (ou rendus à) la table : nouvelle génération pour les caches de la session
+    await PublicationService(db).invalidate_sessions([session_id])
+    return result
+
+@router.post("/sessions/{session_id}/cold-archive")
+async def cold_archive_session(
+    session_id: int,
+    db: Session = Depends(get_db),
+    current_user: AdminUser = Depends(require_permission("publish_results"))
+):
+    """Archive froide : résultats exportés en Parquet puis supprimés de la base"""
+    
+    try:
+        # Export de toute une session : hors de la boucle d'événements
+        result = await run_in_threadpool(ArchiveService(db).archive_session, session_id)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    if not result:
+        raise HTTPException(status_code=404, detail="Session non trouvée")
+    
+    return result
+
+@router.post("/sessions/{session_id}/restore")
+async def restore_session(
+    session_id: int,
+    db: Session = Depends(get_db),
+    current_user: AdminUser = Depends(require_permission("publish_results"))
+):
+    """Restaurer une session en archive froide : ses résultats sont rechargés dans la base"""
+    
+    try:
+        result = await run_in_threadpool(ArchiveService(db).restore_session, session_id)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    if not result:
+        raise HTTPException(status_code=404, detail="Session non trouvée")
+    
+    return result
+
+@router.get("/partitions")
+async def list_partitions(
+    db: Session = Depends(get_db),
+    # current_user: AdminUser = Depends(get_current_user)
+):
+    """Partitions de exam_results par session : rattachement, lignes et taille"""
+    
+    return PartitionService(db).list_partitions()
+
+@router.post("/rollup/rebuild")
+async def rebuild_rollup(
+    db: Session = Depends(get_db),
+    # current_user: AdminUser = Depends(require_permission("publish_results"))
+):
+    """Construire les agrégats des sessions publiées avant l'introduction de results_rollup"""
+    
+    service = RollupService(db)
+    return {"sessions_rebuilt": service.rebuild_missing()}
+
+@router.post("/search/rebuild")
+async def rebuild_search_projection(
+    db: Session = Depends(get_db),
+    # current_user: AdminUser = Depends(require_permission("publish_results"))
+):
+    """Reconstruire la projection de recherche (mise en service, modification directe en base)"""
+    
+    service = SearchProjectionService(db)
+    return {"sessions_rebuilt": await run_in_threadpool(service.rebuild_all)}
+
 @router.get("/sessions", response_model=List[SessionResponse])
 async def list_sessions(
     db: Session = Depends(get_db),
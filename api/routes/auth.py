@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
@@ -6,22 +6,36 @@ from datetime import datetime, timedelta
 from database import get_db
 from models.database import AdminUser
 from models.schemas import Token, UserLogin, UserResponse
-from core.security import verify_password, create_access_token, get_current_user
+from core.security import verify_and_update_password, create_access_token, get_current_user
+from core.login_guard import login_guard
+from core.admission import client_id
 from config import settings
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
 @router.post("/login", response_model=Token)
 async def login(
+    request: Request,
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: Session = Depends(get_db)
 ):
     """Authentification des utilisateurs administrateurs"""
     
+    # Trop d'échecs récents pour ce nom ou cette adresse : refus avant lecture en base et hachage
+    client = client_id(request.scope)
+    retry_after = await login_guard.retry_after(form_data.username, client)
+    if retry_after:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Trop de tentatives de connexion, réessayez plus tard",
+            headers={"Retry-After": str(retry_after)},
+        )
+    
     # Récupérer l'utilisateur
     user = db.query(AdminUser).filter(AdminUser.username == form_data.username).first()
     
     if not user:
+        await login_guard.record_failure(form_data.username, client)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Nom d'utilisateur ou mot de passe incorrect",
@@ -35,21 +49,23 @@ async def login(
             detail="Compte verrouillé. Contactez l'administrateur.",
         )
     
-    # Vérifier le mot de passe
-    if not verify_password(form_data.password, user.password_hash):
-        # Incrémenter les tentatives de connexion
-        user.login_attempts += 1
-        if user.login_attempts >= 5:
-            user.is_locked = True
-        db.commit()
-        
+    # Vérifier le mot de passe (bcrypt dans le pool de hachage, hors de la boucle)
+    valid, new_hash = await verify_and_update_password(form_data.password, user.password_hash)
+    if not valid:
+        # Tentatives écrites par lots ; verrouillage immédiat au seuil
+        await login_guard.record_failure(form_data.username, client, user.login_attempts or 0)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Nom d'utilisateur ou mot de passe incorrect",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    # Hachage d'un autre coût que BCRYPT_ROUNDS : remplacé par un hachage au coût courant
+    if new_hash:
+        user.password_hash = new_hash
+    
     # Réinitialiser les tentatives de connexion
+    await login_guard.record_success(form_data.username)
     user.login_attempts = 0
     user.last_login = datetime.utcnow()
     db.commit()
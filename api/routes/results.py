@@ -1,20 +1,25 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, Path
+from fastapi import APIRouter, Depends, HTTPException, Query, Path, Request
+from fastapi.responses import Response, StreamingResponse
 from sqlalchemy.orm import Session
 from typing import Optional, List
 import uuid
+import os
 
 from database import get_db
+from core.coalescing import request_coalescer, negotiate_media_type, serialize
 from models.schemas import (
     SearchParams, SearchResponse, ExamResultDetailResponse,
-    SocialShareCreate, SocialShareResponse
+    SocialShareCreate, SocialShareResponse, BatchLookupRequest, BatchLookupResponse
 )
 from services.results_service import ResultsService
 from services.social_service import SocialService
+from services.export_service import ExportService, EXPORT_FORMATS
 
 router = APIRouter(prefix="/results", tags=["Results"])
 
 @router.get("/search", response_model=SearchResponse)
 async def search_results(
+    request: Request,
     nni: Optional[str] = Query(None, description="Numéro National d'Identification"),
     numero_dossier: Optional[str] = Query(None, description="Numéro de dossier"),
     nom: Optional[str] = Query(None, description="Nom du candidat (recherche floue)"),
@@ -27,9 +32,16 @@ async def search_results(
     exam_type: Optional[str] = Query(None, description="Type d'examen (bac, bepc, concours)"),
     page: int = Query(1, ge=1, description="Numéro de page"),
     size: int = Query(50, ge=1, le=1000, description="Nombre de résultats par page"),
+    fields: Optional[str] = Query(None, description="Champs à renvoyer, séparés par des virgules (ex. nni,nom_complet_fr,decision)"),
+    compact: bool = Query(False, description="Résultats en lignes (tableaux), la première étant l'en-tête"),
     db: Session = Depends(get_db)
 ):
-    """Recherche des résultats d'examens avec filtres multiples"""
+    """Recherche des résultats d'examens avec filtres multiples (JSON, ou MessagePack selon Accept)"""
+    
+    try:
+        selected_fields = ResultsService.parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     search_params = SearchParams(
         nni=nni,
@@ -43,21 +55,110 @@ async def search_results(
         year=year,
         exam_type=exam_type,
         page=page,
-        size=size
+        size=size,
+        fields=selected_fields,
+        compact=compact
     )
     
     service = ResultsService(db)
-    return await service.search_results(search_params)
+    return await request_coalescer.respond(
+        request, service.search_results, search_params,
+        media_type=negotiate_media_type(request.headers.get("accept", ""))
+    )
+
+@router.post("/batch", response_model=BatchLookupResponse)
+async def batch_lookup(
+    request: BatchLookupRequest,
+    db: Session = Depends(get_db)
+):
+    """Résultats d'une liste de candidats d'une session (NNI ou n° de dossier), dans l'ordre demandé"""
+    
+    service = ResultsService(db)
+    try:
+        response = await service.batch_lookup(request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if not response:
+        raise HTTPException(status_code=404, detail="Session non trouvée")
+    return response
+
+@router.get("/export")
+async def export_results(
+    request: Request,
+    year: int = Query(..., description="Année de l'examen"),
+    exam_type: str = Query(..., description="Type d'examen (bac, bepc, concours)"),
+    fmt: str = Query("csv", alias="format", description="Format: csv ou parquet"),
+    wilaya_id: Optional[int] = Query(None, description="ID de la wilaya"),
+    etablissement_id: Optional[int] = Query(None, description="ID de l'établissement"),
+    serie_id: Optional[int] = Query(None, description="ID de la série"),
+    offset: int = Query(0, ge=0, description="Reprendre l'export à partir de cette ligne"),
+    db: Session = Depends(get_db)
+):
+    """Export en flux de tous les résultats d'une session (CSV ou Parquet)"""
+    
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Format non supporté. Utilisez {' ou '.join(EXPORT_FORMATS)}.")
+    
+    service = ExportService(db)
+    session = service.get_session(year, exam_type)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session non trouvée")
+    
+    filters = {"wilaya_id": wilaya_id, "etablissement_id": etablissement_id, "serie_id": serie_id}
+    headers = {"Content-Disposition": f'attachment; filename="resultats_{exam_type}_{year}.{fmt}"'}
+    
+    # Session figée déjà exportée : fichier en cache, reprise par Range
+    path = service.cache_path(session, fmt, filters)
+    if path and offset == 0 and os.path.exists(path):
+        size = os.path.getsize(path)
+        try:
+            byte_range = service.parse_range(request.headers.get("range"), size)
+        except ValueError as e:
+            raise HTTPException(status_code=416, detail=str(e), headers={"Content-Range": f"bytes */{size}"})
+        
+        start, end = byte_range or (0, size - 1)
+        headers["Accept-Ranges"] = "bytes"
+        headers["Content-Length"] = str(end - start + 1)
+        status_code = 200
+        if byte_range:
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            # Les plages portent sur le fichier brut : pas de recompression gzip
+            headers["Content-Encoding"] = "identity"
+            status_code = 206
+        
+        return StreamingResponse(
+            service.iter_file(path, start, end),
+            status_code=status_code,
+            media_type=EXPORT_FORMATS[fmt],
+            headers=headers
+        )
+    
+    return StreamingResponse(
+        service.stream(session, fmt, filters, offset),
+        media_type=EXPORT_FORMATS[fmt],
+        headers=headers
+    )
 
 @router.get("/{result_id}", response_model=ExamResultDetailResponse)
 async def get_result_detail(
+    request: Request,
     result_id: uuid.UUID = Path(..., description="ID du résultat"),
+    fields: Optional[str] = Query(None, description="Champs à renvoyer, séparés par des virgules"),
     db: Session = Depends(get_db)
 ):
-    """Récupère les détails complets d'un résultat"""
+    """Récupère les détails d'un résultat (tous les champs ou ceux de fields ; JSON ou MessagePack)"""
     
     service = ResultsService(db)
-    result = service.get_result_by_id(result_id)
+    try:
+        selected_fields = service.parse_fields(fields, detail=True)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if selected_fields:
+        result = service.get_result_fields(result_id, selected_fields)
+    else:
+        result = service.get_result_by_id(result_id)
     
     if not result:
         raise HTTPException(status_code=404, detail="Result not found")
@@ -65,7 +166,10 @@ async def get_result_detail(
     # Incrémenter le compteur de vues
     service.increment_view_count(result_id)
     
-    return ExamResultDetailResponse.from_orm(result)
+    if not selected_fields:
+        result = ExamResultDetailResponse.from_orm(result)
+    media_type = negotiate_media_type(request.headers.get("accept", ""))
+    return Response(content=serialize(result, media_type), media_type=media_type, headers={"Vary": "Accept"})
 
 @router.post("/{result_id}/share", response_model=SocialShareResponse)
 async def create_social_share(
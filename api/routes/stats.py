@@ -1,15 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, Path
+from fastapi import APIRouter, Depends, HTTPException, Query, Path, Request
 from sqlalchemy.orm import Session
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 
+from config import settings
 from database import get_db
+from core.coalescing import request_coalescer, own_session
+from core.response_store import response_store
 from models.schemas import StatsWilaya, StatsEtablissement
 from services.stats_service import StatsService
+from services.distribution_service import DistributionService
+from services.trends_service import TrendsService
 
 router = APIRouter(prefix="/stats", tags=["Statistics"])
 
 @router.get("/wilaya/{wilaya_id}", response_model=StatsWilaya)
 async def get_wilaya_statistics(
+    request: Request,
     wilaya_id: int = Path(..., description="ID de la wilaya"),
     year: int = Query(..., description="Année de l'examen"),
     exam_type: str = Query(..., description="Type d'examen (bac, bepc, concours)"),
@@ -18,15 +24,15 @@ async def get_wilaya_statistics(
     """Récupère les statistiques d'une wilaya pour une année donnée"""
     
     service = StatsService(db)
-    stats = await service.get_wilaya_stats(wilaya_id, year, exam_type)
-    
-    if not stats:
-        raise HTTPException(status_code=404, detail="Statistiques non trouvées")
-    
-    return stats
+    return await response_store.respond(
+        request, {"wilaya_id": wilaya_id, "year": year, "exam_type": exam_type},
+        service.get_wilaya_stats, wilaya_id, year, exam_type,
+        not_found="Statistiques non trouvées"
+    )
 
 @router.get("/etablissement/{etablissement_id}", response_model=StatsEtablissement)
 async def get_etablissement_statistics(
+    request: Request,
     etablissement_id: int = Path(..., description="ID de l'établissement"),
     year: int = Query(..., description="Année de l'examen"),
     exam_type: str = Query(..., description="Type d'examen (bac, bepc, concours)"),
@@ -35,15 +41,15 @@ async def get_etablissement_statistics(
     """Récupère les statistiques d'un établissement pour une année donnée"""
     
     service = StatsService(db)
-    stats = await service.get_etablissement_stats(etablissement_id, year, exam_type)
-    
-    if not stats:
-        raise HTTPException(status_code=404, detail="Statistiques non trouvées")
-    
-    return stats
+    return await response_store.respond(
+        request, {"etablissement_id": etablissement_id, "year": year, "exam_type": exam_type},
+        service.get_etablissement_stats, etablissement_id, year, exam_type,
+        not_found="Statistiques non trouvées"
+    )
 
 @router.get("/global")
 async def get_global_statistics(
+    request: Request,
     year: int = Query(..., description="Année de l'examen"),
     exam_type: str = Query(..., description="Type d'examen (bac, bepc, concours)"),
     db: Session = Depends(get_db)
@@ -51,37 +57,104 @@ async def get_global_statistics(
     """Récupère les statistiques globales pour une année donnée"""
     
     service = StatsService(db)
-    stats = service.get_global_stats(year, exam_type)
+    return await response_store.respond(
+        request, {"year": year, "exam_type": exam_type},
+        service.get_global_stats, year, exam_type,
+        not_found="Statistiques non trouvées"
+    )
+
+@router.get("/distribution")
+async def get_distribution_statistics(
+    request: Request,
+    year: int = Query(..., description="Année de l'examen"),
+    exam_type: str = Query(..., description="Type d'examen (bac, bepc, concours)"),
+    group_by: str = Query("national", description="Dimension: national, wilaya, serie, etablissement"),
+    group_id: Optional[int] = Query(None, description="Limiter à une wilaya, série ou établissement"),
+    bins: int = Query(20, ge=1, le=200, description="Nombre de classes de l'histogramme"),
+    db: Session = Depends(get_db)
+) -> Dict[str, Any]:
+    """Distribution des moyennes : médiane, quartiles, écart-type, histogramme et mentions"""
+    
+    service = DistributionService(db)
+    try:
+        return await request_coalescer.respond(
+            request, service.get_distribution, year, exam_type, group_by, group_id, bins,
+            not_found="Statistiques non trouvées"
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/trends")
+async def get_trends(
+    request: Request,
+    exam_type: str = Query(..., description="Type d'examen (bac, bepc, concours)"),
+    from_year: Optional[int] = Query(None, description="Première année incluse"),
+    to_year: Optional[int] = Query(None, description="Dernière année incluse"),
+    wilaya_id: Optional[int] = Query(None, description="Filtrer par wilaya"),
+    etablissement_id: Optional[int] = Query(None, description="Filtrer par établissement"),
+    serie_id: Optional[int] = Query(None, description="Filtrer par série"),
+    sexe: Optional[str] = Query(None, pattern="^[MF]$", description="Filtrer par sexe (M/F)"),
+    db: Session = Depends(get_db)
+) -> Dict[str, Any]:
+    """Évolution d'année en année du taux de réussite et de la moyenne"""
     
-    if not stats:
-        raise HTTPException(status_code=404, detail="Statistiques non trouvées")
+    service = TrendsService(db)
+    return await request_coalescer.respond(
+        request, service.get_trends, exam_type, from_year, to_year, wilaya_id, etablissement_id, serie_id, sexe
+    )
+
+@router.get("/compare")
+async def compare_years(
+    request: Request,
+    exam_type: str = Query(..., description="Type d'examen (bac, bepc, concours)"),
+    years: List[int] = Query(..., description="Années à comparer (paramètre répété)"),
+    group_by: str = Query("wilaya", description="Dimension: wilaya, etablissement, serie, sexe"),
+    db: Session = Depends(get_db)
+) -> Dict[str, Any]:
+    """Compare plusieurs années par wilaya, établissement, série ou sexe"""
     
-    return stats
+    service = TrendsService(db)
+    try:
+        return await request_coalescer.respond(request, service.compare_years, exam_type, years, group_by)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/top-students")
 async def get_top_students(
+    request: Request,
     year: int = Query(..., description="Année de l'examen"),
     exam_type: str = Query(..., description="Type d'examen (bac, bepc, concours)"),
-    limit: int = Query(10, description="Nombre d'élèves à retourner"),
+    limit: int = Query(10, ge=1, le=settings.leaderboard_size, description="Nombre d'élèves à retourner"),
+    wilaya_id: Optional[int] = Query(None, description="Limiter le classement à une wilaya"),
+    serie_id: Optional[int] = Query(None, description="Limiter le classement à une série"),
     db: Session = Depends(get_db)
 ) -> Dict[str, Any]:
     """Récupère le top des élèves pour une année donnée"""
     
     service = StatsService(db)
-    top_students = service.get_top_students(year, exam_type, limit)
     
-    return {"top_students": top_students}
+    async def compute():
+        top_students = await own_session(service.get_top_students)(year, exam_type, limit, wilaya_id, serie_id)
+        return {"top_students": top_students}
+    
+    params = {"year": year, "exam_type": exam_type, "limit": limit, "wilaya_id": wilaya_id, "serie_id": serie_id}
+    return await response_store.respond(request, params, compute)
 
 @router.get("/top-schools")
 async def get_top_schools(
+    request: Request,
     year: int = Query(..., description="Année de l'examen"),
     exam_type: str = Query(..., description="Type d'examen (bac, bepc, concours)"),
-    limit: int = Query(10, description="Nombre d'écoles à retourner"),
+    limit: int = Query(10, ge=1, le=settings.leaderboard_size, description="Nombre d'écoles à retourner"),
+    wilaya_id: Optional[int] = Query(None, description="Limiter le classement à une wilaya"),
     db: Session = Depends(get_db)
 ) -> Dict[str, Any]:
     """Récupère le top des écoles pour une année donnée"""
     
     service = StatsService(db)
-    top_schools = service.get_top_schools(year, exam_type, limit)
     
-    return {"top_schools": top_schools}
\ No newline at end of file
+    async def compute():
+        return {"top_schools": await own_session(service.get_top_schools)(year, exam_type, limit, wilaya_id)}
+    
+    params = {"year": year, "exam_type": exam_type, "limit": limit, "wilaya_id": wilaya_id}
+    return await response_store.respond(request, params, compute)
\ No newline at end of file
@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+Banc de charge de l'API publique : rejoue un trafic type « jour des résultats »
+
+Usage:
+    python -m benchmarks.load_test                                  # in-process (main:app)
+    python -m benchmarks.load_test --url http://localhost:8000      # uvicorn local
+    python -m benchmarks.load_test --seed-rows 200000 --requests 5000 --concurrency 32
+    python -m benchmarks.load_test --save-baseline                  # enregistre la référence
+    python -m benchmarks.load_test --fail-on-regression             # code 1 si régression
+    python -m benchmarks.load_test --accept-encoding gzip           # compare les encodages (colonne ko/req)
+
+Le mélange de trafic suit TRAFFIC_MIX : surtout des recherches par NNI, puis
+statistiques et pages de partage, puis recherches par nom.
+"""
+
+import argparse
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import httpx
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+
+# (route, poids) : part de chaque type de requête dans le trafic rejoué
+TRAFFIC_MIX = [
+    ("results.search_nni", 60),
+    ("stats.global", 5),
+    ("stats.wilaya", 5),
+    ("stats.top_students", 4),
+    ("stats.top_schools", 4),
+    ("share.page", 12),
+    ("results.search_nom", 10),
+    ("results.search_page", 2),
+    ("references.etablissements", 3)
+]
+
+# Nombre de requêtes SQL de la requête HTTP en cours (mode in-process)
+_query_counter: contextvars.ContextVar[Optional[List[int]]] = contextvars.ContextVar("bench_queries", default=None)
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    counter = _query_counter.get()
+    if counter is not None:
+        counter[0] += 1
+
+class Dataset:
+    """Échantillon déterministe de candidats, sessions et wilayas servant à construire les requêtes"""
+
+    def __init__(self, sample_size: int):
+        from sqlalchemy import select
+        from database import SessionLocal
+        from models.database import ExamResult, ExamSession, RefWilaya
+
+        db = SessionLocal()
+        try:
+            rows = db.execute(
+                select(ExamResult.id, ExamResult.nni, ExamResult.nom_complet_fr)
+                .where(ExamResult.is_published == True)
+                .order_by(ExamResult.id)
+                .limit(sample_size)
+            ).all()
+            self.sessions = [
+                (s.year, s.exam_type) for s in
+                db.query(ExamSession).filter(ExamSession.is_published == True).order_by(ExamSession.id).all()
+            ]
+            self.wilayas = [w.id for w in db.query(RefWilaya).order_by(RefWilaya.id).all()]
+        finally:
+            db.close()
+
+        if not rows or not self.sessions:
+            raise SystemExit("Aucun résultat publié : lancez generate_test_data.py ou utilisez --seed-rows")
+
+        self.result_ids = [str(r.id) for r in rows]
+        self.nnis = [r.nni for r in rows]
+        # Recherche par nom : le dernier mot (nom de famille), comme saisi par les utilisateurs
+        self.noms = sorted({r.nom_complet_fr.split()[-1] for r in rows})
+        self.share_tokens: List[str] = []
+
+    async def create_shares(self, client: httpx.AsyncClient, count: int, rng: random.Random):
+        for result_id in rng.sample(self.result_ids, min(count, len(self.result_ids))):
+            response = await client.post(
+                f"/results/{result_id}/share", json={"result_id": result_id, "platform": "whatsapp"}
+            )
+            if response.status_code == 200:
+                self.share_tokens.append(response.json()["share_token"])
+
+    def build_request(self, route: str, rng: random.Random) -> str:
+        year, exam_type = rng.choice(self.sessions)
+        if route == "results.search_nni":
+            return f"/results/search?nni={rng.choice(self.nnis)}"
+        if route == "results.search_nom":
+            return f"/results/search?nom={rng.choice(self.noms)}&year={year}&exam_type={exam_type}&size=20"
+        if route == "stats.global":
+            return f"/stats/global?year={year}&exam_type={exam_type}"
+        if route == "stats.wilaya":
+            return f"/stats/wilaya/{rng.choice(self.wilayas)}?year={year}&exam_type={exam_type}"
+        if route == "stats.top_students":
+            return f"/stats/top-students?year={year}&exam_type={exam_type}&limit=10"
+        if route == "stats.top_schools":
+            return f"/stats/top-schools?year={year}&exam_type={exam_type}&limit=10"
+        if route == "results.search_page":
+            # Grande page de résultats d'une session (listes affichées par les établissements)
+            return f"/results/search?year={year}&exam_type={exam_type}&size=1000"
+        if route == "references.etablissements":
+            return "/references/etablissements"
+        if route == "share.page":
+            return f"/share/{rng.choice(self.share_tokens)}"
+        raise ValueError(route)
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.queries: Dict[str, List[int]] = {}
+        self.sizes: Dict[str, List[int]] = {}
+        self.errors: Dict[str, int] = {}
+
+    def add(self, route: str, latency: float, status: int, queries: Optional[int], size: int):
+        self.latencies.setdefault(route, []).append(latency)
+        self.sizes.setdefault(route, []).append(size)
+        if queries is not None:
+            self.queries.setdefault(route, []).append(queries)
+        if status >= 400:
+            self.errors[route] = self.errors.get(route, 0) + 1
+
+    def summary(self, elapsed: float) -> Dict[str, Dict[str, float]]:
+        routes = {}
+        every = []
+        for route, values in sorted(self.latencies.items()):
+            every.extend(values)
+            routes[route] = self._stats(
+                values, elapsed, self.errors.get(route, 0), self.queries.get(route), self.sizes[route]
+            )
+        all_queries = [q for values in self.queries.values() for q in values] or None
+        all_sizes = [size for values in self.sizes.values() for size in values]
+        routes["TOTAL"] = self._stats(every, elapsed, sum(self.errors.values()), all_queries, all_sizes)
+        return routes
+
+    @staticmethod
+    def _stats(values: List[float], elapsed: float, errors: int, queries: Optional[List[int]], sizes: List[int]):
+        ms = np.array(values) * 1000
+        return {
+            "count": len(values),
+            "errors": errors,
+            "rps": round(len(values) / elapsed, 1),
+            "mean_ms": round(float(ms.mean()), 2),
+            "p50_ms": round(float(np.percentile(ms, 50)), 2),
+            "p95_ms": round(float(np.percentile(ms, 95)), 2),
+            "p99_ms": round(float(np.percentile(ms, 99)), 2),
+            "queries_per_request": round(float(np.mean(queries)), 2) if queries else None,
+            # Octets reçus (corps compressé tel que transmis)
+            "kb_per_request": round(float(np.mean(sizes)) / 1024, 2)
+        }
+
+async def run_load(client: httpx.AsyncClient, dataset: Dataset, args) -> Dict:
+    rng = random.Random(args.seed)
+    routes = [route for route, _ in TRAFFIC_MIX if route != "share.page" or dataset.share_tokens]
+    weights = [weight for route, weight in TRAFFIC_MIX if route in routes]
+    # Séquence de requêtes fixée à l'avance : identique d'une exécution à l'autre
+    plan = [(route, dataset.build_request(route, rng))
+            for route in rng.choices(routes, weights=weights, k=args.warmup + args.requests)]
+
+    recorder = Recorder()
+
+    async def send(route: str, url: str, record: bool):
+        counter = [0]
+        _query_counter.set(counter)
+        started = time.perf_counter()
+        response = await client.get(url)
+        latency = time.perf_counter() - started
+
+        header = response.headers.get("x-db-query-count")
+        queries = int(header) if header is not None else (counter[0] if args.url is None else None)
+        if record:
+            recorder.add(route, latency, response.status_code, queries, response.num_bytes_downloaded)
+
+    # Chauffe séquentielle (connexions, caches), hors mesures
+    for route, url in plan[:args.warmup]:
+        await send(route, url, record=False)
+
+    measured = iter(plan[args.warmup:])
+
+    async def worker():
+        for route, url in measured:
+            await send(route, url, record=True)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(args.concurrency)])
+    elapsed = time.perf_counter() - started
+
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "mode": args.url or "in-process",
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "seed": args.seed,
+            "accept_encoding": args.accept_encoding,
+            "duration_s": round(elapsed, 2)
+        },
+        "routes": recorder.summary(elapsed)
+    }
+
+def print_report(report: Dict, baseline: Optional[Dict]):
+    header = f"{'route':<26}{'n':>7}{'err':>6}{'req/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'sql/req':>9}{'ko/req':>9}"
+    if baseline:
+        header += f"{'Δp95':>9}{'Δreq/s':>9}"
+    print(header)
+    print("-" * len(header))
+
+    for route, stats in report["routes"].items():
+        queries = "-" if stats["queries_per_request"] is None else f"{stats['queries_per_request']:.1f}"
+        line = (f"{route:<26}{stats['count']:>7}{stats['errors']:>6}{stats['rps']:>9.1f}"
+                f"{stats['p50_ms']:>9.1f}{stats['p95_ms']:>9.1f}{stats['p99_ms']:>9.1f}{queries:>9}"
+                f"{stats.get('kb_per_request', 0):>9.1f}")
+        reference = (baseline or {}).get("routes", {}).get(route)
+        if reference:
+            line += f"{_delta(stats['p95_ms'], reference['p95_ms']):>9}{_delta(stats['rps'], reference['rps']):>9}"
+        print(line)
+
+def _delta(current: float, reference: float) -> str:
+    if not reference:
+        return "-"
+    return f"{(current - reference) / reference * 100:+.0f}%"
+
+def find_regressions(report: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Routes dont le p95 ou le nombre de requêtes SQL dépasse la référence"""
+    regressions = []
+    for route, stats in report["routes"].items():
+        reference = baseline.get("routes", {}).get(route)
+        if not reference:
+            continue
+        if stats["p95_ms"] > reference["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{route}: p95 {reference['p95_ms']} ms → {stats['p95_ms']} ms")
+        if stats["queries_per_request"] is not None and reference.get("queries_per_request") is not None \
+                and stats["queries_per_request"] > reference["queries_per_request"]:
+            regressions.append(
+                f"{route}: requêtes SQL {reference['queries_per_request']} → {stats['queries_per_request']}"
+            )
+    return regressions
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Banc de charge de l'API publique")
+    parser.add_argument("--url", default=None, help="URL d'un serveur lancé (défaut : main:app in-process)")
+    parser.add_argument("--requests", type=int, default=2000, help="Requêtes mesurées")
+    parser.add_argument("--warmup", type=int, default=100, help="Requêtes de chauffe non mesurées")
+    parser.add_argument("--concurrency", type=int, default=16, help="Clients simultanés")
+    parser.add_argument("--seed", type=int, default=42, help="Graine du trafic et du jeu de données")
+    parser.add_argument("--seed-rows", type=int, default=None,
+                        help="Génère d'abord ce nombre de résultats avec generate_test_data.py")
+    parser.add_argument("--sample-size", type=int, default=5000, help="Candidats échantillonnés pour les requêtes")
+    parser.add_argument("--shares", type=int, default=200, help="Liens de partage créés avant le test")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Fichier de référence")
+    parser.add_argument("--save-baseline", action="store_true", help="Enregistre ce passage comme référence")
+    parser.add_argument("--output", default=None, help="Écrit le rapport JSON dans ce fichier")
+    parser.add_argument("--tolerance", type=float, default=0.20, help="Dégradation du p95 tolérée (0.20 = 20%%)")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Code de sortie 1 en cas de régression")
+    parser.add_argument("--accept-encoding", default="br, zstd, gzip",
+                        help="En-tête Accept-Encoding envoyé ('identity' : sans compression)")
+    return parser.parse_args()
+
+async def main_async(args) -> int:
+    if args.seed_rows:
+        subprocess.run(
+            [sys.executable, os.path.join(ROOT, "generate_test_data.py"),
+             "--rows", str(args.seed_rows), "--seed", str(args.seed)],
+            check=True, cwd=ROOT
+        )
+
+    if args.url:
+        client = httpx.AsyncClient(
+            base_url=args.url, timeout=60, headers={"Accept-Encoding": args.accept_encoding},
+            limits=httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        )
+    else:
+        from sqlalchemy import event
+        from database import engine
+        from main import app
+
+        logging.disable(logging.INFO)
+        event.listen(engine, "before_cursor_execute", _count_query)
+        client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60,
+            headers={"Accept-Encoding": args.accept_encoding}
+        )
+
+    dataset = Dataset(args.sample_size)
+    async with client:
+        await dataset.create_shares(client, args.shares, random.Random(args.seed))
+        report = await run_load(client, dataset, args)
+
+    baseline = None
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    print_report(report, baseline)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nRéférence enregistrée dans {args.baseline}")
+        return 0
+
+    if baseline:
+        regressions = find_regressions(report, baseline, args.tolerance)
+        if regressions:
+            print("\nRégressions par rapport à la référence :")
+            for regression in regressions:
+                print(f"  • {regression}")
+            return 1 if args.fail_on_regression else 0
+        print("\nAucune régression par rapport à la référence")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main_async(parse_args())))
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Taille et coût des formats de réponse de /results/search : page complète en JSON, champs choisis
+(fields=, colonnes réduites dans le SELECT), forme compacte (lignes précédées de l'en-tête) et
+MessagePack (Accept: application/msgpack).
+
+Pour chaque mode :
+    recherche   : ResultsService.search_results (comptage, page, construction des résultats), cache coupé
+    sérialisé   : octets du corps au format négocié (serialize, comme le coalesceur)
+    octets      : taille du corps brut, puis compressé en gzip et br (niveaux de compression_levels)
+
+Usage:
+    python -m benchmarks.payload                                   # page de 1000, plus grosse session
+    python -m benchmarks.payload --size 200 --iterations 50
+    python -m benchmarks.payload --fields nni,nom_complet_fr,decision --output payload.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from typing import Any, Callable, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Champs d'une liste de résultats sur mobile : identité, décision, moyenne
+MOBILE_FIELDS = "nni,nom_complet_fr,nom_complet_ar,moyenne_generale,decision,mention"
+
+def modes(fields: List[str]) -> Dict[str, Dict[str, Any]]:
+    from core.coalescing import JSON_MEDIA_TYPE, MSGPACK_MEDIA_TYPE
+
+    return {
+        "json": {"params": {}, "media_type": JSON_MEDIA_TYPE},
+        "json fields": {"params": {"fields": fields}, "media_type": JSON_MEDIA_TYPE},
+        "json compact": {"params": {"compact": True}, "media_type": JSON_MEDIA_TYPE},
+        "json compact fields": {"params": {"fields": fields, "compact": True}, "media_type": JSON_MEDIA_TYPE},
+        "msgpack": {"params": {}, "media_type": MSGPACK_MEDIA_TYPE},
+        "msgpack compact fields": {"params": {"fields": fields, "compact": True}, "media_type": MSGPACK_MEDIA_TYPE}
+    }
+
+def largest_session(db):
+    """La plus grosse session publiée de la projection : la page de 1000 y est toujours pleine"""
+    from sqlalchemy import func
+    from models.database import ResultsSearch
+
+    row = db.query(ResultsSearch.year, ResultsSearch.exam_type, func.count()).group_by(
+        ResultsSearch.year, ResultsSearch.exam_type
+    ).order_by(func.count().desc()).first()
+    if row is None:
+        raise SystemExit("Projection vide : lancez generate_test_data.py puis POST /admin/search/rebuild")
+    return row.year, row.exam_type
+
+def median_ms(run: Callable[[], Any], iterations: int) -> float:
+    run()
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        run()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Taille et coût des formats de réponse de la recherche")
+    parser.add_argument("--size", type=int, default=1000, help="Résultats par page")
+    parser.add_argument("--iterations", type=int, default=20, help="Mesures par mode (médiane)")
+    parser.add_argument("--fields", default=MOBILE_FIELDS, help="Champs des modes « fields »")
+    parser.add_argument("--output", default=None, help="Écrit le rapport JSON dans ce fichier")
+    args = parser.parse_args()
+
+    from config import settings
+    from database import SessionLocal
+    from models.schemas import SearchParams
+    from services.results_service import ResultsService
+    from core.coalescing import msgpack, serialize
+    from core.compression import ENCODINGS, compress, compression_level
+
+    # Sans cache : chaque mesure refait les requêtes et la construction des résultats
+    settings.cache_local_fallback = False
+    if msgpack is None:
+        raise SystemExit("msgpack n'est pas installé (pip install msgpack)")
+
+    db = SessionLocal()
+    try:
+        year, exam_type = largest_session(db)
+        fields = ResultsService.parse_fields(args.fields)
+        service = ResultsService(db)
+        loop = asyncio.new_event_loop()
+
+        report = {}
+        for name, mode in modes(fields).items():
+            params = SearchParams(year=year, exam_type=exam_type, size=args.size, **mode["params"])
+            result = loop.run_until_complete(service.search_results(params))
+            body = serialize(result, mode["media_type"])
+            row = {
+                "search_ms": round(median_ms(
+                    lambda: loop.run_until_complete(service.search_results(params)), args.iterations), 2),
+                "serialize_ms": round(median_ms(lambda: serialize(result, mode["media_type"]), args.iterations), 2),
+                "bytes": len(body)
+            }
+            for encoding in ("gzip", "br"):
+                if encoding in ENCODINGS:
+                    row[f"{encoding}_bytes"] = len(compress(
+                        body, encoding, compression_level(mode["media_type"], encoding)
+                    ))
+            report[name] = row
+        loop.close()
+    finally:
+        db.close()
+
+    print(f"\n{exam_type} {year}, page de {args.size} ; fields={','.join(fields)}")
+    print(f"\n{'Mode':<24} {'recherche ms':>12} {'sérialisé ms':>13} {'octets':>10} {'gzip':>9} {'br':>9} {'vs json':>8}")
+    print("-" * 91)
+    reference = report["json"]["bytes"]
+    for name, row in report.items():
+        print(f"{name:<24} {row['search_ms']:>12} {row['serialize_ms']:>13} {row['bytes']:>10} "
+              f"{row.get('gzip_bytes', '-'):>9} {row.get('br_bytes', '-'):>9} {row['bytes'] / reference:>8.0%}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"year": year, "exam_type": exam_type, "size": args.size, "fields": fields,
+                       "modes": report}, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+Non-régression des plans d'exécution : chaque forme de requête émise par ResultsService
+et StatsService est rejouée, ses requêtes SQL capturées puis passées à EXPLAIN.
+Le passage échoue si l'une d'elles lit exam_results par parcours séquentiel (base partitionnée :
+sauf agrégat lisant l'essentiel de la seule partition de sa session).
+
+Usage:
+    python -m benchmarks.plan_regression                       # base de DATABASE_URL
+    python -m benchmarks.plan_regression --seed-rows 200000    # génère d'abord le jeu de données
+    python -m benchmarks.plan_regression --verbose             # nœuds de parcours de chaque requête
+    python -m benchmarks.plan_regression --output plans.json   # rapport JSON (plans complets)
+
+Les index attendus sont ceux de db/migrations/003_exam_results_indexes.sql.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Tables qui ne doivent jamais être lues en entier (les tables de référence, minuscules, le peuvent)
+GUARDED_TABLES = ("exam_results", "exam_results_search")
+
+class Sample:
+    """Valeurs réelles de la base utilisées comme paramètres des formes de requête"""
+
+    def __init__(self, db):
+        from sqlalchemy import func
+        from models.database import ExamResult, ExamSession, RefSerie
+
+        # La plus grosse session publiée : celle où un mauvais plan coûte le plus
+        session_id, _ = db.query(ExamResult.session_id, func.count()).filter(
+            ExamResult.is_published == True
+        ).group_by(ExamResult.session_id).order_by(func.count().desc()).first() or (None, 0)
+        if session_id is None:
+            raise SystemExit("Aucun résultat publié : lancez generate_test_data.py ou utilisez --seed-rows")
+
+        self.session = db.query(ExamSession).filter(ExamSession.id == session_id).first()
+        candidate = db.query(ExamResult).filter(
+            ExamResult.session_id == session_id, ExamResult.is_published == True,
+            ExamResult.numero_dossier.isnot(None)
+        ).first()
+        self.nni = candidate.nni
+        self.numero_dossier = candidate.numero_dossier
+        self.nom = (candidate.nom_complet_fr or "").split(" ")[0]
+        self.wilaya_id = candidate.wilaya_id
+        self.etablissement_id = candidate.etablissement_id
+        self.serie_id = candidate.serie_id
+        self.serie_code = db.query(RefSerie.code).filter(RefSerie.id == candidate.serie_id).scalar()
+        self.result_id = candidate.id
+
+class StatementCapture:
+    """Requêtes SQL (texte et paramètres) émises pendant l'exécution d'une forme"""
+
+    def __init__(self):
+        self.statements: List[Tuple[str, Any]] = []
+        self.active = False
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        if self.active and not executemany:
+            self.statements.append((statement, parameters))
+
+def query_shapes(sample: Sample) -> List[Tuple[str, Callable[[Any], Awaitable[Any]]]]:
+    """(libellé, appel du service) : une entrée par combinaison de filtres servie par l'API"""
+    from config import settings
+    from models.schemas import SearchParams
+    from services.results_service import ResultsService
+    from services.stats_service import StatsService
+
+    year, exam_type = sample.session.year, sample.session.exam_type
+    session = {"year": year, "exam_type": exam_type}
+
+    def search(**filters):
+        async def call(db):
+            return await ResultsService(db).search_results(SearchParams(**filters))
+        return call
+
+    def stats(method: str, *args, **kwargs):
+        async def call(db):
+            result = getattr(StatsService(db), method)(*args, **kwargs)
+            return await result if asyncio.iscoroutine(result) else result
+        return call
+
+    async def by_id(db):
+        return ResultsService(db).get_result_by_id(sample.result_id)
+
+    # Au-delà de leaderboard_size, le top élèves est lu en base
+    beyond_leaderboard = settings.leaderboard_size + 1
+
+    return [
+        ("results.nni", search(nni=sample.nni)),
+        ("results.numero_dossier", search(numero_dossier=sample.numero_dossier)),
+        ("results.nom", search(nom=sample.nom, **session)),
+        ("results.session", search(**session)),
+        ("results.session_page", search(page=50, size=100, **session)),
+        ("results.session_wilaya", search(wilaya_id=sample.wilaya_id, **session)),
+        ("results.session_etablissement", search(etablissement_id=sample.etablissement_id, **session)),
+        ("results.session_serie_id", search(serie_id=sample.serie_id, **session)),
+        ("results.session_serie_code", search(serie_code=sample.serie_code, **session)),
+        ("results.session_decision", search(decision="Admis", **session)),
+        ("results.session_wilaya_decision", search(wilaya_id=sample.wilaya_id, decision="Admis", **session)),
+        ("results.wilaya", search(wilaya_id=sample.wilaya_id)),
+        ("results.etablissement", search(etablissement_id=sample.etablissement_id)),
+        ("results.by_id", by_id),
+        ("stats.wilaya", stats("compute_wilaya_stats", sample.wilaya_id, year, exam_type)),
+        ("stats.etablissement", stats("compute_etablissement_stats", sample.etablissement_id, year, exam_type)),
+        ("stats.global", stats("compute_global_stats", year, exam_type)),
+        ("stats.top_students", stats("get_top_students", year, exam_type, 10)),
+        ("stats.top_students_sql", stats("get_top_students", year, exam_type, beyond_leaderboard)),
+        ("stats.top_students_wilaya_sql",
+         stats("get_top_students", year, exam_type, beyond_leaderboard, wilaya_id=sample.wilaya_id)),
+        ("stats.top_students_serie_sql",
+         stats("get_top_students", year, exam_type, beyond_leaderboard, serie_id=sample.serie_id)),
+        ("stats.top_schools", stats("get_top_schools", year, exam_type, 10)),
+    ]
+
+def explain(raw_connection, statement: str, parameters) -> Dict[str, Any]:
+    cursor = raw_connection.cursor()
+    try:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {statement}", parameters)
+        return cursor.fetchone()[0][0]["Plan"]
+    finally:
+        cursor.close()
+
+def plan_nodes(plan: Dict[str, Any]):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from plan_nodes(child)
+
+def estimated_rows(plan: Dict[str, Any]) -> Dict[int, float]:
+    """Lignes estimées de chaque nœud (id du nœud), tous processus confondus : sous un Gather,
+    Plan Rows est donné par processus"""
+    rows = {}
+
+    def walk(node: Dict[str, Any], processes: int):
+        if node["Node Type"] in ("Gather", "Gather Merge"):
+            processes = node.get("Workers Planned", 0) + 1
+        rows[id(node)] = node["Plan Rows"] * (processes if node.get("Parallel Aware") else 1)
+        for child in node.get("Plans", []):
+            walk(child, processes)
+
+    walk(plan, 1)
+    return rows
+
+def scans(plan: Dict[str, Any], guarded: Dict[str, float]) -> List[str]:
+    """Nœuds de lecture des tables surveillées : 'Index Only Scan idx_... on exam_results'"""
+    found = []
+    for node in plan_nodes(plan):
+        if node.get("Relation Name") in guarded:
+            # Bitmap Heap Scan : index lus par les Bitmap Index Scan enfants
+            indexes = [node["Index Name"]] if node.get("Index Name") else [
+                child["Index Name"] for child in plan_nodes(node) if child.get("Index Name")
+            ]
+            index = f" {'+'.join(indexes)}" if indexes else ""
+            found.append(f"{node['Node Type']}{index} on {node['Relation Name']}")
+    return found
+
+def seq_scans(plan: Dict[str, Any], guarded: Dict[str, float], session_ratio: float) -> List[str]:
+    """Parcours séquentiels fautifs. Table partitionnée : lire en entier la seule partition d'une
+    session est le bon plan quand la requête en garde au moins session_ratio des lignes (agrégats)"""
+    relations = {node.get("Relation Name") for node in plan_nodes(plan)} & set(guarded)
+    rows = estimated_rows(plan)
+    failures = []
+    for node in plan_nodes(plan):
+        name = node.get("Relation Name")
+        if node["Node Type"] != "Seq Scan" or name not in guarded:
+            continue
+        partition_rows = guarded[name]
+        if partition_rows and relations == {name} and rows[id(node)] >= session_ratio * partition_rows:
+            continue
+        failures.append(name)
+    return failures
+
+def guarded_relations(db, min_rows: int) -> Dict[str, float]:
+    """Tables surveillées (0) et leurs partitions (migration 004) avec leur nombre de lignes estimé,
+    hors partitions quasi vides (partition par défaut) que le planificateur lit à juste titre en entier"""
+    from sqlalchemy import text
+    rows = db.execute(text(
+        "SELECT c.relname, c.reltuples FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = ANY(:tables)"
+    ), {"tables": list(GUARDED_TABLES)}).all()
+    guarded = {table: 0.0 for table in GUARDED_TABLES}
+    guarded.update({name: estimate for name, estimate in rows if estimate >= min_rows})
+    return guarded
+
+def trigram_available(db) -> bool:
+    from sqlalchemy import text
+    return bool(db.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).scalar())
+
+async def run_shapes(args) -> Dict[str, Any]:
+    from sqlalchemy import event, text
+    from config import settings
+    from database import SessionLocal, engine
+
+    # Sans cache : chaque forme doit atteindre la base
+    settings.cache_local_fallback = False
+
+    if args.vacuum:
+        # Statistiques et carte de visibilité à jour : plans de production (autovacuum)
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            for table in GUARDED_TABLES:
+                conn.execute(text(f"VACUUM ANALYZE {table}"))
+
+    db = SessionLocal()
+    try:
+        sample = Sample(db)
+        skip_trigram = not trigram_available(db)
+        guarded = guarded_relations(db, args.min_partition_rows)
+    finally:
+        db.close()
+
+    capture = StatementCapture()
+    event.listen(engine, "before_cursor_execute", capture)
+    raw_connection = engine.raw_connection()
+    report = {"session": f"{sample.session.exam_type} {sample.session.year}", "shapes": [], "failures": []}
+
+    try:
+        for label, call in query_shapes(sample):
+            if args.only and not any(label.startswith(prefix) for prefix in args.only):
+                continue
+            if label == "results.nom" and skip_trigram:
+                report["shapes"].append({"shape": label, "skipped": "extension pg_trgm absente"})
+                continue
+
+            db = SessionLocal()
+            capture.statements, capture.active = [], True
+            try:
+                await call(db)
+            finally:
+                capture.active = False
+                db.close()
+
+            queries = []
+            for statement, parameters in capture.statements:
+                if not any(table in statement for table in GUARDED_TABLES):
+                    continue
+                plan = explain(raw_connection, statement, parameters)
+                query = {
+                    "sql": " ".join(statement.split())[:160],
+                    "scans": scans(plan, guarded),
+                    "seq_scans": seq_scans(plan, guarded, args.session_scan_ratio),
+                    "total_cost": plan["Total Cost"]
+                }
+                if args.output:
+                    query["plan"] = plan
+                if query["seq_scans"]:
+                    report["failures"].append(f"{label}: Seq Scan sur {', '.join(query['seq_scans'])} — {query['sql']}")
+                queries.append(query)
+            report["shapes"].append({"shape": label, "queries": queries})
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+        raw_connection.close()
+    return report
+
+def print_report(report: Dict[str, Any], verbose: bool):
+    print(f"\nPlans d'exécution — session {report['session']}\n")
+    print(f"{'forme':<34} {'requêtes':>8} {'coût max':>10}  résultat")
+    print("-" * 70)
+    for shape in report["shapes"]:
+        if "skipped" in shape:
+            print(f"{shape['shape']:<34} {'-':>8} {'-':>10}  ignorée ({shape['skipped']})")
+            continue
+        queries = shape["queries"]
+        failed = any(q["seq_scans"] for q in queries)
+        max_cost = max((q["total_cost"] for q in queries), default=0)
+        print(f"{shape['shape']:<34} {len(queries):>8} {max_cost:>10.0f}  {'SEQ SCAN' if failed else 'ok'}")
+        if verbose or failed:
+            for query in queries:
+                print(f"    {' | '.join(query['scans']) or '(aucune lecture de table surveillée)'}")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Non-régression des plans d'exécution sur exam_results")
+    parser.add_argument("--seed-rows", type=int, default=None,
+                        help="Génère d'abord N candidats avec generate_test_data.py")
+    parser.add_argument("--seed", type=int, default=42, help="Graine du jeu de données généré")
+    parser.add_argument("--no-vacuum", dest="vacuum", action="store_false",
+                        help="N'exécute pas VACUUM ANALYZE des tables surveillées avant les EXPLAIN")
+    parser.add_argument("--min-partition-rows", type=int, default=1000,
+                        help="Partitions de moins de N lignes (estimation) non surveillées")
+    parser.add_argument("--session-scan-ratio", type=float, default=0.2,
+                        help="Part minimale des lignes gardées pour accepter la lecture complète d'une partition")
+    parser.add_argument("--only", nargs="*", default=None, help="Préfixes de formes à vérifier (ex. stats.)")
+    parser.add_argument("--verbose", action="store_true", help="Affiche les nœuds de parcours de chaque requête")
+    parser.add_argument("--output", default=None, help="Écrit le rapport JSON (avec les plans) dans ce fichier")
+    return parser.parse_args()
+
+def main() -> int:
+    args = parse_args()
+    if args.seed_rows:
+        subprocess.run(
+            [sys.executable, os.path.join(ROOT, "generate_test_data.py"),
+             "--rows", str(args.seed_rows), "--seed", str(args.seed)],
+            check=True, cwd=ROOT
+        )
+
+    import logging
+    logging.disable(logging.INFO)
+    report = asyncio.run(run_shapes(args))
+    print_report(report, args.verbose)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, default=str)
+
+    if report["failures"]:
+        print(f"\n{len(report['failures'])} requête(s) en parcours séquentiel :")
+        for failure in report["failures"]:
+            print(f"  • {failure}")
+        return 1
+    print("\nAucun parcours séquentiel sur " + ", ".join(GUARDED_TABLES))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Banc de démarrage à froid : temps d'import de main:app et latence des premières requêtes
+
+Chaque démarrage est mesuré dans un interpréteur neuf (comme un worker ajouté par l'autoscaling) :
+import de main, démarrage du lifespan, puis première et deuxième requête de chaque chemin.
+Un passage supplémentaire sous -X importtime détaille les imports de premier niveau.
+
+Usage:
+    python -m benchmarks.startup                               # 5 démarrages in-process
+    python -m benchmarks.startup --runs 10 --path /health --path /references/wilayas
+    python -m benchmarks.startup --server                      # uvicorn : lancement → première réponse
+    python -m benchmarks.startup --no-connect                  # sans connexions ouvertes au démarrage
+    python -m benchmarks.startup --max-import-ms 800           # code 1 si l'import est plus lent
+
+Le préchauffage des caches (WARMUP_ON_STARTUP) est désactivé sauf avec --warmup.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DEFAULT_PATHS = ["/health", "/sessions/", "/references/wilayas"]
+
+# Dépendances lourdes qui ne doivent pas être chargées par le seul import de l'application
+HEAVY_MODULES = ("pandas", "numpy", "openpyxl", "pyarrow", "redis", "asyncpg")
+
+def child_run(paths: List[str]) -> Dict:
+    """Un démarrage mesuré (interpréteur neuf, lancé par run_in_process)"""
+    started = time.perf_counter()
+    from main import app
+    import_ms = (time.perf_counter() - started) * 1000
+    heavy = [name for name in HEAVY_MODULES if name in sys.modules]
+
+    async def requests():
+        import httpx
+
+        timings = {}
+        lifespan_started = time.perf_counter()
+        async with app.router.lifespan_context(app):
+            lifespan_ms = (time.perf_counter() - lifespan_started) * 1000
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+                for path in paths:
+                    timings[path] = {}
+                    for label in ("first_ms", "second_ms"):
+                        t = time.perf_counter()
+                        response = await client.get(path)
+                        timings[path][label] = (time.perf_counter() - t) * 1000
+                    timings[path]["status"] = response.status_code
+        return lifespan_ms, timings
+
+    lifespan_ms, timings = asyncio.run(requests())
+    return {"import_ms": import_ms, "lifespan_ms": lifespan_ms, "paths": timings, "heavy_modules": heavy}
+
+def child_env(args) -> Dict[str, str]:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = ROOT + os.pathsep + env.get("PYTHONPATH", "")
+    env["WARMUP_ON_STARTUP"] = "true" if args.warmup else "false"
+    env["CONNECT_ON_STARTUP"] = "false" if args.no_connect else "true"
+    return env
+
+def run_in_process(args) -> Dict:
+    command = [sys.executable, "-m", "benchmarks.startup", "--child"]
+    for path in args.paths:
+        command += ["--path", path]
+    started = time.perf_counter()
+    output = subprocess.run(command, cwd=ROOT, env=child_env(args), capture_output=True, text=True, check=True)
+    run = json.loads(output.stdout.strip().splitlines()[-1])
+    run["process_ms"] = (time.perf_counter() - started) * 1000
+    return run
+
+def run_server(args) -> Dict:
+    """Démarrage réel d'uvicorn : délai jusqu'à la première réponse de /health, puis chaque chemin"""
+    import httpx
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=child_env(args), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=30) as client:
+            while True:
+                if server.poll() is not None:
+                    raise SystemExit("uvicorn s'est arrêté pendant le démarrage")
+                try:
+                    client.get("/health")
+                    break
+                except httpx.TransportError:
+                    time.sleep(0.005)
+            run = {"ready_ms": (time.perf_counter() - started) * 1000, "paths": {}}
+            for path in args.paths:
+                run["paths"][path] = {}
+                for label in ("first_ms", "second_ms"):
+                    t = time.perf_counter()
+                    response = client.get(path)
+                    run["paths"][path][label] = (time.perf_counter() - t) * 1000
+                run["paths"][path]["status"] = response.status_code
+    finally:
+        server.terminate()
+        server.wait()
+    return run
+
+def import_breakdown(args, top: int) -> List[Dict]:
+    """Imports de premier niveau de main, triés par temps cumulé (-X importtime)"""
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=ROOT, env=child_env(args), capture_output=True, text=True, check=True
+    )
+    modules = []
+    for line in output.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        name = name[1:]
+        if len(name) - len(name.lstrip()) == 2:
+            modules.append({"module": name.strip(), "cumulative_ms": int(cumulative) / 1000})
+    modules.sort(key=lambda m: m["cumulative_ms"], reverse=True)
+    return modules[:top]
+
+def summarize(runs: List[Dict]) -> Dict:
+    def spread(values):
+        return {"median": round(statistics.median(values), 1), "max": round(max(values), 1)}
+
+    summary = {}
+    for key in ("import_ms", "lifespan_ms", "process_ms", "ready_ms"):
+        if key in runs[0]:
+            summary[key] = spread([run[key] for run in runs])
+    summary["paths"] = {
+        path: {
+            label: spread([run["paths"][path][label] for run in runs]) for label in ("first_ms", "second_ms")
+        } | {"status": runs[-1]["paths"][path]["status"]}
+        for path in runs[0]["paths"]
+    }
+    return summary
+
+def print_report(report: Dict):
+    summary = report["summary"]
+    print(f"\n{'Mesure':<36} {'médiane':>10} {'max':>10}")
+    print("-" * 58)
+    labels = {
+        "import_ms": "Import de main (ms)", "lifespan_ms": "Démarrage du lifespan (ms)",
+        "process_ms": "Processus complet (ms)", "ready_ms": "Lancement → /health (ms)"
+    }
+    for key, label in labels.items():
+        if key in summary:
+            print(f"{label:<36} {summary[key]['median']:>10} {summary[key]['max']:>10}")
+    for path, stats in summary["paths"].items():
+        for label, name in (("first_ms", "1re"), ("second_ms", "2e")):
+            title = f"{path} {name} requête ({stats['status']})"
+            print(f"{title:<36} {stats[label]['median']:>10} {stats[label]['max']:>10}")
+
+    if report.get("imports"):
+        print("\nImports de premier niveau (cumulé, ms) :")
+        for module in report["imports"]:
+            print(f"  {module['module']:<40} {module['cumulative_ms']:>8.1f}")
+    if report.get("heavy_modules"):
+        print(f"\nDépendances lourdes chargées à l'import : {', '.join(report['heavy_modules'])}")
+    elif "heavy_modules" in report:
+        print("\nAucune dépendance lourde chargée à l'import")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Banc de démarrage à froid")
+    parser.add_argument("--runs", type=int, default=5, help="Démarrages mesurés")
+    parser.add_argument("--path", dest="paths", action="append", default=None,
+                        help="Chemin requêté après le démarrage (répétable)")
+    parser.add_argument("--server", action="store_true", help="Lance uvicorn au lieu de l'app in-process")
+    parser.add_argument("--warmup", action="store_true", help="Laisse le préchauffage des caches actif")
+    parser.add_argument("--no-connect", action="store_true", help="Pas de connexions ouvertes au démarrage")
+    parser.add_argument("--top-imports", type=int, default=12, help="Imports détaillés (0 : aucun)")
+    parser.add_argument("--max-import-ms", type=float, default=None,
+                        help="Code de sortie 1 si la médiane de l'import dépasse cette durée")
+    parser.add_argument("--output", default=None, help="Écrit le rapport JSON dans ce fichier")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    args.paths = args.paths or DEFAULT_PATHS
+    return args
+
+def main() -> int:
+    args = parse_args()
+    if args.child:
+        print(json.dumps(child_run(args.paths)))
+        return 0
+
+    runs = [run_server(args) if args.server else run_in_process(args) for _ in range(args.runs)]
+    report = {"mode": "server" if args.server else "in-process", "runs": runs, "summary": summarize(runs)}
+    if not args.server:
+        report["heavy_modules"] = runs[-1]["heavy_modules"]
+    if args.top_imports:
+        report["imports"] = import_breakdown(args, args.top_imports)
+
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.max_import_ms is not None and not args.server \
+            and report["summary"]["import_ms"]["median"] > args.max_import_ms:
+        print(f"\nImport plus lent que {args.max_import_ms} ms")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
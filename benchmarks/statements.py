@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Micro-banc des requêtes précompilées : temps CPU du processus par exécution d'une requête chaude,
+construite à chaque appel (ancienne forme query()) ou lue dans les gabarits de core/statements.py
+
+Trois variantes par forme de requête :
+    recompilée   : query() reconstruite, moteur sans cache de compilation (query_cache_size=0)
+    reconstruite : query() reconstruite, SQL compilé lu dans le cache du moteur (clé recalculée)
+    gabarit      : requête des services (construite une fois, clé mémorisée, valeurs en bindparam)
+
+Le temps mesuré est time.process_time() : l'attente de PostgreSQL n'y figure pas, l'écart entre
+variantes est le CPU économisé par requête.
+
+Usage:
+    python -m benchmarks.statements                   # 2000 exécutions par forme et variante
+    python -m benchmarks.statements --iterations 5000 --output statements.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Callable, Dict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+class Sample:
+    """Candidat publié réel servant de paramètres"""
+
+    def __init__(self, db):
+        from models.database import ExamSession, ResultsSearch
+
+        row = db.query(ResultsSearch).filter(ResultsSearch.numero_dossier.isnot(None)).first()
+        if row is None:
+            raise SystemExit("Projection vide : lancez generate_test_data.py puis POST /admin/search/rebuild")
+        self.result_id = row.id
+        self.nni = row.nni
+        self.wilaya_id = row.wilaya_id
+        self.session = db.query(ExamSession).filter(ExamSession.id == row.session_id).first()
+
+def legacy_shapes(sample) -> Dict[str, Callable]:
+    """Requêtes telles qu'écrites avant les gabarits : objet query() construit à chaque appel"""
+    from sqlalchemy import and_, desc
+    from models.database import ExamSession, ResultsSearch
+
+    def search_nni(db):
+        query = db.query(ResultsSearch).filter(ResultsSearch.nni == sample.nni)
+        query.count()
+        return query.order_by(
+            ResultsSearch.moyenne_generale.desc().nullslast(), desc(ResultsSearch.created_at)
+        ).offset(0).limit(20).all()
+
+    def search_filters(db):
+        query = db.query(ResultsSearch).filter(ResultsSearch.wilaya_id == sample.wilaya_id).filter(
+            ResultsSearch.year == sample.session.year
+        ).filter(ResultsSearch.exam_type == sample.session.exam_type)
+        query.count()
+        return query.order_by(
+            ResultsSearch.moyenne_generale.desc().nullslast(), desc(ResultsSearch.created_at)
+        ).offset(40).limit(20).all()
+
+    def detail(db):
+        return db.query(ResultsSearch).filter(ResultsSearch.id == sample.result_id).first()
+
+    def stats_session(db):
+        return db.query(ExamSession).filter(
+            and_(ExamSession.year == sample.session.year, ExamSession.exam_type == sample.session.exam_type)
+        ).first()
+
+    return {
+        "results.search (nni)": search_nni,
+        "results.search (wilaya, page 3)": search_filters,
+        "results.detail": detail,
+        "stats.session": stats_session
+    }
+
+def template_shapes(sample) -> Dict[str, Callable]:
+    """Mêmes requêtes par les gabarits des services"""
+    from services.results_service import ResultsService
+    from services.stats_service import StatsService
+
+    def search(values, offset):
+        def run(db):
+            service = ResultsService(db)
+            service._search_count(values)
+            return service._search_rows(values, offset, 20)
+        return run
+
+    return {
+        "results.search (nni)": search({"nni": sample.nni}, 0),
+        "results.search (wilaya, page 3)": search({
+            "wilaya_id": sample.wilaya_id, "year": sample.session.year, "exam_type": sample.session.exam_type
+        }, 40),
+        "results.detail": lambda db: ResultsService(db).get_result_by_id(sample.result_id),
+        "stats.session": lambda db: StatsService(db)._get_session(sample.session.year, sample.session.exam_type)
+    }
+
+def measure(session_factory, run: Callable, iterations: int) -> float:
+    """Microsecondes CPU par exécution (session ORM vidée à chaque appel, comme une requête HTTP)"""
+    db = session_factory()
+    try:
+        for _ in range(min(100, iterations)):
+            run(db)
+            db.expunge_all()
+        started = time.process_time()
+        for _ in range(iterations):
+            run(db)
+            db.expunge_all()
+        return (time.process_time() - started) / iterations * 1e6
+    finally:
+        db.close()
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Micro-banc des requêtes précompilées")
+    parser.add_argument("--iterations", type=int, default=2000, help="Exécutions mesurées par forme et variante")
+    parser.add_argument("--output", default=None, help="Écrit le rapport JSON dans ce fichier")
+    args = parser.parse_args()
+
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from database import SessionLocal
+    from config import settings
+
+    uncached = sessionmaker(bind=create_engine(settings.database_url, query_cache_size=0))
+    db = SessionLocal()
+    sample = Sample(db)
+    db.close()
+
+    legacy, templates = legacy_shapes(sample), template_shapes(sample)
+    report = {}
+    for name in legacy:
+        report[name] = {
+            "recompilee_us": round(measure(uncached, legacy[name], args.iterations), 1),
+            "reconstruite_us": round(measure(SessionLocal, legacy[name], args.iterations), 1),
+            "gabarit_us": round(measure(SessionLocal, templates[name], args.iterations), 1)
+        }
+
+    print(f"\n{'Forme (µs CPU / exécution)':<34} {'recompilée':>11} {'reconstruite':>13} {'gabarit':>9} {'gain':>7}")
+    print("-" * 78)
+    for name, row in report.items():
+        saved = 1 - row["gabarit_us"] / row["reconstruite_us"] if row["reconstruite_us"] else 0
+        row["gain_vs_reconstruite"] = round(saved, 3)
+        print(f"{name:<34} {row['recompilee_us']:>11} {row['reconstruite_us']:>13} "
+              f"{row['gabarit_us']:>9} {saved:>6.0%}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
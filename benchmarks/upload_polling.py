@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Coût en base du suivi d'un upload : un administrateur authentifié interroge
+GET /admin/upload/{task_id}/status en boucle, comme le tableau de bord pendant l'ingestion.
+
+Chaque réponse porte X-DB-Query-Count (profilage de toutes les requêtes, jeton administrateur) :
+la première interrogation charge l'administrateur, les suivantes doivent le lire dans le cache
+des jetons (core/principal_cache.py) sans aucune requête SQL.
+
+Usage:
+    python -m benchmarks.upload_polling                        # 200 interrogations, premier administrateur
+    python -m benchmarks.upload_polling --polls 1000 --username admin --output polling.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Requêtes SQL par interrogation du statut d'un upload")
+    parser.add_argument("--polls", type=int, default=200, help="Interrogations du statut")
+    parser.add_argument("--username", default=None, help="Administrateur (défaut : le premier en base)")
+    parser.add_argument("--output", default=None, help="Écrit le rapport JSON dans ce fichier")
+    args = parser.parse_args()
+
+    from config import settings
+
+    # Toutes les requêtes profilées ; en-têtes X-DB-* renvoyés à l'administrateur
+    settings.query_profiler_enabled = True
+    settings.query_profiler_sample_rate = 1.0
+    settings.warmup_on_startup = False
+
+    from fastapi.testclient import TestClient
+    from database import SessionLocal
+    from main import app
+    from models.database import AdminUser
+    from models.schemas import BulkUploadStatus
+    from services.upload_service import UploadService
+    from core.security import create_access_token
+
+    db = SessionLocal()
+    try:
+        query = db.query(AdminUser.username)
+        if args.username:
+            query = query.filter(AdminUser.username == args.username)
+        row = query.order_by(AdminUser.id).first()
+    finally:
+        db.close()
+    if row is None:
+        raise SystemExit("Aucun administrateur en base : lancez generate_test_data.py")
+
+    # Tâche d'upload factice : le statut est lu dans la mémoire du processus
+    task_id = str(uuid.uuid4())
+    UploadService._upload_tasks[task_id] = BulkUploadStatus(
+        task_id=task_id, status="processing", progress=50, total_rows=1000,
+        processed_rows=500, success_count=500, error_count=0, errors=[]
+    )
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': row.username})}"}
+
+    queries, latencies = [], []
+    with TestClient(app) as client:
+        for _ in range(args.polls):
+            started = time.perf_counter()
+            response = client.get(f"/admin/upload/{task_id}/status", headers=headers)
+            latencies.append((time.perf_counter() - started) * 1000)
+            if response.status_code != 200:
+                raise SystemExit(f"Statut {response.status_code} : {response.text}")
+            queries.append(int(response.headers.get("x-db-query-count", -1)))
+
+    steady = queries[1:]
+    report = {
+        "username": row.username,
+        "polls": args.polls,
+        "first_poll_queries": queries[0],
+        "steady_queries_max": max(steady) if steady else None,
+        "steady_queries_total": sum(steady),
+        "median_ms": round(statistics.median(latencies), 2)
+    }
+
+    print(f"\n{args.polls} interrogations de /admin/upload/{{task_id}}/status ({row.username})")
+    print(f"  première interrogation : {report['first_poll_queries']} requête(s) SQL")
+    print(f"  suivantes              : {report['steady_queries_total']} requête(s) SQL au total, "
+          f"{report['steady_queries_max']} au plus")
+    print(f"  médiane                : {report['median_ms']} ms")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if min(queries) < 0:
+        print("\nEn-tête X-DB-Query-Count absent : profilage désactivé ?")
+        return 1
+    if report["steady_queries_total"]:
+        print("\nDes interrogations ont interrogé la base : cache des administrateurs inopérant")
+        return 1
+    print("\nAucune requête SQL après la première interrogation")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
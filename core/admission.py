@@ -0,0 +1,206 @@
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+from urllib.parse import parse_qs
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+from config import settings
+from core.cache import cache_manager
+from core.local_store import local_store
+from core.metrics import metrics
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Routes jamais soumises au contrôle d'admission (sondes, supervision)
+EXEMPT_PATHS = ("/health", "/metrics")
+
+# Bucket à jetons atomique côté Redis : renvoie {autorisé, jetons restants}
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local data = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(data[1]) or burst
+local ts = tonumber(data[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return {allowed, tostring(tokens)}
+"""
+
+def classify_request(scope: Scope) -> Optional[str]:
+    """Classe d'admission d'une requête ; None pour les routes exemptées"""
+    path: str = scope["path"]
+
+    if path.startswith(EXEMPT_PATHS):
+        return None
+    if path.startswith("/results/export"):
+        return "export"
+    if path.startswith("/results/search"):
+        # Recherche par identifiant (index unique) : prioritaire sur la recherche par nom
+        params = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        if params.get("nni") or params.get("numero_dossier"):
+            return "lookup"
+        return "search"
+    if path.startswith(("/results/", "/share/")):
+        return "lookup"
+    if path.startswith("/stats/"):
+        return "stats"
+    if path.startswith(("/admin/", "/auth/")):
+        return "admin"
+    return "default"
+
+def client_id(scope: Scope) -> str:
+    """Adresse du client (première de X-Forwarded-For derrière un proxy de confiance)"""
+    if settings.rate_limit_trust_forwarded:
+        for name, value in scope.get("headers", []):
+            if name == b"x-forwarded-for":
+                return value.decode("latin-1").split(",")[0].strip()
+    client = scope.get("client")
+    return client[0] if client else "inconnu"
+
+class AdmissionGate:
+    """Limite de concurrence d'une classe de routes, avec file d'attente bornée et délai maximal"""
+
+    def __init__(self, limit: int, queue: int, max_wait: float):
+        self.limit = limit
+        self.queue_size = queue
+        self.max_wait = max_wait
+        self.active = 0
+        self.waiters: Deque[asyncio.Future] = deque()
+
+    async def acquire(self) -> Tuple[bool, str]:
+        """(admis, motif) ; motif parmi admitted, queued, queue_full, timeout"""
+        if self.active < self.limit and not self.waiters:
+            self.active += 1
+            return True, "admitted"
+        if len(self.waiters) >= self.queue_size:
+            return False, "queue_full"
+
+        future = asyncio.get_running_loop().create_future()
+        self.waiters.append(future)
+        try:
+            await asyncio.wait_for(future, self.max_wait)
+            return True, "queued"
+        except asyncio.TimeoutError:
+            self._forget(future)
+            return False, "timeout"
+        except asyncio.CancelledError:
+            # Client parti pendant l'attente : rendre la place si elle venait d'être attribuée
+            if future.done() and not future.cancelled():
+                self.release()
+            else:
+                self._forget(future)
+            raise
+
+    def release(self):
+        # La place libérée passe directement au premier en attente encore vivant
+        while self.waiters:
+            future = self.waiters.popleft()
+            if not future.done():
+                future.set_result(True)
+                return
+        self.active -= 1
+
+    def _forget(self, future: asyncio.Future):
+        try:
+            self.waiters.remove(future)
+        except ValueError:
+            pass
+
+class TokenBucket:
+    """Limitation de débit par client : Redis si disponible, sinon stockage local au processus"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+
+    async def consume(self, client_id: str) -> Tuple[bool, float]:
+        """(autorisé, secondes avant le prochain jeton)"""
+        key = f"ratelimit:{client_id}"
+        now = time.time()
+
+        redis = await cache_manager.get_redis()
+        if redis:
+            try:
+                allowed, tokens = await redis.eval(TOKEN_BUCKET_SCRIPT, 1, key, self.rate, self.burst, now)
+                return bool(allowed), self._retry_after(float(tokens))
+            except Exception as e:
+                logger.warning(f"Rate limit Redis indisponible, repli local: {e}")
+
+        # Pas d'await entre lecture et écriture : opération atomique dans la boucle
+        tokens, ts = await local_store.hmget(key, ["tokens", "ts"])
+        tokens = float(tokens) if tokens is not None else float(self.burst)
+        ts = float(ts) if ts is not None else now
+        tokens = min(self.burst, tokens + max(0.0, now - ts) * self.rate)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        await local_store.hset(key, mapping={"tokens": tokens, "ts": now})
+        await local_store.expire(key, math.ceil(self.burst / self.rate) + 1)
+        return allowed, self._retry_after(tokens)
+
+    def _retry_after(self, tokens: float) -> float:
+        return max(0.0, (1 - tokens) / self.rate)
+
+class AdmissionControlMiddleware:
+    """Contrôle d'admission : limites de concurrence par classe de routes, délestage rapide
+    (503 + Retry-After) au-delà de la file d'attente, limitation de débit optionnelle par client (429)"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.gates: Dict[str, AdmissionGate] = {
+            name: AdmissionGate(**config) for name, config in settings.admission_classes.items()
+        }
+        self.bucket = TokenBucket(settings.rate_limit_per_second, settings.rate_limit_burst)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not settings.admission_enabled:
+            await self.app(scope, receive, send)
+            return
+
+        route_class = classify_request(scope)
+        if route_class is None:
+            await self.app(scope, receive, send)
+            return
+
+        if settings.rate_limit_enabled:
+            allowed, retry_after = await self.bucket.consume(client_id(scope))
+            if not allowed:
+                metrics.record_admission(route_class, "rate_limited")
+                await self._reject(429, "Trop de requêtes, réessayez plus tard", retry_after, scope, receive, send)
+                return
+
+        gate = self.gates.get(route_class) or self.gates["default"]
+        admitted, outcome = await gate.acquire()
+        metrics.record_admission(route_class, outcome)
+        if not admitted:
+            await self._reject(
+                503, "Service momentanément surchargé, réessayez plus tard",
+                settings.admission_retry_after, scope, receive, send
+            )
+            return
+
+        try:
+            # La place est tenue jusqu'à la fin de l'envoi du corps (exports en flux compris)
+            await self.app(scope, receive, send)
+        finally:
+            gate.release()
+
+    @staticmethod
+    async def _reject(status_code: int, detail: str, retry_after: float,
+                      scope: Scope, receive: Receive, send: Send):
+        response = JSONResponse(
+            status_code=status_code,
+            content={"detail": detail},
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+        )
+        await response(scope, receive, send)
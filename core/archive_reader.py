@@ -0,0 +1,103 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+from config import settings
+
+MANIFEST_FILE = "manifest.json"
+DATA_FILE = "results.parquet"
+
+class ArchiveReader:
+    """Lecture paresseuse des archives Parquet des sessions archivées (services/archive_service.py).
+
+    Rien n'est ouvert avant la première lecture d'une session ; chaque lecture ne décode que les
+    colonnes demandées et, pour un NNI, que les groupes de lignes dont les statistiques min/max
+    le contiennent (fichier trié par NNI). Les derniers résultats calculés sont gardés en mémoire.
+    """
+
+    def __init__(self):
+        self._datasets: Dict[int, Tuple[str, Any]] = {}
+        self._results: "OrderedDict[tuple, Any]" = OrderedDict()
+        self._lock = threading.Lock()  # Lectures depuis le pool de threads
+
+    @staticmethod
+    def directory(session_id: int) -> str:
+        return os.path.join(settings.archive_path, f"session_{int(session_id)}")
+
+    def data_path(self, session_id: int) -> str:
+        return os.path.join(self.directory(session_id), DATA_FILE)
+
+    def manifest_path(self, session_id: int) -> str:
+        return os.path.join(self.directory(session_id), MANIFEST_FILE)
+
+    def has_archive(self, session_id: int) -> bool:
+        # Le manifeste est écrit en dernier : sa présence garantit un fichier de données complet
+        return os.path.exists(self.manifest_path(session_id))
+
+    def manifest(self, session_id: int) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.manifest_path(session_id)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def token(self, session_id: int) -> str:
+        """Identifie le contenu de l'archive : une session réarchivée ne relit pas l'ancien cache"""
+        try:
+            return f"{session_id}@{os.stat(self.manifest_path(session_id)).st_mtime_ns}"
+        except FileNotFoundError:
+            return f"{session_id}@absent"
+
+    def read(self, session_id: int, columns: Optional[Sequence[str]] = None, filter=None,
+             published_only: bool = True):
+        """Table Arrow des lignes d'une session ; filter : expression pyarrow.dataset"""
+        # Import différé : pyarrow n'est chargé que si une archive est lue
+        import pyarrow.dataset as ds
+
+        expression = ds.field("is_published") == True if published_only else None
+        if filter is not None:
+            expression = filter if expression is None else expression & filter
+        return self._dataset(session_id).to_table(
+            columns=list(columns) if columns else None, filter=expression
+        )
+
+    def cached(self, key: tuple, compute: Callable[[], Any]) -> Any:
+        """Résultat mémorisé (LRU de archive_cache_results entrées) ; key inclut les token() lus"""
+        with self._lock:
+            if key in self._results:
+                self._results.move_to_end(key)
+                return self._results[key]
+
+        value = compute()
+        with self._lock:
+            self._results[key] = value
+            self._results.move_to_end(key)
+            while len(self._results) > settings.archive_cache_results:
+                self._results.popitem(last=False)
+        return value
+
+    def forget(self, session_id: int):
+        """Archive écrite ou supprimée : fichiers ouverts et résultats de la session oubliés"""
+        prefix = f"{session_id}@"
+        with self._lock:
+            self._datasets.pop(session_id, None)
+            for key in [k for k in self._results if any(str(part).startswith(prefix) for part in k)]:
+                del self._results[key]
+
+    def _dataset(self, session_id: int):
+        import pyarrow.dataset as ds
+
+        token = self.token(session_id)
+        with self._lock:
+            opened = self._datasets.get(session_id)
+            if opened and opened[0] == token:
+                return opened[1]
+
+        # Lecture du pied de fichier seulement (schéma, groupes de lignes, statistiques)
+        dataset = ds.dataset(self.data_path(session_id), format="parquet")
+        with self._lock:
+            self._datasets[session_id] = (token, dataset)
+        return dataset
+
+archive_reader = ArchiveReader()
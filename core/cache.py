@@ -1,8 +1,10 @@
 import json
 import hashlib
-from typing import Any, Optional
+from typing import Any, Dict, List, Optional
 from database import get_redis
 from config import settings
+from core.metrics import metrics
+from core.local_store import local_store
 import logging
 
 logger = logging.getLogger(__name__)
@@ -23,30 +25,77 @@ class CacheManager:
             logger.warning(f"Redis connection failed: {e}")
             return None  # ✅ Graceful fallback
     
+    async def get_store(self):
+        """Redis si actif, sinon le stand-in local au processus (None si le repli est désactivé)"""
+        redis = await self.get_redis()
+        if redis:
+            return redis
+        return local_store if settings.cache_local_fallback else None
+    
     def _generate_key(self, prefix: str, **kwargs) -> str:
         key_data = json.dumps(kwargs, sort_keys=True, default=str)
         key_hash = hashlib.md5(key_data.encode()).hexdigest()[:8]
         return f"{prefix}:{key_hash}"
     
     async def get(self, key: str) -> Optional[Any]:
-        redis = await self.get_redis()
-        if not redis:
+        store = await self.get_store()
+        if not store:
+            metrics.record_cache(key, "bypass")
             return None
         try:
-            value = await redis.get(key)
+            value = await store.get(key)
             if value:
+                metrics.record_cache(key, "hit")
                 return json.loads(value)
+            metrics.record_cache(key, "miss")
         except Exception as e:
+            metrics.record_cache(key, "error")
             logger.warning(f"Cache get error: {e}")
         return None
     
     async def set(self, key: str, value: Any, ttl: int = 3600):
-        redis = await self.get_redis()
-        if not redis:
+        store = await self.get_store()
+        if not store:
             return
         try:
             value = json.dumps(value, default=str)
-            await redis.setex(key, ttl, value)
+            await store.setex(key, ttl, value)
+        except Exception as e:
+            logger.warning(f"Cache set error: {e}")
+    
+    async def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        """Valeurs des clés présentes, lues en un aller-retour (MGET)"""
+        if not keys:
+            return {}
+        store = await self.get_store()
+        if not store:
+            metrics.record_cache(keys[0], "bypass", len(keys))
+            return {}
+        try:
+            values = await store.mget(keys)
+        except Exception as e:
+            metrics.record_cache(keys[0], "error", len(keys))
+            logger.warning(f"Cache mget error: {e}")
+            return {}
+        found = {key: json.loads(value) for key, value in zip(keys, values) if value}
+        metrics.record_cache(keys[0], "hit", len(found))
+        metrics.record_cache(keys[0], "miss", len(keys) - len(found))
+        return found
+    
+    async def set_many(self, items: Dict[str, Any], ttl: int = 3600):
+        """Écrit plusieurs clés avec la même expiration (pipeline Redis, un aller-retour)"""
+        store = await self.get_store()
+        if not store or not items:
+            return
+        try:
+            if store is local_store:
+                for key, value in items.items():
+                    await store.setex(key, ttl, json.dumps(value, default=str))
+                return
+            async with store.pipeline(transaction=False) as pipe:
+                for key, value in items.items():
+                    pipe.setex(key, ttl, json.dumps(value, default=str))
+                await pipe.execute()
         except Exception as e:
             logger.warning(f"Cache set error: {e}")
     
@@ -57,5 +106,26 @@ class CacheManager:
     async def get_cached_search(self, search_params: dict) -> Optional[dict]:
         key = self._generate_key("search", **search_params)
         return await self.get(key)
+    
+    # data_version dans la clé : un recalcul de la session rend les statistiques précédentes caduques
+    async def cache_stats(self, stats_type: str, entity_id: int, year: int, exam_type: str,
+                          data_version: int, stats: dict):
+        key = self._generate_key("stats", type=stats_type, id=entity_id, year=year, exam_type=exam_type,
+                                 data_version=data_version)
+        await self.set(key, stats, settings.cache_ttl_stats)
+    
+    async def get_cached_stats(self, stats_type: str, entity_id: int, year: int, exam_type: str,
+                               data_version: int) -> Optional[dict]:
+        key = self._generate_key("stats", type=stats_type, id=entity_id, year=year, exam_type=exam_type,
+                                 data_version=data_version)
+        return await self.get(key)
+    
+    async def cache_references(self, name: str, params: dict, data: list):
+        key = self._generate_key("ref", name=name, **params)
+        await self.set(key, data, settings.cache_ttl_references)
+    
+    async def get_cached_references(self, name: str, params: dict) -> Optional[list]:
+        key = self._generate_key("ref", name=name, **params)
+        return await self.get(key)
 
 cache_manager = CacheManager()
\ No newline at end of file
@@ -0,0 +1,159 @@
+import asyncio
+import json
+from typing import Any, Awaitable, Callable, Dict, Optional
+from urllib.parse import urlencode
+from fastapi import HTTPException, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+from starlette.responses import Response
+from config import settings
+from core.metrics import metrics
+from database import SessionLocal
+import logging
+
+logger = logging.getLogger(__name__)
+
+# MessagePack est optionnel : sans msgpack, seul JSON est proposé
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+MSGPACK_ALIASES = (MSGPACK_MEDIA_TYPE, "application/x-msgpack", "application/vnd.msgpack")
+
+def serialize_json(result: Any) -> bytes:
+    # Même encodage que JSONResponse
+    return json.dumps(
+        jsonable_encoder(result), ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+def serialize(result: Any, media_type: str = JSON_MEDIA_TYPE) -> bytes:
+    """Corps de la réponse au format négocié (mêmes valeurs qu'en JSON : dates ISO, décimaux en nombres)"""
+    if media_type == MSGPACK_MEDIA_TYPE:
+        return msgpack.packb(jsonable_encoder(result), use_bin_type=True)
+    return serialize_json(result)
+
+def negotiate_media_type(accept: str) -> str:
+    """MessagePack si Accept le préfère explicitement à JSON (jamais par */*), sinon JSON"""
+    if msgpack is None or not accept:
+        return JSON_MEDIA_TYPE
+    qualities = {}
+    for part in accept.split(","):
+        media_type, _, params = part.partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[media_type.strip().lower()] = quality
+
+    best_msgpack = max(qualities.get(name, 0.0) for name in MSGPACK_ALIASES)
+    best_json = max(qualities.get(name, 0.0) for name in (JSON_MEDIA_TYPE, "application/*", "*/*"))
+    return MSGPACK_MEDIA_TYPE if best_msgpack > 0 and best_msgpack >= best_json else JSON_MEDIA_TYPE
+
+def own_session(func: Callable) -> Callable:
+    """Méthode d'un service rappelée sur une nouvelle instance et sa propre session SQLAlchemy,
+    fermée à la fin du calcul : get_db ferme la session du meneur dès la fin (ou la déconnexion)
+    de sa requête, alors que le calcul partagé continue pour les suiveurs.
+    Les autres fonctions sont rendues telles quelles"""
+    service = getattr(func, "__self__", None)
+    if not isinstance(getattr(service, "db", None), Session):
+        return func
+    service_class, name = type(service), func.__name__
+
+    if asyncio.iscoroutinefunction(func):
+        async def call(*args):
+            db = SessionLocal()
+            try:
+                return await getattr(service_class(db), name)(*args)
+            finally:
+                db.close()
+    else:
+        def call(*args):
+            db = SessionLocal()
+            try:
+                return getattr(service_class(db), name)(*args)
+            finally:
+                db.close()
+    return call
+
+class RequestCoalescer:
+    """Single-flight par processus : des lectures identiques simultanées partagent un seul calcul
+    et reçoivent les mêmes octets JSON"""
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    @staticmethod
+    def request_key(request: Request) -> str:
+        """Clé normalisée : chemin et paramètres triés ('?b=2&a=1' et '?a=1&b=2' sont identiques)"""
+        query = urlencode(sorted(request.query_params.multi_items()))
+        return f"{request.method} {request.url.path}?{query}"
+
+    async def run(self, key: str, route: str, func: Callable, *args,
+                  not_found: Optional[str] = None, media_type: str = JSON_MEDIA_TYPE) -> bytes:
+        """Exécute func(*args) une seule fois pour toutes les requêtes en attente sur la même clé.
+        Les fonctions synchrones (requêtes SQL bloquantes) tournent dans le pool de threads ;
+        avec not_found, un résultat vide lève un 404 chez le meneur comme chez les suiveurs"""
+        return await self.share(key, route, lambda: self.compute_json(func, args, not_found, media_type))
+
+    async def share(self, key: str, route: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """Single-flight générique : factory() n'est appelée que par le premier demandeur d'une clé"""
+        if not settings.coalescing_enabled:
+            return await factory()
+
+        task = self._inflight.get(key)
+        if task is not None:
+            metrics.record_coalescing(route, "follower")
+        else:
+            metrics.record_coalescing(route, "leader")
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+
+        # shield : un client qui se déconnecte n'annule pas le calcul des autres
+        return await asyncio.shield(task)
+
+    async def respond(self, request: Request, func: Callable, *args,
+                      not_found: Optional[str] = None, media_type: Optional[str] = None) -> Response:
+        """Réponse JSON d'une route GET, calculée une fois par rafale de requêtes identiques.
+        media_type : format négocié par la route (negotiate_media_type), la réponse varie alors selon Accept"""
+        key = self.request_key(request)
+        if media_type and media_type != JSON_MEDIA_TYPE:
+            key = f"{key} {media_type}"
+        body = await self.run(
+            key, metrics.route_template(request), func, *args,
+            not_found=not_found, media_type=media_type or JSON_MEDIA_TYPE
+        )
+        headers = {"Vary": "Accept"} if media_type else None
+        return Response(content=body, media_type=media_type or JSON_MEDIA_TYPE, headers=headers)
+
+    @staticmethod
+    async def compute_json(func: Callable, args: tuple, not_found: Optional[str] = None,
+                           media_type: str = JSON_MEDIA_TYPE) -> bytes:
+        """Appelle func(*args) (dans le pool de threads si synchrone) et sérialise le résultat ;
+        une méthode de service s'exécute sur sa propre session (own_session)"""
+        func = own_session(func)
+        if asyncio.iscoroutinefunction(func):
+            result = await func(*args)
+        else:
+            result = await run_in_threadpool(func, *args)
+        if not_found and not result:
+            raise HTTPException(status_code=404, detail=not_found)
+        return await run_in_threadpool(serialize, result, media_type)
+
+    def _finish(self, key: str, task: asyncio.Future):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Évite « exception never retrieved » si tous les demandeurs sont partis
+        if not task.cancelled() and task.exception() is not None \
+                and not isinstance(task.exception(), HTTPException):
+            logger.debug(f"Calcul partagé en échec pour {key}: {task.exception()}")
+
+request_coalescer = RequestCoalescer()
@@ -0,0 +1,204 @@
+import gzip
+import hashlib
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Optional, Tuple
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from config import settings
+
+# brotli et zstandard sont optionnels : sans eux, seul gzip est proposé
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Encodages disponibles, par ordre de préférence à qualité égale
+ENCODINGS: Tuple[str, ...] = tuple(
+    name for name, module in (("br", brotli), ("zstd", zstandard), ("gzip", zlib)) if module is not None
+)
+
+# Types déjà compressés (parquet, images, archives) exclus
+COMPRESSIBLE_TYPES = (
+    "application/json", "application/msgpack", "text/", "application/javascript", "application/xml", "image/svg+xml"
+)
+
+def negotiate(accept_encoding: str, offered: Tuple[str, ...] = ENCODINGS) -> Optional[str]:
+    """Encodage à utiliser d'après Accept-Encoding (qualités q=), None pour envoyer le corps brut"""
+    qualities = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        params = params.strip().replace(" ", "")
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        qualities[coding] = quality
+
+    best, best_quality = None, 0.0
+    for encoding in offered:
+        quality = qualities.get(encoding, qualities.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+def compression_level(content_type: str, encoding: str) -> int:
+    media_type = content_type.split(";")[0].strip().lower()
+    levels = settings.compression_levels.get(media_type) or settings.compression_levels["default"]
+    return levels[encoding]
+
+def compress(body: bytes, encoding: str, level: int) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=level)
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=level).compress(body)
+    # mtime=0 : même entrée, mêmes octets (variantes mémorisables et comparables)
+    return gzip.compress(body, compresslevel=level, mtime=0)
+
+class StreamCompressor:
+    """Compression bloc par bloc d'une réponse en flux (exports)"""
+
+    def __init__(self, encoding: str, level: int):
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=level)
+            self._compress, self._finish = self._compressor.process, self._compressor.finish
+        elif encoding == "zstd":
+            self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+            self._compress, self._finish = self._compressor.compress, self._compressor.flush
+        else:
+            self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31 : en-tête gzip
+            self._compress, self._finish = self._compressor.compress, self._compressor.flush
+
+    def compress(self, chunk: bytes) -> bytes:
+        return self._compress(chunk)
+
+    def finish(self) -> bytes:
+        return self._finish()
+
+class CompressedVariants:
+    """Mémoire des variantes compressées de corps identiques (même page de recherche, même liste
+    de référence) : l'empreinte du corps coûte bien moins cher que sa recompression"""
+
+    def __init__(self):
+        self._entries: "OrderedDict[Tuple[bytes, str, int], bytes]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()  # Utilisé depuis la boucle et le pool de threads
+
+    def compress(self, body: bytes, encoding: str, level: int) -> bytes:
+        key = (hashlib.blake2b(body, digest_size=16).digest(), encoding, level)
+        with self._lock:
+            compressed = self._entries.get(key)
+            if compressed is not None:
+                self._entries.move_to_end(key)
+                return compressed
+
+        compressed = compress(body, encoding, level)
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = compressed
+                self._size += len(compressed)
+            while self._size > settings.compression_memo_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+        return compressed
+
+compressed_variants = CompressedVariants()
+
+class CompressionMiddleware:
+    """Remplace GZipMiddleware : négociation br/zstd/gzip, niveaux par type de contenu,
+    compression des gros corps hors de la boucle d'événements et variantes mémorisées.
+
+    Laisse passer tel quel ce qui porte déjà un Content-Encoding (instantanés pré-compressés,
+    plages d'export en identity), les réponses partielles et les types non compressibles.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Optional[Message] = None
+        stream: Optional[StreamCompressor] = None
+        passthrough = False
+        level = 0
+
+        async def send_compressed(message: Message):
+            nonlocal start, stream, passthrough, level
+
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                content_type = headers.get("content-type", "")
+                if (message["status"] == 206 or "content-encoding" in headers or "content-range" in headers
+                        or not content_type.startswith(COMPRESSIBLE_TYPES)):
+                    passthrough = True
+                    await send(message)
+                    return
+                # En-têtes retenus jusqu'au premier bloc : taille et mode (bloc unique ou flux) encore inconnus
+                start = message
+                level = compression_level(content_type, encoding)
+                return
+
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if start is not None:
+                initial, start = start, None
+                headers = MutableHeaders(raw=initial["headers"])
+
+                if not more_body:
+                    if len(body) < settings.compression_minimum_size:
+                        await send(initial)
+                        await send(message)
+                        return
+                    body = await self._run(compressed_variants.compress, body, encoding, level)
+                    headers["Content-Encoding"] = encoding
+                    headers["Content-Length"] = str(len(body))
+                    headers.add_vary_header("Accept-Encoding")
+                    await send(initial)
+                    await send({"type": "http.response.body", "body": body})
+                    return
+
+                # Réponse en flux : longueur finale inconnue
+                stream = StreamCompressor(encoding, level)
+                headers["Content-Encoding"] = encoding
+                if "content-length" in headers:
+                    del headers["Content-Length"]
+                headers.add_vary_header("Accept-Encoding")
+                await send(initial)
+
+            chunk = await self._run(stream.compress, body) if body else b""
+            if not more_body:
+                chunk += stream.finish()
+            await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
+
+    @staticmethod
+    async def _run(func, body: bytes, *args):
+        # Petits corps compressés sur place : le passage par un thread coûterait plus cher
+        if len(body) >= settings.compression_offload_size:
+            return await run_in_threadpool(func, body, *args)
+        return func(body, *args)
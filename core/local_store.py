@@ -0,0 +1,208 @@
+import time
+from bisect import bisect_left, insort
+from typing import Any, Dict, List, Optional, Tuple
+
+class LocalStore:
+    """Stand-in local (par processus) d'un sous-ensemble des commandes Redis.
+
+    Utilisé quand Redis est désactivé ou indisponible : mêmes signatures que
+    redis.asyncio pour les chaînes, les sorted sets, les hashes et l'expiration des clés.
+    """
+
+    def __init__(self):
+        self._data: Dict[str, Any] = {}
+        self._expires: Dict[str, float] = {}
+        self._sweep_at = 1024
+
+    def _alive(self, key: str) -> bool:
+        expires_at = self._expires.get(key)
+        if expires_at is not None and expires_at <= time.monotonic():
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+        return key in self._data
+
+    def _zset(self, key: str, create: bool = False) -> Optional[Tuple[List, Dict]]:
+        if self._alive(key):
+            return self._data[key]
+        if not create:
+            return None
+        # Liste triée de (score, membre) + index membre -> score
+        self._data[key] = ([], {})
+        return self._data[key]
+
+    def _hash(self, key: str, create: bool = False) -> Optional[Dict[str, str]]:
+        if self._alive(key):
+            return self._data[key]
+        if not create:
+            return None
+        self._data[key] = {}
+        return self._data[key]
+
+    @staticmethod
+    def _slice(length: int, start: int, end: int) -> Tuple[int, int]:
+        if start < 0:
+            start = max(length + start, 0)
+        if end < 0:
+            end = length + end
+        return start, min(end, length - 1) + 1
+
+    # Clés
+    async def exists(self, *keys: str) -> int:
+        return sum(1 for key in keys if self._alive(key))
+
+    async def delete(self, *keys: str) -> int:
+        deleted = 0
+        for key in keys:
+            if self._alive(key):
+                deleted += 1
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+        return deleted
+
+    async def expire(self, key: str, seconds: int) -> bool:
+        if not self._alive(key):
+            return False
+        self._expires[key] = time.monotonic() + seconds
+        if len(self._expires) >= self._sweep_at:
+            self._sweep()
+        return True
+
+    async def ttl(self, key: str) -> int:
+        """Secondes avant expiration ; -1 sans expiration, -2 si la clé n'existe pas (comme Redis)"""
+        if not self._alive(key):
+            return -2
+        expires_at = self._expires.get(key)
+        return -1 if expires_at is None else max(0, round(expires_at - time.monotonic()))
+
+    def _sweep(self):
+        """Purge des clés expirées jamais relues (ex. un bucket par client), coût amorti"""
+        now = time.monotonic()
+        for key in [k for k, expires_at in self._expires.items() if expires_at <= now]:
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+        self._sweep_at = max(1024, 2 * len(self._expires))
+
+    # Chaînes
+    async def get(self, key: str) -> Optional[str]:
+        return self._data[key] if self._alive(key) else None
+
+    async def mget(self, keys: List[str]) -> List[Optional[str]]:
+        return [self._data[key] if self._alive(key) else None for key in keys]
+
+    async def set(self, key: str, value: str, ex: Optional[int] = None) -> bool:
+        self._data[key] = value
+        self._expires.pop(key, None)
+        if ex:
+            await self.expire(key, ex)
+        return True
+
+    async def setex(self, key: str, seconds: int, value: str) -> bool:
+        return await self.set(key, value, ex=seconds)
+
+    async def incr(self, key: str, amount: int = 1) -> int:
+        # Valeurs stockées en chaînes comme Redis ; l'expiration éventuelle est conservée
+        value = int(self._data[key]) + amount if self._alive(key) else amount
+        self._data[key] = str(value)
+        return value
+
+    # Sorted sets
+    async def zadd(self, key: str, mapping: Dict[str, float]) -> int:
+        entries, scores = self._zset(key, create=True)
+        added = 0
+        for member, score in mapping.items():
+            score = float(score)
+            previous = scores.get(member)
+            if previous is not None:
+                entries.pop(bisect_left(entries, (previous, member)))
+            else:
+                added += 1
+            scores[member] = score
+            insort(entries, (score, member))
+        return added
+
+    async def zrem(self, key: str, *members: str) -> int:
+        zset = self._zset(key)
+        if not zset:
+            return 0
+        entries, scores = zset
+        removed = 0
+        for member in members:
+            score = scores.pop(member, None)
+            if score is not None:
+                entries.pop(bisect_left(entries, (score, member)))
+                removed += 1
+        return removed
+
+    async def zcard(self, key: str) -> int:
+        zset = self._zset(key)
+        return len(zset[1]) if zset else 0
+
+    async def zscore(self, key: str, member: str) -> Optional[float]:
+        zset = self._zset(key)
+        return zset[1].get(member) if zset else None
+
+    async def zrange(self, key: str, start: int, end: int, withscores: bool = False) -> List:
+        zset = self._zset(key)
+        if not zset:
+            return []
+        entries = zset[0]
+        lo, hi = self._slice(len(entries), start, end)
+        selected = entries[lo:hi]
+        if withscores:
+            return [(member, score) for score, member in selected]
+        return [member for _, member in selected]
+
+    async def zrevrange(self, key: str, start: int, end: int, withscores: bool = False) -> List:
+        zset = self._zset(key)
+        if not zset:
+            return []
+        entries = zset[0]
+        lo, hi = self._slice(len(entries), start, end)
+        length = len(entries)
+        selected = [entries[length - 1 - i] for i in range(lo, hi)]
+        if withscores:
+            return [(member, score) for score, member in selected]
+        return [member for _, member in selected]
+
+    async def zremrangebyrank(self, key: str, start: int, end: int) -> int:
+        zset = self._zset(key)
+        if not zset:
+            return 0
+        entries, scores = zset
+        lo, hi = self._slice(len(entries), start, end)
+        if lo >= hi:
+            return 0
+        for _, member in entries[lo:hi]:
+            del scores[member]
+        del entries[lo:hi]
+        return hi - lo
+
+    # Hashes
+    async def hset(self, key: str, field: Optional[str] = None, value: Optional[str] = None,
+                   mapping: Optional[Dict[str, str]] = None) -> int:
+        data = self._hash(key, create=True)
+        items = dict(mapping or {})
+        if field is not None:
+            items[field] = value
+        added = sum(1 for f in items if f not in data)
+        data.update({str(f): v for f, v in items.items()})
+        return added
+
+    async def hget(self, key: str, field: str) -> Optional[str]:
+        data = self._hash(key)
+        return data.get(str(field)) if data else None
+
+    async def hmget(self, key: str, fields: List[str]) -> List[Optional[str]]:
+        data = self._hash(key) or {}
+        return [data.get(str(f)) for f in fields]
+
+    async def hgetall(self, key: str) -> Dict[str, str]:
+        return dict(self._hash(key) or {})
+
+    async def hdel(self, key: str, *fields: str) -> int:
+        data = self._hash(key)
+        if not data:
+            return 0
+        return sum(1 for f in fields if data.pop(str(f), None) is not None)
+
+local_store = LocalStore()
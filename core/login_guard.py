@@ -0,0 +1,100 @@
+import asyncio
+from typing import Dict, Optional
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func, or_, update
+from config import settings
+from database import SessionLocal
+from models.database import AdminUser
+from core.cache import cache_manager
+from core.principal_cache import principal_cache
+import logging
+
+logger = logging.getLogger(__name__)
+
+class LoginGuard:
+    """Limitation des tentatives de connexion et écriture groupée des échecs.
+
+    Les échecs sont comptés par nom d'utilisateur et par adresse IP sur une fenêtre de
+    login_failure_window secondes ouverte au premier échec (Redis si actif, sinon mémoire du
+    processus) : au-delà des seuils, la connexion est refusée (429) avant toute lecture en base et
+    tout hachage. Les incréments de login_attempts sont regroupés et écrits toutes les
+    login_attempts_flush_interval secondes, sauf quand ils atteignent le seuil de verrouillage :
+    le compte est alors verrouillé sans attendre.
+    """
+
+    def __init__(self):
+        self._pending: Dict[str, int] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+
+    async def retry_after(self, username: str, client: str) -> Optional[int]:
+        """Secondes avant une nouvelle tentative si l'un des compteurs est épuisé, sinon None"""
+        store = await cache_manager.get_store()
+        if not store:
+            return None
+        for key, limit in ((self._key("user", username), settings.login_max_failures_user),
+                           (self._key("ip", client), settings.login_max_failures_ip)):
+            failures = await store.get(key)
+            if failures and int(failures) >= limit:
+                ttl = await store.ttl(key)
+                return max(1, ttl if ttl > 0 else settings.login_failure_window)
+        return None
+
+    async def record_failure(self, username: str, client: str, login_attempts: Optional[int] = None):
+        """Échec de connexion ; login_attempts : compteur lu en base si le compte existe"""
+        store = await cache_manager.get_store()
+        if store:
+            for key in (self._key("user", username), self._key("ip", client)):
+                if await store.incr(key) == 1:
+                    await store.expire(key, settings.login_failure_window)
+
+        if login_attempts is None:
+            return
+        self._pending[username] = self._pending.get(username, 0) + 1
+        if login_attempts + self._pending[username] >= settings.login_lock_threshold:
+            await self.flush()
+        elif self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def record_success(self, username: str):
+        """Connexion réussie : l'appelant remet login_attempts à zéro, les échecs en attente sont oubliés"""
+        self._pending.pop(username, None)
+        store = await cache_manager.get_store()
+        if store:
+            await store.delete(self._key("user", username))
+
+    async def flush(self):
+        """Écrit les échecs en attente (une requête par compte, une transaction)"""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        try:
+            await run_in_threadpool(self._write, pending)
+        except Exception as e:
+            logger.error(f"Écriture des échecs de connexion impossible: {e}")
+
+    async def _flush_later(self):
+        await asyncio.sleep(settings.login_attempts_flush_interval)
+        await self.flush()
+
+    @staticmethod
+    def _write(pending: Dict[str, int]):
+        db = SessionLocal()
+        try:
+            for username, failures in pending.items():
+                attempts = func.coalesce(AdminUser.login_attempts, 0) + failures
+                db.execute(update(AdminUser).where(AdminUser.username == username).values(
+                    login_attempts=attempts,
+                    is_locked=or_(AdminUser.is_locked == True, attempts >= settings.login_lock_threshold)
+                ).execution_options(synchronize_session=False))
+            db.commit()
+        finally:
+            db.close()
+        # UPDATE en masse : les événements de l'ORM ne passent pas, invalidation explicite
+        for username in pending:
+            principal_cache.invalidate(username)
+
+    @staticmethod
+    def _key(kind: str, value: str) -> str:
+        return f"login_failures:{kind}:{value}"
+
+login_guard = LoginGuard()
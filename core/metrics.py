@@ -0,0 +1,144 @@
+import os
+from typing import Tuple
+from fastapi import Request
+from prometheus_client import (
+    CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, CONTENT_TYPE_LATEST, generate_latest, multiprocess
+)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, default
+from config import settings
+
+# Avec plusieurs workers uvicorn/gunicorn, PROMETHEUS_MULTIPROC_DIR doit pointer vers un dossier
+# vide au démarrage : chaque processus y écrit ses valeurs, agrégées à la lecture de /metrics
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Durée des requêtes HTTP par route",
+    ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress", "Requêtes HTTP en cours",
+    ["method"], multiprocess_mode="livesum"
+)
+CACHE_OPERATIONS = Counter(
+    "cache_operations_total", "Lectures du cache par type de clé et résultat (hit, miss, error, bypass, persisted)",
+    ["cache", "result"]
+)
+DB_POOL_CONNECTIONS = Gauge(
+    "db_pool_connections", "Connexions du pool SQLAlchemy (open : ouvertes, in_use : empruntées)",
+    ["engine", "state"], multiprocess_mode="livesum"
+)
+DB_STATEMENT_CACHE = Counter(
+    "db_statement_cache_total",
+    "Exécutions SQL selon le cache de compilation SQLAlchemy (hit, miss, no_key, disabled, unsupported)",
+    ["engine", "result"]
+)
+ADMISSION_DECISIONS = Counter(
+    "admission_decisions_total",
+    "Décisions du contrôle d'admission (admitted, queued, queue_full, timeout, rate_limited)",
+    ["route_class", "decision"]
+)
+COALESCED_REQUESTS = Counter(
+    "coalesced_requests_total",
+    "Lectures passées par le single-flight (leader : calcul effectué, follower : résultat partagé)",
+    ["route", "role"]
+)
+UPLOAD_ROWS = Counter(
+    "upload_rows_total", "Lignes traitées par l'upload en masse", ["status"]
+)
+UPLOAD_DURATION = Histogram(
+    "upload_duration_seconds", "Durée de traitement d'un upload en masse",
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800)
+)
+UPLOAD_THROUGHPUT = Histogram(
+    "upload_throughput_rows_per_second", "Débit d'ingestion d'un upload en masse (lignes/s)",
+    buckets=(10, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000)
+)
+
+# État du cache de compilation porté par le contexte d'exécution SQLAlchemy
+_STATEMENT_CACHE_RESULTS = {
+    default.CACHE_HIT: "hit",
+    default.CACHE_MISS: "miss",
+    default.NO_CACHE_KEY: "no_key",
+    default.CACHING_DISABLED: "disabled",
+    default.NO_DIALECT_SUPPORT: "unsupported"
+}
+
+class Metrics:
+    """Collecteurs Prometheus en mémoire du processus (mode multiprocess si configuré)"""
+
+    @staticmethod
+    def route_template(request: Request) -> str:
+        """Gabarit de la route résolue ('/stats/wilaya/{wilaya_id}'), pour borner la cardinalité des labels"""
+        route = request.scope.get("route")
+        return getattr(route, "path", None) or "unmatched"
+
+    def request_started(self, method: str):
+        if settings.metrics_enabled:
+            HTTP_REQUESTS_IN_PROGRESS.labels(method).inc()
+
+    def request_finished(self, request: Request, status_code: int, duration: float):
+        """À appeler après le routage, une fois la route connue"""
+        if settings.metrics_enabled:
+            HTTP_REQUESTS_IN_PROGRESS.labels(request.method).dec()
+            HTTP_REQUEST_DURATION.labels(request.method, self.route_template(request), str(status_code)).observe(duration)
+
+    def record_cache(self, key: str, result: str, count: int = 1):
+        if settings.metrics_enabled and count:
+            CACHE_OPERATIONS.labels(key.split(":", 1)[0], result).inc(count)
+
+    def record_admission(self, route_class: str, decision: str):
+        if settings.metrics_enabled:
+            ADMISSION_DECISIONS.labels(route_class, decision).inc()
+
+    def record_coalescing(self, route: str, role: str):
+        if settings.metrics_enabled:
+            COALESCED_REQUESTS.labels(route, role).inc()
+
+    def record_upload(self, success_count: int, error_count: int, duration: float):
+        if not settings.metrics_enabled:
+            return
+        UPLOAD_ROWS.labels("success").inc(success_count)
+        UPLOAD_ROWS.labels("error").inc(error_count)
+        UPLOAD_DURATION.observe(duration)
+        if duration > 0:
+            UPLOAD_THROUGHPUT.observe((success_count + error_count) / duration)
+
+    def install_pool(self, engine: Engine, name: str):
+        """Suit les connexions ouvertes et empruntées du pool via ses événements"""
+        if not settings.metrics_enabled:
+            return
+
+        opened = DB_POOL_CONNECTIONS.labels(name, "open")
+        in_use = DB_POOL_CONNECTIONS.labels(name, "in_use")
+        event.listen(engine, "connect", lambda dbapi_connection, record: opened.inc())
+        event.listen(engine, "close", lambda dbapi_connection, record: opened.dec())
+        event.listen(engine, "checkout", lambda dbapi_connection, record, proxy: in_use.inc())
+        event.listen(engine, "checkin", lambda dbapi_connection, record: in_use.dec())
+
+    def install_statement_cache(self, engine: Engine, name: str):
+        """Compte les exécutions servies par le cache de compilation (taux de hit des requêtes précompilées)"""
+        if not settings.metrics_enabled:
+            return
+
+        counters = {
+            symbol: DB_STATEMENT_CACHE.labels(name, result) for symbol, result in _STATEMENT_CACHE_RESULTS.items()
+        }
+
+        def count(conn, cursor, statement, parameters, context, executemany):
+            counter = counters.get(getattr(context, "cache_hit", None))
+            if counter:
+                counter.inc()
+
+        event.listen(engine, "before_cursor_execute", count)
+
+    @staticmethod
+    def render() -> Tuple[bytes, str]:
+        if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        else:
+            registry = REGISTRY
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+
+metrics = Metrics()
@@ -0,0 +1,87 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+from sqlalchemy import event, inspect
+from config import settings
+from core.metrics import metrics
+
+# Colonnes d'un administrateur qui changent ce qu'il peut faire : leur modification invalide son entrée
+PRINCIPAL_FIELDS = (
+    "username", "role", "is_locked", "can_publish_results", "can_manage_users",
+    "can_view_analytics", "allowed_wilayas"
+)
+
+class PrincipalCache:
+    """Jetons décodés et administrateurs authentifiés, gardés en mémoire du processus.
+
+    Un jeton décodé est réutilisé jusqu'à son expiration ; l'administrateur est relu en base au plus
+    toutes les principal_cache_ttl secondes, par (username, jti). Une modification de ses droits ou
+    de son verrouillage par l'ORM invalide aussitôt ses entrées dans ce processus ; les autres
+    workers (et les modifications directes en base) suivent au plus tard à l'expiration du TTL.
+    """
+
+    def __init__(self):
+        self._tokens: "OrderedDict[str, Tuple[Dict[str, Any], float]]" = OrderedDict()
+        self._principals: "OrderedDict[Tuple[str, str], Tuple[Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def decode(self, token: str, decode: Callable[[str], Dict[str, Any]]) -> Dict[str, Any]:
+        """Contenu du jeton ; decode (vérification de la signature) n'est appelé qu'une fois par jeton"""
+        with self._lock:
+            cached = self._tokens.get(token)
+            if cached and cached[1] > time.time():
+                self._tokens.move_to_end(token)
+                return cached[0]
+
+        payload = decode(token)
+        expires_at = payload.get("exp")
+        if expires_at:
+            with self._lock:
+                self._tokens[token] = (payload, float(expires_at))
+                self._trim(self._tokens)
+        return payload
+
+    def get(self, username: str, token_id: str) -> Optional[Any]:
+        key = (username, token_id)
+        with self._lock:
+            cached = self._principals.get(key)
+            if cached and cached[1] > time.monotonic():
+                self._principals.move_to_end(key)
+                metrics.record_cache("principal", "hit")
+                return cached[0]
+            self._principals.pop(key, None)
+        metrics.record_cache("principal", "miss")
+        return None
+
+    def put(self, username: str, token_id: str, user: Any):
+        """user : instance détachée de sa session, partagée en lecture seule par les requêtes suivantes"""
+        with self._lock:
+            self._principals[(username, token_id)] = (user, time.monotonic() + settings.principal_cache_ttl)
+            self._trim(self._principals)
+
+    def invalidate(self, username: str):
+        """Oublie les administrateurs en cache de ce nom (toutes ses sessions) ; ses jetons restent décodés"""
+        with self._lock:
+            for key in [key for key in self._principals if key[0] == username]:
+                del self._principals[key]
+
+    def install(self, model):
+        """Invalide l'entrée d'un administrateur modifié (PRINCIPAL_FIELDS) ou supprimé par l'ORM"""
+
+        def after_update(mapper, connection, target):
+            state = inspect(target)
+            if any(state.attrs[name].history.has_changes() for name in PRINCIPAL_FIELDS):
+                history = state.attrs.username.history
+                for username in (*history.deleted, target.username):
+                    self.invalidate(username)
+
+        event.listen(model, "after_update", after_update)
+        event.listen(model, "after_delete", lambda mapper, connection, target: self.invalidate(target.username))
+
+    @staticmethod
+    def _trim(cache: OrderedDict):
+        while len(cache) > settings.principal_cache_size:
+            cache.popitem(last=False)
+
+principal_cache = PrincipalCache()
@@ -0,0 +1,77 @@
+import random
+import time
+from collections import Counter
+from contextvars import ContextVar, Token
+from typing import List, Optional, Tuple
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+class QueryProfile:
+    """Requêtes SQL exécutées pendant une requête HTTP"""
+
+    __slots__ = ("count", "duration", "shapes")
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        # Texte SQL paramétré : deux appels avec des valeurs différentes ont la même forme
+        self.shapes: Counter = Counter()
+
+    @property
+    def duplicates(self) -> int:
+        """Requêtes dont la forme a déjà été exécutée pendant la même requête HTTP"""
+        return self.count - len(self.shapes)
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        return [(shape, n) for shape, n in self.shapes.most_common() if n >= threshold]
+
+class QueryProfiler:
+    """Compte les requêtes, le temps passé en base et les formes répétées (N+1), par requête HTTP échantillonnée"""
+
+    def __init__(self):
+        self._current: ContextVar[Optional[QueryProfile]] = ContextVar("query_profile", default=None)
+
+    def install(self, engine: Engine):
+        """Branche les compteurs sur un moteur SQLAlchemy (synchrone, ou sync_engine d'un moteur async)"""
+        if not settings.query_profiler_enabled:
+            return
+        event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+
+    def start(self) -> Optional[Token]:
+        """Démarre le profilage de la requête courante si elle est tirée par l'échantillonnage"""
+        if not settings.query_profiler_enabled or random.random() >= settings.query_profiler_sample_rate:
+            return None
+        return self._current.set(QueryProfile())
+
+    def stop(self, token: Token) -> QueryProfile:
+        profile = self._current.get()
+        self._current.reset(token)
+        return profile
+
+    def report_n_plus_one(self, profile: QueryProfile, method: str, path: str):
+        for shape, n in profile.repeated(settings.query_profiler_n_plus_one_threshold):
+            logger.warning(
+                f"N+1 probable sur {method} {path}: {n} exécutions de "
+                f"{' '.join(shape.split())[:300]}"
+            )
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if self._current.get() is not None:
+            conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        profile = self._current.get()
+        if profile is None:
+            return
+        starts = conn.info.get("query_start_time")
+        if starts:
+            profile.duration += time.perf_counter() - starts.pop()
+        profile.count += 1
+        profile.shapes[statement] += 1
+
+query_profiler = QueryProfiler()
@@ -0,0 +1,202 @@
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, NamedTuple, Optional, Set, Tuple
+from urllib.parse import urlencode
+from fastapi import Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from starlette.responses import Response
+from config import settings
+from core.coalescing import request_coalescer
+from core.compression import ENCODINGS, compress, negotiate
+from core.metrics import metrics
+from database import SessionLocal
+from models.database import ExamSession, ResponseSnapshot
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Colonne de response_snapshots par encodage
+VARIANT_COLUMNS = {"gzip": "body_gzip", "br": "body_br", "zstd": "body_zstd"}
+
+class Snapshot(NamedTuple):
+    body: bytes
+    variants: Dict[str, bytes]  # Encodage -> corps compressé (vide pour les petits corps)
+
+class ResponseStore:
+    """Réponses JSON pré-sérialisées (et pré-compressées en br, zstd, gzip) des pages de statistiques.
+
+    Une page est entièrement déterminée par sa route, ses paramètres et la génération
+    (data_version) de la session : l'instantané est calculé une fois, persisté dans
+    response_snapshots (partagé entre workers, conservé au redémarrage) et gardé en
+    mémoire dans un LRU par processus. Un recalcul de la session change la génération,
+    les anciens instantanés ne sont plus jamais lus puis sont purgés.
+    """
+
+    def __init__(self):
+        self._memory: "OrderedDict[Tuple[str, int], Snapshot]" = OrderedDict()
+        # (année, type) -> ((session_id, data_version) ou None, instant de lecture)
+        self._generations: Dict[Tuple[int, str], Tuple[Optional[Tuple[int, int]], float]] = {}
+
+    @staticmethod
+    def snapshot_key(route: str, params: Dict[str, Any]) -> str:
+        """Gabarit de route + paramètres résolus triés (les paramètres absents sont ignorés)"""
+        items = sorted((name, value) for name, value in params.items() if value is not None)
+        return f"{route}?{urlencode(items)}"
+
+    async def respond(self, request: Request, params: Dict[str, Any], func: Callable, *args,
+                      not_found: Optional[str] = None) -> Response:
+        """Sert l'instantané de la page ; params doit contenir year et exam_type"""
+        if not settings.response_store_enabled:
+            return await request_coalescer.respond(request, func, *args, not_found=not_found)
+
+        generation = await self._generation(params["year"], params["exam_type"])
+        if generation is None:
+            # Session inconnue : le service répond (404)
+            return await request_coalescer.respond(request, func, *args, not_found=not_found)
+
+        session_id, data_version = generation
+        route = metrics.route_template(request)
+        key = self.snapshot_key(route, params)
+
+        snapshot = self._recall(key, data_version)
+        if snapshot is not None:
+            metrics.record_cache("snapshot", "hit")
+        else:
+            snapshot = await request_coalescer.share(
+                f"snapshot {key} v{data_version}", route,
+                lambda: self._load_or_build(session_id, data_version, key, func, args, not_found)
+            )
+
+        headers = {"Vary": "Accept-Encoding"}
+        encoding = negotiate(request.headers.get("accept-encoding", ""), tuple(snapshot.variants))
+        if encoding:
+            # Content-Encoding déjà posé : le middleware de compression laisse passer le corps tel quel
+            headers["Content-Encoding"] = encoding
+            return Response(content=snapshot.variants[encoding], media_type="application/json", headers=headers)
+        return Response(content=snapshot.body, media_type="application/json", headers=headers)
+
+    async def put(self, session_id: int, data_version: int, key: str, body: bytes,
+                  replace: bool = False) -> Snapshot:
+        """Enregistre le corps JSON d'une page (premier calcul, ou préchauffage avec replace : l'instantané
+        d'une requête servie pendant le recalcul est remplacé)"""
+        snapshot = await run_in_threadpool(self._save, session_id, data_version, key, body, replace)
+        self._remember(key, data_version, snapshot)
+        return snapshot
+
+    def persisted_keys(self, db: Session, session_id: int, data_version: int) -> Set[str]:
+        """Clés des instantanés déjà persistés pour une génération de session"""
+        rows = db.query(ResponseSnapshot.cache_key).filter(
+            ResponseSnapshot.session_id == session_id, ResponseSnapshot.data_version == data_version
+        ).all()
+        return {key for (key,) in rows}
+
+    def purge_stale(self, db: Session, session_id: int) -> int:
+        """Supprime les instantanés des générations précédentes d'une session"""
+        current = db.query(ExamSession.data_version).filter(ExamSession.id == session_id).scalar()
+        deleted = db.query(ResponseSnapshot).filter(
+            ResponseSnapshot.session_id == session_id,
+            ResponseSnapshot.data_version < (current or 0)
+        ).delete(synchronize_session=False)
+        db.commit()
+        # Ce processus voit la nouvelle génération tout de suite, les autres après response_store_generation_ttl
+        self._generations.clear()
+        return deleted
+
+    async def _load_or_build(self, session_id: int, data_version: int, key: str,
+                             func: Callable, args: tuple, not_found: Optional[str]) -> Snapshot:
+        snapshot = await run_in_threadpool(self._load, key, data_version)
+        if snapshot is not None:
+            metrics.record_cache("snapshot", "persisted")
+            self._remember(key, data_version, snapshot)
+            return snapshot
+
+        metrics.record_cache("snapshot", "miss")
+        body = await request_coalescer.compute_json(func, args, not_found)
+        return await self.put(session_id, data_version, key, body)
+
+    async def _generation(self, year: int, exam_type: str) -> Optional[Tuple[int, int]]:
+        cached = self._generations.get((year, exam_type))
+        if cached and time.monotonic() - cached[1] < settings.response_store_generation_ttl:
+            return cached[0]
+
+        generation = await run_in_threadpool(self._read_generation, year, exam_type)
+        self._generations[(year, exam_type)] = (generation, time.monotonic())
+        return generation
+
+    @staticmethod
+    def _read_generation(year: int, exam_type: str) -> Optional[Tuple[int, int]]:
+        db = SessionLocal()
+        try:
+            row = db.query(ExamSession.id, ExamSession.data_version).filter(
+                ExamSession.year == year, ExamSession.exam_type == exam_type
+            ).first()
+            return (row.id, row.data_version) if row else None
+        finally:
+            db.close()
+
+    @staticmethod
+    def _load(key: str, data_version: int) -> Optional[Snapshot]:
+        db = SessionLocal()
+        try:
+            row = db.query(ResponseSnapshot).filter(
+                ResponseSnapshot.cache_key == key, ResponseSnapshot.data_version == data_version
+            ).first()
+            if not row:
+                return None
+            variants = {}
+            for encoding in ENCODINGS:
+                variant = getattr(row, VARIANT_COLUMNS[encoding])
+                if variant is not None:
+                    variants[encoding] = bytes(variant)
+            return Snapshot(bytes(row.body), variants)
+        finally:
+            db.close()
+
+    @staticmethod
+    def _save(session_id: int, data_version: int, key: str, body: bytes, replace: bool = False) -> Snapshot:
+        variants = {}
+        if len(body) >= settings.compression_minimum_size:
+            # Compressé une seule fois par génération : niveaux maximaux
+            variants = {
+                encoding: compress(body, encoding, settings.compression_static_levels[encoding])
+                for encoding in ENCODINGS
+            }
+
+        columns = {column: variants.get(encoding) for encoding, column in VARIANT_COLUMNS.items()}
+        statement = insert(ResponseSnapshot).values(
+            session_id=session_id, data_version=data_version, cache_key=key, body=body, **columns
+        )
+        if replace:
+            statement = statement.on_conflict_do_update(
+                index_elements=["cache_key", "data_version"], set_=dict(body=body, **columns)
+            )
+        else:
+            statement = statement.on_conflict_do_nothing(index_elements=["cache_key", "data_version"])
+
+        db = SessionLocal()
+        try:
+            db.execute(statement)
+            db.commit()
+        except Exception as e:
+            # L'instantané reste servi depuis la mémoire de ce processus
+            db.rollback()
+            logger.warning(f"Instantané non persisté pour {key}: {e}")
+        finally:
+            db.close()
+        return Snapshot(body, variants)
+
+    def _recall(self, key: str, data_version: int) -> Optional[Snapshot]:
+        snapshot = self._memory.get((key, data_version))
+        if snapshot is not None:
+            self._memory.move_to_end((key, data_version))
+        return snapshot
+
+    def _remember(self, key: str, data_version: int, snapshot: Snapshot):
+        self._memory[(key, data_version)] = snapshot
+        self._memory.move_to_end((key, data_version))
+        while len(self._memory) > settings.response_store_memory_entries:
+            self._memory.popitem(last=False)
+
+response_store = ResponseStore()
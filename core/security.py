@@ -1,5 +1,8 @@
+import asyncio
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import HTTPException, status, Depends, Request
@@ -7,17 +10,56 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 from database import get_db
 from models.database import AdminUser
+from core.principal_cache import principal_cache
 from config import settings
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Coût fixé (min = max = défaut) : un hachage d'un autre coût est signalé à mettre à jour
+pwd_context = CryptContext(
+    schemes=["bcrypt"], deprecated="auto",
+    bcrypt__default_rounds=settings.bcrypt_rounds,
+    bcrypt__min_rounds=settings.bcrypt_rounds,
+    bcrypt__max_rounds=settings.bcrypt_rounds
+)
 security = HTTPBearer()
 
+# Droits ou verrouillage modifiés : l'administrateur en cache est relu à la requête suivante
+principal_cache.install(AdminUser)
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
+# bcrypt libère le GIL : quelques threads suffisent, la boucle n'est jamais bloquée par un hachage
+_hash_executor: Optional[ThreadPoolExecutor] = None
+_hash_pending = 0
+
+async def _run_hashing(function, *args):
+    """Exécute un hachage dans le pool borné ; 503 au-delà de password_hash_queue attentes"""
+    global _hash_executor, _hash_pending
+    if _hash_pending >= settings.password_hash_workers + settings.password_hash_queue:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Service d'authentification surchargé, réessayez plus tard",
+            headers={"Retry-After": str(settings.admission_retry_after)}
+        )
+    if _hash_executor is None:
+        _hash_executor = ThreadPoolExecutor(settings.password_hash_workers, thread_name_prefix="password-hash")
+
+    _hash_pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_hash_executor, function, *args)
+    finally:
+        _hash_pending -= 1
+
+async def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """(valide, nouveau hachage si le coût configuré a changé) sans bloquer la boucle"""
+    return await _run_hashing(pwd_context.verify_and_update, plain_password, hashed_password)
+
+async def hash_password(password: str) -> str:
+    return await _run_hashing(pwd_context.hash, password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -25,14 +67,17 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     else:
         expire = datetime.utcnow() + timedelta(minutes=settings.access_token_expire_minutes)
     
-    to_encode.update({"exp": expire})
+    # jti : identifiant du jeton, clé (avec le nom) de l'administrateur en cache
+    to_encode.update({"exp": expire, "jti": uuid.uuid4().hex})
     encoded_jwt = jwt.encode(to_encode, settings.secret_key, algorithm=settings.algorithm)
     return encoded_jwt
 
 def verify_token(token: str) -> dict:
     try:
-        payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
-        return payload
+        # Signature vérifiée une fois par jeton, contenu réutilisé jusqu'à son expiration
+        return principal_cache.decode(
+            token, lambda t: jwt.decode(t, settings.secret_key, algorithms=[settings.algorithm])
+        )
     except JWTError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -52,12 +97,19 @@ async def get_current_user(
             detail="Could not validate credentials"
         )
     
-    user = db.query(AdminUser).filter(AdminUser.username == username).first()
+    # Jetons émis avant l'ajout du jti : le jeton lui-même sert d'identifiant
+    token_id = payload.get("jti") or credentials.credentials
+    user = principal_cache.get(username, token_id)
     if user is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="User not found"
-        )
+        user = db.query(AdminUser).filter(AdminUser.username == username).first()
+        if user is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="User not found"
+            )
+        # Instance détachée : partagée par les requêtes suivantes sans session ni connexion
+        db.expunge(user)
+        principal_cache.put(username, token_id, user)
     
     if user.is_locked:
         raise HTTPException(
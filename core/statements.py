@@ -0,0 +1,35 @@
+import threading
+from typing import Callable, Dict, Hashable, Tuple
+from sqlalchemy.sql import Executable
+from config import settings
+
+class StatementCache:
+    """Gabarits de requêtes construits une fois par forme, les valeurs passant par des bindparam().
+
+    Une requête réutilisée garde sa clé de cache SQLAlchemy (mémorisée sur l'objet) : à chaque appel,
+    ni reconstruction de l'expression ni recalcul de la clé, et le SQL compilé est lu dans le cache du
+    moteur (db_query_cache_size). La forme est ce qui change le texte SQL (filtres présents, colonnes
+    demandées par fields=), jamais une valeur. Les colonnes étant choisies par le client, les gabarits
+    sont bornés à db_query_cache_size : au-delà, le plus ancien est oublié (et reconstruit au besoin).
+    """
+
+    def __init__(self):
+        self._statements: Dict[Tuple[Hashable, ...], Executable] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str, build: Callable[[], Executable], *shape: Hashable) -> Executable:
+        key = (name, *shape)
+        statement = self._statements.get(key)
+        if statement is None:
+            with self._lock:
+                statement = self._statements.get(key)
+                if statement is None:
+                    statement = self._statements[key] = build()
+                    if len(self._statements) > settings.db_query_cache_size:
+                        del self._statements[next(iter(self._statements))]
+        return statement
+
+    def __len__(self) -> int:
+        return len(self._statements)
+
+statements = StatementCache()
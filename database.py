@@ -1,24 +1,46 @@
-from sqlalchemy import create_engine, MetaData
+from sqlalchemy import create_engine, MetaData, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-import redis.asyncio as redis
 from config import settings
+from core.query_profiler import query_profiler
+from core.metrics import metrics
+import logging
 
-# Sync database
-engine = create_engine(settings.database_url)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+logger = logging.getLogger(__name__)
 
-# Async database  
-async_engine = create_async_engine(settings.database_url_async)
-AsyncSessionLocal = sessionmaker(
-    async_engine, class_=AsyncSession, expire_on_commit=False
-)
+# Sync database (aucune connexion n'est ouverte avant la première requête).
+# psycopg2 ne prépare pas les requêtes côté serveur : seul le cache de compilation s'applique
+engine = create_engine(settings.database_url, query_cache_size=settings.db_query_cache_size)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+query_profiler.install(engine)
+metrics.install_pool(engine, "sync")
+metrics.install_statement_cache(engine, "sync")
 
 Base = declarative_base()
 
-# Redis connection
-redis_client = redis.from_url(settings.redis_url, decode_responses=True)
+# Async database et Redis : créés au premier usage (asyncpg et redis ne sont importés qu'alors)
+_async_engine = None
+_async_sessionmaker = None
+_redis_client = None
+
+def get_async_engine():
+    global _async_engine, _async_sessionmaker
+    if _async_engine is None:
+        from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+
+        # Une forme SQL déjà compilée a un texte identique : asyncpg réutilise sa requête préparée
+        _async_engine = create_async_engine(
+            settings.database_url_async,
+            query_cache_size=settings.db_query_cache_size,
+            connect_args={"prepared_statement_cache_size": settings.db_prepared_statement_cache_size}
+        )
+        _async_sessionmaker = sessionmaker(
+            _async_engine, class_=AsyncSession, expire_on_commit=False
+        )
+        query_profiler.install(_async_engine.sync_engine)
+        metrics.install_pool(_async_engine.sync_engine, "async")
+        metrics.install_statement_cache(_async_engine.sync_engine, "async")
+    return _async_engine
 
 # Dependency
 def get_db():
@@ -29,8 +51,30 @@ def get_db():
         db.close()
 
 async def get_async_db():
-    async with AsyncSessionLocal() as session:
+    get_async_engine()
+    async with _async_sessionmaker() as session:
         yield session
 
 async def get_redis():
-    return redis_client
\ No newline at end of file
+    global _redis_client
+    if _redis_client is None:
+        import redis.asyncio as redis
+
+        _redis_client = redis.from_url(settings.redis_url, decode_responses=True)
+    return _redis_client
+
+def open_database():
+    """Ouvre une première connexion du pool (appelé hors de la boucle, au démarrage)"""
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+
+async def close_connections():
+    """Arrêt du processus : pools base et client Redis fermés s'ils ont été ouverts"""
+    global _async_engine, _async_sessionmaker, _redis_client
+    if _redis_client is not None:
+        await _redis_client.aclose()
+        _redis_client = None
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = _async_sessionmaker = None
+    engine.dispose()
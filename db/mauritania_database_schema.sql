@@ -100,17 +100,19 @@ CREATE TABLE exam_sessions (
     total_candidates INTEGER DEFAULT 0,
     total_passed INTEGER DEFAULT 0,
     pass_rate DECIMAL(5,2),
+    data_version INTEGER NOT NULL DEFAULT 0, -- Génération des données dérivées (caches, statistiques)
     created_at TIMESTAMP DEFAULT NOW(),
     updated_at TIMESTAMP DEFAULT NOW(),
     UNIQUE(year, exam_type, session_name)
 );
 
--- Table principale des candidats/résultats
+-- Table principale des candidats/résultats, partitionnée par session
+-- (partitions exam_results_s<id> créées avec chaque session, services/partition_service.py)
 CREATE TABLE exam_results (
-    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    id UUID DEFAULT uuid_generate_v4(),
     
     -- Références
-    session_id INTEGER REFERENCES exam_sessions(id),
+    session_id INTEGER NOT NULL REFERENCES exam_sessions(id),
     etablissement_id INTEGER REFERENCES ref_etablissements(id),
     serie_id INTEGER REFERENCES ref_series(id),
     wilaya_id INTEGER REFERENCES ref_wilayas(id),
@@ -151,13 +153,19 @@ CREATE TABLE exam_results (
     social_share_count INTEGER DEFAULT 0,
     view_count INTEGER DEFAULT 0,
     created_at TIMESTAMP DEFAULT NOW(),
-    updated_at TIMESTAMP DEFAULT NOW()
-);
+    updated_at TIMESTAMP DEFAULT NOW(),
+    
+    -- La clé de partition fait partie de la clé primaire
+    PRIMARY KEY (id, session_id)
+) PARTITION BY LIST (session_id);
+
+-- Lignes d'une session sans partition (reprises à la création de la partition)
+CREATE TABLE exam_results_default PARTITION OF exam_results DEFAULT;
 
 -- Table des notes détaillées par matière
 CREATE TABLE exam_subject_scores (
     id SERIAL PRIMARY KEY,
-    result_id UUID REFERENCES exam_results(id) ON DELETE CASCADE,
+    result_id UUID, -- exam_results(id) : pas de clé étrangère vers une table partitionnée sans session_id
     subject_id INTEGER REFERENCES ref_subjects(id),
     
     -- Notes
@@ -244,6 +252,95 @@ CREATE TABLE stats_wilayas (
     UNIQUE(session_id, wilaya_id, exam_type)
 );
 
+-- Classements pré-calculés des wilayas et établissements (calculés à la publication)
+CREATE TABLE entity_rankings (
+    id SERIAL PRIMARY KEY,
+    session_id INTEGER NOT NULL REFERENCES exam_sessions(id),
+    entity_type VARCHAR(20) NOT NULL, -- 'wilaya', 'etablissement'
+    entity_id INTEGER NOT NULL,
+    wilaya_id INTEGER REFERENCES ref_wilayas(id), -- Wilaya de rattachement (établissements)
+    
+    total_candidats INTEGER DEFAULT 0,
+    total_admis INTEGER DEFAULT 0,
+    taux_reussite DECIMAL(5,2),
+    moyenne DECIMAL(5,2),
+    rang INTEGER, -- Rang national (wilaya) ou rang dans la wilaya (établissement)
+    
+    computed_at TIMESTAMP DEFAULT NOW()
+);
+
+-- Agrégats compacts pour les tendances pluriannuelles (une ligne par combinaison de dimensions)
+CREATE TABLE results_rollup (
+    id SERIAL PRIMARY KEY,
+    session_id INTEGER NOT NULL REFERENCES exam_sessions(id),
+    year INTEGER NOT NULL,
+    exam_type VARCHAR(20) NOT NULL,
+    wilaya_id INTEGER,
+    etablissement_id INTEGER,
+    serie_id INTEGER,
+    sexe CHAR(1),
+    decision VARCHAR(30) NOT NULL,
+    
+    total_candidats INTEGER NOT NULL DEFAULT 0,
+    total_notes INTEGER NOT NULL DEFAULT 0, -- Candidats avec une moyenne
+    somme_moyennes DECIMAL(14,2) NOT NULL DEFAULT 0
+);
+
+-- Projection de lecture des résultats publiés : session, code de série et références recopiés
+-- (recherche et détail sans jointure, services/search_projection_service.py)
+CREATE TABLE exam_results_search (
+    id UUID PRIMARY KEY, -- exam_results.id
+    session_id INTEGER NOT NULL,
+    year INTEGER NOT NULL,
+    exam_type VARCHAR(20) NOT NULL,
+    etablissement_id INTEGER,
+    serie_id INTEGER,
+    wilaya_id INTEGER,
+    serie_code VARCHAR(10),
+    
+    nni VARCHAR(20) NOT NULL,
+    numero_dossier VARCHAR(20),
+    nom_complet_fr VARCHAR(200) NOT NULL,
+    nom_complet_ar VARCHAR(200),
+    nom_pere VARCHAR(150),
+    lieu_naissance VARCHAR(100),
+    date_naissance DATE,
+    sexe CHAR(1),
+    type_candidat VARCHAR(20),
+    centre_examen VARCHAR(200),
+    
+    moyenne_generale DECIMAL(5,2),
+    total_points DECIMAL(8,2),
+    decision VARCHAR(30) NOT NULL,
+    mention VARCHAR(30),
+    rang_etablissement INTEGER,
+    rang_wilaya INTEGER,
+    rang_national INTEGER,
+    
+    is_published BOOLEAN NOT NULL DEFAULT true,
+    view_count INTEGER DEFAULT 0,
+    published_at TIMESTAMP WITH TIME ZONE,
+    created_at TIMESTAMP WITH TIME ZONE,
+    
+    -- Références sous la forme des réponses de l'API
+    etablissement JSONB,
+    serie JSONB,
+    wilaya JSONB
+);
+
+-- Réponses JSON pré-sérialisées des pages de statistiques, par génération (data_version) de session
+CREATE TABLE response_snapshots (
+    id SERIAL PRIMARY KEY,
+    session_id INTEGER NOT NULL REFERENCES exam_sessions(id),
+    data_version INTEGER NOT NULL,
+    cache_key VARCHAR(500) NOT NULL, -- Gabarit de route + paramètres normalisés
+    body BYTEA NOT NULL,
+    body_gzip BYTEA, -- Variantes pré-compressées (corps assez gros)
+    body_br BYTEA,
+    body_zstd BYTEA,
+    created_at TIMESTAMP DEFAULT NOW()
+);
+
 -- =====================================================
 -- 4. TABLES POUR PARTAGE SOCIAL
 -- =====================================================
@@ -251,7 +348,7 @@ CREATE TABLE stats_wilayas (
 -- Table pour générer des liens de partage uniques
 CREATE TABLE social_shares (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
-    result_id UUID REFERENCES exam_results(id),
+    result_id UUID, -- exam_results(id) (table partitionnée)
     share_token VARCHAR(100) UNIQUE NOT NULL,
     candidate_name VARCHAR(200) NOT NULL,
     exam_type VARCHAR(20) NOT NULL,
@@ -345,11 +442,37 @@ CREATE INDEX idx_exam_results_nom_ar_trgm ON exam_results USING gin (nom_complet
 
 -- Index composites pour queries fréquentes
 CREATE INDEX idx_exam_results_session_wilaya_serie ON exam_results(session_id, wilaya_id, serie_id);
-CREATE INDEX idx_exam_results_published_session ON exam_results(is_published, session_id) WHERE is_published = true;
+
+-- Résultats publiés d'une session triés par moyenne (recherche, tops, statistiques)
+CREATE INDEX idx_exam_results_published_rank ON exam_results(session_id, moyenne_generale DESC NULLS LAST, created_at DESC)
+    INCLUDE (decision, wilaya_id, etablissement_id, serie_id) WHERE is_published = true;
+CREATE INDEX idx_exam_results_published_wilaya ON exam_results(session_id, wilaya_id, moyenne_generale DESC NULLS LAST, created_at DESC)
+    WHERE is_published = true;
+CREATE INDEX idx_exam_results_published_etablissement ON exam_results(session_id, etablissement_id, moyenne_generale DESC NULLS LAST, created_at DESC)
+    WHERE is_published = true;
+CREATE INDEX idx_exam_results_published_serie ON exam_results(session_id, serie_id, moyenne_generale DESC NULLS LAST, created_at DESC)
+    WHERE is_published = true;
+
+-- Projection de recherche : mêmes chemins, l'année et le type d'examen remplaçant la session
+CREATE INDEX idx_results_search_nni ON exam_results_search(nni);
+CREATE INDEX idx_results_search_numero_dossier ON exam_results_search(numero_dossier);
+CREATE INDEX idx_results_search_session ON exam_results_search(session_id);
+CREATE INDEX idx_results_search_rank ON exam_results_search(year, exam_type, moyenne_generale DESC NULLS LAST, created_at DESC)
+    INCLUDE (decision, serie_code);
+CREATE INDEX idx_results_search_wilaya ON exam_results_search(wilaya_id, year, exam_type, moyenne_generale DESC NULLS LAST, created_at DESC);
+CREATE INDEX idx_results_search_etablissement ON exam_results_search(etablissement_id, year, exam_type, moyenne_generale DESC NULLS LAST, created_at DESC);
+CREATE INDEX idx_results_search_serie ON exam_results_search(serie_id, year, exam_type, moyenne_generale DESC NULLS LAST, created_at DESC);
+CREATE INDEX idx_results_search_nom_trgm ON exam_results_search USING gin (nom_complet_fr gin_trgm_ops);
+CREATE INDEX idx_results_search_nom_ar_trgm ON exam_results_search USING gin (nom_complet_ar gin_trgm_ops);
 
 -- Index pour statistiques
 CREATE INDEX idx_stats_etablissements_session ON stats_etablissements(session_id);
 CREATE INDEX idx_stats_wilayas_session ON stats_wilayas(session_id);
+CREATE UNIQUE INDEX idx_entity_rankings_lookup ON entity_rankings(session_id, entity_type, entity_id);
+CREATE INDEX idx_results_rollup_exam_year ON results_rollup(exam_type, year);
+CREATE INDEX idx_results_rollup_session ON results_rollup(session_id);
+CREATE UNIQUE INDEX idx_response_snapshots_key ON response_snapshots(cache_key, data_version);
+CREATE INDEX idx_response_snapshots_session ON response_snapshots(session_id);
 
 -- Index pour partage social
 CREATE INDEX idx_social_shares_token ON social_shares(share_token);
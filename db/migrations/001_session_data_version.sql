@@ -0,0 +1,7 @@
+-- =====================================================
+-- 001 - Génération des données d'une session
+-- =====================================================
+-- Incrémentée par le pipeline de publication : sert de clé de cache
+-- pour les statistiques calculées à partir des résultats d'une session.
+
+ALTER TABLE exam_sessions ADD COLUMN IF NOT EXISTS data_version INTEGER NOT NULL DEFAULT 0;
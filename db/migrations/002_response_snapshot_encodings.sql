@@ -0,0 +1,8 @@
+-- =====================================================
+-- 002 - Variantes brotli et zstd des instantanés de réponses
+-- =====================================================
+-- Les instantanés sont servis dans l'encodage négocié avec le client
+-- (br, zstd ou gzip) sans recompression à chaque requête.
+
+ALTER TABLE response_snapshots ADD COLUMN IF NOT EXISTS body_br BYTEA;
+ALTER TABLE response_snapshots ADD COLUMN IF NOT EXISTS body_zstd BYTEA;
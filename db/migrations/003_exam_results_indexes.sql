@@ -0,0 +1,48 @@
+-- =====================================================
+-- 003 - Index des chemins d'accès à exam_results
+-- =====================================================
+-- Toutes les lectures publiques portent sur les résultats publiés d'une
+-- session, triés par moyenne décroissante : les index composites sont
+-- partiels (WHERE is_published = true) et suivent l'ordre de tri de la
+-- recherche, ce qui sert la première page et les tops sans tri.
+-- L'index de session couvre aussi les colonnes des agrégats (INCLUDE) :
+-- statistiques globales et tops lus par parcours d'index seul.
+--
+-- CREATE INDEX CONCURRENTLY ne bloque pas les écritures mais ne peut pas
+-- s'exécuter dans une transaction : lancer ce fichier avec psql -f (mode
+-- autocommit), sans --single-transaction.
+-- Vérification : python -m benchmarks.plan_regression
+
+CREATE EXTENSION IF NOT EXISTS "pg_trgm";
+
+-- Recherche d'une session triée par moyenne, tops nationaux, agrégats globaux
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_exam_results_published_rank
+ON exam_results (session_id, moyenne_generale DESC NULLS LAST, created_at DESC)
+INCLUDE (decision, wilaya_id, etablissement_id, serie_id)
+WHERE is_published = true;
+
+-- Filtres par wilaya, établissement et série d'une session (recherche, statistiques, tops)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_exam_results_published_wilaya
+ON exam_results (session_id, wilaya_id, moyenne_generale DESC NULLS LAST, created_at DESC)
+WHERE is_published = true;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_exam_results_published_etablissement
+ON exam_results (session_id, etablissement_id, moyenne_generale DESC NULLS LAST, created_at DESC)
+WHERE is_published = true;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_exam_results_published_serie
+ON exam_results (session_id, serie_id, moyenne_generale DESC NULLS LAST, created_at DESC)
+WHERE is_published = true;
+
+-- Recherches sans année (toutes sessions) : absents des bases créées par create_all
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_exam_results_wilaya ON exam_results (wilaya_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_exam_results_etablissement ON exam_results (etablissement_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_exam_results_nom_trgm
+ON exam_results USING gin (nom_complet_fr gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_exam_results_nom_ar_trgm
+ON exam_results USING gin (nom_complet_ar gin_trgm_ops);
+
+-- Remplacé par idx_exam_results_published_rank (même prédicat, session en tête)
+DROP INDEX CONCURRENTLY IF EXISTS idx_exam_results_published_session;
+
+ANALYZE exam_results;
@@ -0,0 +1,85 @@
+-- =====================================================
+-- 004 - Partitionnement de exam_results par session
+-- =====================================================
+-- exam_results devient une table partitionnée LIST (session_id) : une
+-- partition exam_results_s<id> par session, plus exam_results_default pour
+-- les lignes d'une session sans partition. Les requêtes d'une session ne
+-- lisent que sa partition ; vacuum et maintenance des index restent à la
+-- taille d'une session, et une session archivée peut être détachée
+-- (services/partition_service.py).
+--
+-- La clé primaire d'une table partitionnée inclut la clé de partition :
+-- (id, session_id). Les clés étrangères vers exam_results(id) (notes par
+-- matière, partages) ne sont plus possibles et sont supprimées.
+--
+-- La table est recopiée : fenêtre de maintenance, une seule transaction.
+--   psql -d mauritania_exams -f db/migrations/004_partition_exam_results.sql
+-- Prérequis : 003_exam_results_indexes.sql (extension pg_trgm).
+
+BEGIN;
+
+ALTER TABLE IF EXISTS exam_subject_scores DROP CONSTRAINT IF EXISTS exam_subject_scores_result_id_fkey;
+ALTER TABLE IF EXISTS social_shares DROP CONSTRAINT IF EXISTS social_shares_result_id_fkey;
+
+ALTER TABLE exam_results RENAME TO exam_results_unpartitioned;
+
+CREATE TABLE exam_results (LIKE exam_results_unpartitioned INCLUDING DEFAULTS INCLUDING CONSTRAINTS)
+PARTITION BY LIST (session_id);
+ALTER TABLE exam_results ALTER COLUMN session_id SET NOT NULL;
+
+DO $$
+DECLARE
+    session RECORD;
+BEGIN
+    FOR session IN SELECT id FROM exam_sessions ORDER BY id LOOP
+        EXECUTE format('CREATE TABLE exam_results_s%s PARTITION OF exam_results FOR VALUES IN (%s)',
+                       session.id, session.id);
+    END LOOP;
+END $$;
+CREATE TABLE exam_results_default PARTITION OF exam_results DEFAULT;
+
+INSERT INTO exam_results SELECT * FROM exam_results_unpartitioned;
+DROP TABLE exam_results_unpartitioned;
+
+-- Contraintes et index, créés sur chaque partition après la copie
+ALTER TABLE exam_results ADD PRIMARY KEY (id, session_id);
+ALTER TABLE exam_results ADD CONSTRAINT unique_nni_session UNIQUE (nni, session_id);
+ALTER TABLE exam_results ADD FOREIGN KEY (session_id) REFERENCES exam_sessions(id);
+ALTER TABLE exam_results ADD FOREIGN KEY (etablissement_id) REFERENCES ref_etablissements(id);
+ALTER TABLE exam_results ADD FOREIGN KEY (serie_id) REFERENCES ref_series(id);
+ALTER TABLE exam_results ADD FOREIGN KEY (wilaya_id) REFERENCES ref_wilayas(id);
+ALTER TABLE exam_results ADD FOREIGN KEY (moughata_id) REFERENCES ref_moughatas(id);
+
+CREATE UNIQUE INDEX unique_dossier_session ON exam_results (numero_dossier, session_id)
+WHERE numero_dossier IS NOT NULL;
+CREATE INDEX idx_exam_results_nni ON exam_results (nni);
+CREATE INDEX idx_exam_results_numero_dossier ON exam_results (numero_dossier);
+CREATE INDEX idx_exam_results_session_published ON exam_results (session_id, is_published);
+CREATE INDEX idx_exam_results_etablissement ON exam_results (etablissement_id);
+CREATE INDEX idx_exam_results_wilaya ON exam_results (wilaya_id);
+CREATE INDEX idx_exam_results_serie ON exam_results (serie_id);
+CREATE INDEX idx_exam_results_decision ON exam_results (decision);
+CREATE INDEX idx_exam_results_nom_trgm ON exam_results USING gin (nom_complet_fr gin_trgm_ops);
+CREATE INDEX idx_exam_results_nom_ar_trgm ON exam_results USING gin (nom_complet_ar gin_trgm_ops);
+CREATE INDEX idx_exam_results_session_wilaya_serie ON exam_results (session_id, wilaya_id, serie_id);
+CREATE INDEX idx_exam_results_published_rank ON exam_results (session_id, moyenne_generale DESC NULLS LAST, created_at DESC)
+    INCLUDE (decision, wilaya_id, etablissement_id, serie_id) WHERE is_published = true;
+CREATE INDEX idx_exam_results_published_wilaya ON exam_results (session_id, wilaya_id, moyenne_generale DESC NULLS LAST, created_at DESC)
+    WHERE is_published = true;
+CREATE INDEX idx_exam_results_published_etablissement ON exam_results (session_id, etablissement_id, moyenne_generale DESC NULLS LAST, created_at DESC)
+    WHERE is_published = true;
+CREATE INDEX idx_exam_results_published_serie ON exam_results (session_id, serie_id, moyenne_generale DESC NULLS LAST, created_at DESC)
+    WHERE is_published = true;
+
+-- Trigger updated_at du schéma (absent des bases créées par create_all)
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_proc WHERE proname = 'update_updated_at_column') THEN
+        CREATE TRIGGER update_exam_results_updated_at BEFORE UPDATE ON exam_results
+        FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+    END IF;
+END $$;
+
+COMMIT;
+
+ANALYZE exam_results;
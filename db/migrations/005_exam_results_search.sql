@@ -0,0 +1,110 @@
+-- =====================================================
+-- 005 - Projection de recherche exam_results_search
+-- =====================================================
+-- Recherche et détail d'un résultat lisent une projection dénormalisée
+-- des résultats publiés : année, type d'examen et code de série recopiés,
+-- établissement, série et wilaya stockés sous la forme des réponses de
+-- l'API (JSONB). Aucune jointure ni sous-requête EXISTS à la lecture.
+--
+-- La projection est remplacée session par session à la fin d'un upload, à
+-- la publication et à l'archivage, et mise à jour à la modification d'une
+-- référence (services/search_projection_service.py). Après une
+-- modification directe en base : POST /admin/search/rebuild.
+--
+-- Prérequis : 003_exam_results_indexes.sql (extension pg_trgm).
+--   psql -d mauritania_exams -f db/migrations/005_exam_results_search.sql
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS exam_results_search (
+    id UUID PRIMARY KEY, -- exam_results.id
+    session_id INTEGER NOT NULL,
+    year INTEGER NOT NULL,
+    exam_type VARCHAR(20) NOT NULL,
+    etablissement_id INTEGER,
+    serie_id INTEGER,
+    wilaya_id INTEGER,
+    serie_code VARCHAR(10),
+    
+    nni VARCHAR(20) NOT NULL,
+    numero_dossier VARCHAR(20),
+    nom_complet_fr VARCHAR(200) NOT NULL,
+    nom_complet_ar VARCHAR(200),
+    nom_pere VARCHAR(150),
+    lieu_naissance VARCHAR(100),
+    date_naissance DATE,
+    sexe CHAR(1),
+    type_candidat VARCHAR(20),
+    centre_examen VARCHAR(200),
+    
+    moyenne_generale DECIMAL(5,2),
+    total_points DECIMAL(8,2),
+    decision VARCHAR(30) NOT NULL,
+    mention VARCHAR(30),
+    rang_etablissement INTEGER,
+    rang_wilaya INTEGER,
+    rang_national INTEGER,
+    
+    is_published BOOLEAN NOT NULL DEFAULT true,
+    view_count INTEGER DEFAULT 0,
+    published_at TIMESTAMP WITH TIME ZONE,
+    created_at TIMESTAMP WITH TIME ZONE,
+    
+    etablissement JSONB,
+    serie JSONB,
+    wilaya JSONB
+);
+
+TRUNCATE exam_results_search;
+
+INSERT INTO exam_results_search
+SELECT
+    r.id, r.session_id, s.year, s.exam_type, r.etablissement_id, r.serie_id, r.wilaya_id, se.code,
+    r.nni, r.numero_dossier, r.nom_complet_fr, r.nom_complet_ar, r.nom_pere, r.lieu_naissance,
+    r.date_naissance, r.sexe, r.type_candidat, r.centre_examen,
+    r.moyenne_generale, r.total_points, r.decision, r.mention,
+    r.rang_etablissement, r.rang_wilaya, r.rang_national,
+    r.is_published, r.view_count, r.published_at, r.created_at,
+    CASE WHEN e.id IS NOT NULL THEN jsonb_build_object(
+        'id', e.id, 'code', e.code, 'name_fr', e.name_fr, 'name_ar', e.name_ar,
+        'type_etablissement', e.type_etablissement, 'wilaya_id', e.wilaya_id, 'phone', e.phone,
+        'email', e.email, 'status', e.status,
+        'wilaya', CASE WHEN ew.id IS NOT NULL THEN jsonb_build_object(
+            'id', ew.id, 'code', ew.code, 'name_fr', ew.name_fr, 'name_ar', ew.name_ar,
+            'name_en', ew.name_en, 'created_at', ew.created_at) END
+    ) END,
+    CASE WHEN se.id IS NOT NULL THEN jsonb_build_object(
+        'id', se.id, 'code', se.code, 'name_fr', se.name_fr, 'name_ar', se.name_ar, 'exam_type', se.exam_type
+    ) END,
+    CASE WHEN w.id IS NOT NULL THEN jsonb_build_object(
+        'id', w.id, 'code', w.code, 'name_fr', w.name_fr, 'name_ar', w.name_ar,
+        'name_en', w.name_en, 'created_at', w.created_at
+    ) END
+FROM exam_results r
+JOIN exam_sessions s ON s.id = r.session_id
+LEFT JOIN ref_etablissements e ON e.id = r.etablissement_id
+LEFT JOIN ref_wilayas ew ON ew.id = e.wilaya_id
+LEFT JOIN ref_series se ON se.id = r.serie_id
+LEFT JOIN ref_wilayas w ON w.id = r.wilaya_id
+WHERE r.is_published = true;
+
+-- Chemins d'accès de exam_results (003), l'année et le type d'examen remplaçant la session
+CREATE INDEX IF NOT EXISTS idx_results_search_nni ON exam_results_search (nni);
+CREATE INDEX IF NOT EXISTS idx_results_search_numero_dossier ON exam_results_search (numero_dossier);
+CREATE INDEX IF NOT EXISTS idx_results_search_session ON exam_results_search (session_id);
+-- Colonnes des filtres sans index propre incluses : comptage d'une session par parcours d'index seul
+CREATE INDEX IF NOT EXISTS idx_results_search_rank
+ON exam_results_search (year, exam_type, moyenne_generale DESC NULLS LAST, created_at DESC)
+INCLUDE (decision, serie_code);
+CREATE INDEX IF NOT EXISTS idx_results_search_wilaya
+ON exam_results_search (wilaya_id, year, exam_type, moyenne_generale DESC NULLS LAST, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_results_search_etablissement
+ON exam_results_search (etablissement_id, year, exam_type, moyenne_generale DESC NULLS LAST, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_results_search_serie
+ON exam_results_search (serie_id, year, exam_type, moyenne_generale DESC NULLS LAST, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_results_search_nom_trgm ON exam_results_search USING gin (nom_complet_fr gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_results_search_nom_ar_trgm ON exam_results_search USING gin (nom_complet_ar gin_trgm_ops);
+
+COMMIT;
+
+ANALYZE exam_results_search;
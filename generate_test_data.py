@@ -1,19 +1,38 @@
 #!/usr/bin/env python3
 """
 Générateur de données de test pour le système d'examens mauritaniens
-Remplacez votre fichier existant par cette version corrigée
+
+Les candidats sont produits par lots colonnes (générateur NumPy initialisé par
+--seed, donc reproductible), en parallèle dans un pool de processus, puis
+chargés avec COPY.
+
+Usage:
+    python generate_test_data.py                       # petit jeu de démonstration
+    python generate_test_data.py --rows 5000000 --workers 8 --seed 42
 """
 
-import random
+import argparse
+import asyncio
+import io
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime, date
 from decimal import Decimal
-from sqlalchemy.orm import Session
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+from sqlalchemy.pool import NullPool
 from database import SessionLocal
 from models.database import (
     ExamSession, ExamResult, RefWilaya, RefSerie, RefEtablissement, 
     AdminUser
 )
 from core.security import get_password_hash
+from services.publication_service import PublicationService
+from services.partition_service import PartitionService
+from config import settings
 
 # Données réalistes mauritaniennes
 NOMS_MAURITANIENS = {
@@ -51,78 +70,163 @@ NOMS_ARABES = [
     "فاطمة", "مريم", "فاطمتو", "خديجتو", "آمنتو", "زينة", "عائشة"
 ]
 
-def generer_nni():
-    """Génère un NNI mauritanien de 10 chiffres"""
-    return ''.join([str(random.randint(0, 9)) for _ in range(10)])
 
-def generer_nom_complet(sexe):
-    """Génère un nom complet mauritanien selon le sexe"""
-    if sexe == 'M':
-        prenom = random.choice(NOMS_MAURITANIENS['masculin'])
-    else:
-        prenom = random.choice(NOMS_MAURITANIENS['feminin'])
-    
-    nom_famille = random.choice(NOMS_FAMILLE)
-    
-    if random.random() < 0.7:
-        nom_pere = random.choice(PRENOMS_PERE)
-        return f"{prenom} {nom_pere} {nom_famille}"
-    else:
-        return f"{prenom} {nom_famille}"
-
-def generer_date_naissance(annee_examen, type_examen):
-    """Génère une date de naissance réaliste"""
-    if type_examen == "bac":
-        annee = random.randint(annee_examen - 20, annee_examen - 17)
-    elif type_examen == "bepc":
-        annee = random.randint(annee_examen - 16, annee_examen - 14)
-    else:  # concours
-        annee = random.randint(annee_examen - 14, annee_examen - 12)
-    
-    mois = random.randint(1, 12)
-    jour = random.randint(1, 28)
-    return date(annee, mois, jour)
-
-def calculer_decision_et_moyenne(exam_type):
-    """Calcule la décision et moyenne selon des statistiques réalistes"""
-    if exam_type == "bac":
-        if random.random() < 0.40:
-            decision = "Admis"
-            moyenne = round(random.uniform(10.0, 18.5), 2)
-            
-            if moyenne >= 16:
-                mention = "Très Bien"
-            elif moyenne >= 14:
-                mention = "Bien"  
-            elif moyenne >= 12:
-                mention = "Assez Bien"
-            else:
-                mention = "Passable"
-        else:
-            decision = "Ajourné"
-            moyenne = round(random.uniform(2.5, 9.99), 2)
-            mention = None
-            
-    elif exam_type == "bepc":
-        if random.random() < 0.65:
-            decision = "Admis"
-            moyenne = round(random.uniform(10.0, 19.5), 2)
-            mention = None
-        else:
-            decision = "Ajourné"
-            moyenne = round(random.uniform(3.0, 9.99), 2)
-            mention = None
-            
-    else:  # concours
-        total_points = round(random.uniform(25.0, 145.0), 2)
-        if total_points >= 80:
-            decision = "Admis"
+# Tableaux NumPy des listes ci-dessus, pour les tirages vectorisés
+PRENOMS_M = np.array(NOMS_MAURITANIENS['masculin'])
+PRENOMS_F = np.array(NOMS_MAURITANIENS['feminin'])
+FAMILLES = np.array(NOMS_FAMILLE)
+PERES = np.array(PRENOMS_PERE)
+LIEUX = np.array(LIEUX_NAISSANCE)
+ARABES = np.array(NOMS_ARABES)
+
+# Candidats par session pour le jeu par défaut, et poids de répartition de --rows
+CANDIDATS_PAR_TYPE = {"bac": 800, "bepc": 400, "concours": 200}
+
+# Âge au moment de l'examen (bornes incluses)
+AGES_EXAMEN = {"bac": (17, 20), "bepc": (14, 16), "concours": (12, 14)}
+
+# Taux d'admission, plage des moyennes admis / ajournés
+PROFILS_NOTES = {
+    "bac": (0.40, (10.0, 18.5), (2.5, 9.99)),
+    "bepc": (0.65, (10.0, 19.5), (3.0, 9.99))
+}
+
+COPY_COLUMNS = [
+    "id", "session_id", "etablissement_id", "serie_id", "wilaya_id",
+    "nni", "numero_dossier", "nom_complet_fr", "nom_complet_ar", "lieu_naissance",
+    "date_naissance", "sexe", "type_candidat", "moyenne_generale", "total_points",
+    "decision", "mention", "is_published", "is_verified", "published_at",
+    "view_count", "social_share_count"
+]
+
+def generer_lot(spec: dict) -> pd.DataFrame:
+    """Génère un lot de candidats sous forme de colonnes, de façon déterministe pour (seed, seed_key)"""
+
+    rng = np.random.default_rng(np.random.SeedSequence(spec["seed"], spawn_key=spec["seed_key"]))
+    n = spec["count"]
+    year = spec["year"]
+    exam_type = spec["exam_type"]
+
+    # Identité
+    sexe = np.where(rng.random(n) < 0.5, "M", "F")
+    prenoms = np.where(
+        sexe == "M",
+        PRENOMS_M[rng.integers(0, len(PRENOMS_M), n)],
+        PRENOMS_F[rng.integers(0, len(PRENOMS_F), n)]
+    )
+    peres = np.where(rng.random(n) < 0.7, np.char.add(PERES[rng.integers(0, len(PERES), n)], " "), "")
+    noms = np.char.add(np.char.add(np.char.add(prenoms, " "), peres), FAMILLES[rng.integers(0, len(FAMILLES), n)])
+    nni = np.char.zfill(rng.integers(0, 10 ** 10, n, dtype=np.int64).astype(str), 10)
+
+    age_min, age_max = AGES_EXAMEN.get(exam_type, AGES_EXAMEN["concours"])
+    annees = year - rng.integers(age_min, age_max + 1, n)
+    naissances = (
+        (annees - 1970).astype("datetime64[Y]").astype("datetime64[M]")
+        + rng.integers(0, 12, n).astype("timedelta64[M]")
+    ).astype("datetime64[D]") + rng.integers(0, 28, n).astype("timedelta64[D]")
+
+    width = max(5, len(str(spec["session_rows"])))
+    dossiers = np.char.add(
+        f"{exam_type.upper()}{year}",
+        np.char.zfill(np.arange(spec["start"] + 1, spec["start"] + n + 1).astype(str), width)
+    )
+
+    # UUID v4 tirés du même générateur (reproductibles)
+    raw = rng.integers(0, 256, (n, 16), dtype=np.uint8)
+    raw[:, 6] = (raw[:, 6] & 0x0F) | 0x40
+    raw[:, 8] = (raw[:, 8] & 0x3F) | 0x80
+    ids = np.frombuffer(raw.tobytes().hex().encode(), dtype="S32").astype("U32")
+
+    # Rattachement : la wilaya du candidat est celle de son établissement
+    etablissements = np.array(spec["etablissements"], dtype=np.int64)
+    choix = etablissements[rng.integers(0, len(etablissements), n)]
+    wilayas = np.where(choix[:, 1] > 0, choix[:, 1], np.array(spec["wilayas"])[rng.integers(0, len(spec["wilayas"]), n)])
+    series = np.array(spec["series"])[rng.integers(0, len(spec["series"]), n)]
+
+    # Résultats
+    if exam_type in PROFILS_NOTES:
+        taux, (admis_min, admis_max), ajournes = PROFILS_NOTES[exam_type]
+        admis = rng.random(n) < taux
+        moyennes = np.round(np.where(
+            admis, rng.uniform(admis_min, admis_max, n), rng.uniform(ajournes[0], ajournes[1], n)
+        ), 2)
+        decisions = np.where(admis, "Admis", "Ajourné")
+        if exam_type == "bac":
+            mentions = np.select(
+                [moyennes >= 16, moyennes >= 14, moyennes >= 12], ["Très Bien", "Bien", "Assez Bien"], "Passable"
+            ).astype(object)
+            mentions[~admis] = None
         else:
-            decision = "Refusé"
-        moyenne = None
-        mention = None
-        
-    return decision, moyenne, mention, total_points if exam_type == "concours" else None
+            mentions = np.full(n, None, dtype=object)
+        total_points = np.full(n, np.nan)
+    else:
+        total_points = np.round(rng.uniform(25.0, 145.0, n), 2)
+        decisions = np.where(total_points >= 80, "Admis", "Refusé")
+        moyennes = np.full(n, np.nan)
+        mentions = np.full(n, None, dtype=object)
+
+    return pd.DataFrame({
+        "id": ids,
+        "session_id": spec["session_id"],
+        "etablissement_id": choix[:, 0],
+        "serie_id": series,
+        "wilaya_id": wilayas,
+        "nni": nni,
+        "numero_dossier": dossiers,
+        "nom_complet_fr": noms,
+        "nom_complet_ar": ARABES[rng.integers(0, len(ARABES), n)],
+        "lieu_naissance": LIEUX[rng.integers(0, len(LIEUX), n)],
+        "date_naissance": naissances,
+        "sexe": sexe,
+        "type_candidat": "officiel",
+        "moyenne_generale": moyennes,
+        "total_points": total_points,
+        "decision": decisions,
+        "mention": mentions,
+        "is_published": "t",
+        "is_verified": "t",
+        "published_at": spec["published_at"],
+        "view_count": rng.integers(0, 101, n),
+        "social_share_count": rng.integers(0, 11, n)
+    }, columns=COPY_COLUMNS)
+
+_worker_engine = None
+
+def charger_lot(spec: dict) -> tuple:
+    """Génère un lot et le charge avec COPY (exécuté dans un processus du pool)"""
+    global _worker_engine
+    if _worker_engine is None:
+        _worker_engine = create_engine(settings.database_url, poolclass=NullPool)
+
+    lot = generer_lot(spec)
+    buffer = io.StringIO()
+    lot.to_csv(buffer, header=False, index=False, float_format="%.2f")
+    buffer.seek(0)
+
+    connection = _worker_engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.copy_expert(
+            f"COPY exam_results ({', '.join(COPY_COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buffer
+        )
+        connection.commit()
+    finally:
+        connection.close()
+
+    return spec["session_id"], spec["count"], int((lot["decision"] == "Admis").sum())
+
+def repartir_lignes(sessions, total_rows):
+    """Nombre de candidats par session : valeurs par défaut, ou --rows réparti au prorata"""
+    poids = [CANDIDATS_PAR_TYPE.get(s.exam_type, 300) for s in sessions]
+    if total_rows is None:
+        return poids
+
+    quotas = [total_rows * p / sum(poids) for p in poids]
+    lignes = [int(q) for q in quotas]
+    # Plus forts restes pour tomber exactement sur --rows
+    for i in sorted(range(len(quotas)), key=lambda i: quotas[i] - lignes[i], reverse=True)[:total_rows - sum(lignes)]:
+        lignes[i] += 1
+    return lignes
 
 def setup_data_if_needed(db):
     """Configure les données de base si elles n'existent pas"""
@@ -208,111 +312,110 @@ def setup_data_if_needed(db):
         
         db.commit()
         print(f"✅ {len(sessions_data)} sessions créées")
+        
+        # Base partitionnée (migration 004) : une partition par session avant le chargement
+        partitions = PartitionService(db)
+        for session in db.query(ExamSession).all():
+            partitions.create_partition(session.id)
 
-def generate_results_for_session(db, session, nb_candidats):
-    """Génère les résultats pour une session"""
-    
-    # Vérifier s'il y a déjà des résultats
-    existing_count = db.query(ExamResult).filter(ExamResult.session_id == session.id).count()
-    if existing_count > 0:
-        print(f"✅ Session {session.exam_type.upper()} {session.year} contient déjà {existing_count} résultats")
-        return
-    
-    print(f"📝 Génération de {nb_candidats} résultats pour {session.exam_type.upper()} {session.year}...")
-    
-    # Récupérer les données de référence
-    series = db.query(RefSerie).filter(RefSerie.exam_type == session.exam_type).all()
-    etablissements = db.query(RefEtablissement).all()
-    wilayas = db.query(RefWilaya).all()
-    
-    if not series:
-        print(f"❌ Aucune série trouvée pour {session.exam_type}")
-        return
-    
+def generate_results(db, sessions, args):
+    """Génère et charge les résultats de toutes les sessions vides"""
+
+    etablissements = [(e.id, e.wilaya_id or 0) for e in db.query(RefEtablissement).all()]
+    wilayas = [w.id for w in db.query(RefWilaya).all()]
     if not etablissements:
         print("❌ Aucun établissement trouvé")
-        return
-        
-    if not wilayas:
-        print("❌ Aucune wilaya trouvée")
-        return
-    
-    admis_count = 0
-    
-    for i in range(nb_candidats):
-        # Données personnelles
-        sexe = random.choice(['M', 'F'])
-        nni = generer_nni()
-        nom_complet_fr = generer_nom_complet(sexe)
-        nom_complet_ar = random.choice(NOMS_ARABES)
-        date_naissance = generer_date_naissance(session.year, session.exam_type)
-        lieu_naissance = random.choice(LIEUX_NAISSANCE)
-        
-        # Références
-        serie = random.choice(series)
-        etablissement = random.choice(etablissements)
-        wilaya = random.choice(wilayas)
-        
-        # Résultats
-        decision, moyenne, mention, total_points = calculer_decision_et_moyenne(session.exam_type)
-        
-        if decision == "Admis":
-            admis_count += 1
-            rang_etab = random.randint(1, 50)
-            rang_wilaya = random.randint(1, 300)
-            rang_national = random.randint(1, 2000)
-        else:
-            rang_etab = rang_wilaya = rang_national = None
-        
-        # Créer le résultat
-        resultat = ExamResult(
-            session_id=session.id,
-            nni=nni,
-            numero_dossier=f"{session.exam_type.upper()}{session.year}{str(i+1).zfill(5)}",
-            nom_complet_fr=nom_complet_fr,
-            nom_complet_ar=nom_complet_ar,
-            lieu_naissance=lieu_naissance,
-            date_naissance=date_naissance,
-            sexe=sexe,
-            moyenne_generale=moyenne,
-            total_points=total_points,
-            decision=decision,
-            mention=mention,
-            rang_etablissement=rang_etab,
-            rang_wilaya=rang_wilaya,
-            rang_national=rang_national,
-            etablissement_id=etablissement.id,
-            serie_id=serie.id,
-            wilaya_id=wilaya.id,
-            is_published=True,
-            is_verified=True,
-            published_at=datetime.now(),
-            view_count=random.randint(0, 100),
-            social_share_count=random.randint(0, 10)
-        )
-        
-        db.add(resultat)
-        
-        # Commit par batches
-        if (i + 1) % 100 == 0:
-            db.commit()
-            print(f"  📊 {i + 1}/{nb_candidats} résultats générés...")
-    
-    # Commit final
-    db.commit()
-    
-    # Mettre à jour les statistiques de la session
-    session.total_candidates = nb_candidats
-    session.total_passed = admis_count
-    if nb_candidats > 0:
-        session.pass_rate = Decimal(str(round((admis_count / nb_candidats) * 100, 2)))
-    
+        return []
+
+    published_at = datetime.now().isoformat()
+    specs = []
+    sessions_generees = []
+
+    for index, (session, nb_candidats) in enumerate(zip(sessions, repartir_lignes(sessions, args.rows))):
+        existing_count = db.query(ExamResult).filter(ExamResult.session_id == session.id).count()
+        if existing_count > 0:
+            print(f"✅ Session {session.exam_type.upper()} {session.year} contient déjà {existing_count} résultats")
+            continue
+
+        series = [s.id for s in db.query(RefSerie).filter(RefSerie.exam_type == session.exam_type).all()]
+        if not series:
+            print(f"❌ Aucune série trouvée pour {session.exam_type}")
+            continue
+
+        print(f"📝 {nb_candidats} résultats à générer pour {session.exam_type.upper()} {session.year}")
+        sessions_generees.append(session)
+
+        for lot, start in enumerate(range(0, nb_candidats, args.batch_size)):
+            specs.append({
+                "seed": args.seed,
+                "seed_key": (index, lot),
+                "session_id": session.id,
+                "year": session.year,
+                "exam_type": session.exam_type,
+                "session_rows": nb_candidats,
+                "start": start,
+                "count": min(args.batch_size, nb_candidats - start),
+                "etablissements": etablissements,
+                "wilayas": wilayas,
+                "series": series,
+                "published_at": published_at
+            })
+
+    if not specs:
+        return []
+
+    totaux = {s.id: [0, 0] for s in sessions_generees}
+    total_rows = sum(spec["count"] for spec in specs)
+    generated = 0
+    started = time.perf_counter()
+
+    def enregistrer(resultat):
+        nonlocal generated
+        session_id, count, admis = resultat
+        totaux[session_id][0] += count
+        totaux[session_id][1] += admis
+        generated += count
+        elapsed = time.perf_counter() - started
+        print(f"  📊 {generated}/{total_rows} résultats chargés ({generated / elapsed:,.0f} lignes/s)")
+
+    if args.workers <= 1:
+        for spec in specs:
+            enregistrer(charger_lot(spec))
+    else:
+        # 'spawn' : les processus n'héritent pas des connexions ouvertes du parent
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=args.workers, mp_context=context) as executor:
+            for future in as_completed([executor.submit(charger_lot, spec) for spec in specs]):
+                enregistrer(future.result())
+
+    print(f"⏱️  {total_rows} résultats en {time.perf_counter() - started:.1f}s")
+
+    # Mettre à jour les statistiques des sessions
+    for session in sessions_generees:
+        nb_candidats, admis_count = totaux[session.id]
+        session.total_candidates = nb_candidats
+        session.total_passed = admis_count
+        if nb_candidats > 0:
+            session.pass_rate = Decimal(str(round((admis_count / nb_candidats) * 100, 2)))
     db.commit()
-    
-    print(f"  ✅ {nb_candidats} candidats, {admis_count} admis ({session.pass_rate}%)")
+
+    return sessions_generees
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Générateur de données de test - Examens Mauritaniens")
+    parser.add_argument("--rows", type=int, default=None,
+                        help="Nombre total de résultats, réparti entre les sessions (défaut : jeu de démonstration)")
+    parser.add_argument("--seed", type=int, default=42, help="Graine du générateur (même graine = mêmes données)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Processus de génération en parallèle")
+    parser.add_argument("--batch-size", type=int, default=50000, help="Candidats par lot COPY")
+    parser.add_argument("--skip-publish", action="store_true",
+                        help="Ne pas lancer le pipeline de publication (classements, agrégats, leaderboards)")
+    return parser.parse_args()
 
 def main():
     """Fonction principale"""
+    args = parse_args()
+
     print("🇲🇷 Générateur de données de test - Examens Mauritaniens")
     print("=" * 65)
     
@@ -331,23 +434,21 @@ def main():
         setup_data_if_needed(db)
         
         # 3. Récupérer toutes les sessions
-        sessions = db.query(ExamSession).all()
+        sessions = db.query(ExamSession).order_by(ExamSession.id).all()
         print(f"📋 {len(sessions)} sessions trouvées")
         
         # 4. Générer les résultats
-        print("\n📋 Génération des résultats...")
+        print(f"\n📋 Génération des résultats (seed={args.seed}, workers={args.workers})...")
+        sessions_generees = generate_results(db, sessions, args)
         
-        candidats_config = {
-            "bac": 800,       # 800 candidats par session BAC
-            "bepc": 400,      # 400 candidats par session BEPC
-            "concours": 200   # 200 candidats par session concours
-        }
-        
-        for session in sessions:
-            nb_candidats = candidats_config.get(session.exam_type, 300)
-            generate_results_for_session(db, session, nb_candidats)
+        # 5. Classements, agrégats et leaderboards comme lors d'une vraie publication
+        if not args.skip_publish:
+            for session in sessions_generees:
+                print(f"🏆 Publication de {session.exam_type.upper()} {session.year}...")
+                # Préchauffage laissé au démarrage de l'API (la boucle se ferme à la fin du script)
+                asyncio.run(PublicationService(db).refresh_session(session.id, warm=False))
         
-        # 5. Afficher le résumé
+        # 6. Afficher le résumé
         print("\n🎉 Génération terminée avec succès!")
         print("=" * 65)
         print("📊 Résumé des sessions:")
@@ -370,4 +471,4 @@ def main():
         db.close()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,30 +1,73 @@
-from fastapi import FastAPI, Request, status
+from fastapi import FastAPI, HTTPException, Request, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.middleware.gzip import GZipMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from fastapi.exception_handlers import request_validation_exception_handler
 from fastapi.exceptions import RequestValidationError
+from fastapi.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
+import asyncio
 import time
 import logging
 
 from config import settings
 from api.routes import results, references, auth, admin, social, stats, sessions
-from database import engine, Base
-
-# Configuration du logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.FileHandler("app.log"),
-        logging.StreamHandler()
-    ]
-)
+from database import open_database, close_connections
+from core.query_profiler import query_profiler
+from core.metrics import metrics
+from core.logging_config import setup_logging
+from core.admission import AdmissionControlMiddleware
+from core.compression import CompressionMiddleware
+from core.cache import cache_manager
+from core.login_guard import login_guard
+from core.security import verify_token
+from services.warmup_service import warm_in_background
+
+# Configuration du logging (file d'attente + thread d'écriture)
+setup_logging()
 
 logger = logging.getLogger(__name__)
+access_logger = logging.getLogger("access")
+
+# Le schéma n'est plus créé à l'import : python migrate.py (aucune connexion tant que l'app n'a pas démarré)
+
+def exposes_db_profile(request: Request) -> bool:
+    """En-têtes X-DB-* seulement en debug ou pour un administrateur (jeton Bearer valide)"""
+    if settings.debug:
+        return True
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return False
+    try:
+        verify_token(token)
+    except HTTPException:
+        return False
+    return True
 
-# Créer les tables
-Base.metadata.create_all(bind=engine)
+async def open_connections():
+    """Première connexion base et ping Redis, après le démarrage : la première requête ne les paie pas"""
+    try:
+        await run_in_threadpool(open_database)
+        redis = await cache_manager.get_redis()
+        if redis:
+            await redis.ping()
+    except Exception as e:
+        logger.warning(f"Connexions de démarrage non ouvertes (nouvel essai à la première requête): {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    async def startup():
+        if settings.connect_on_startup:
+            await open_connections()
+        if settings.warmup_on_startup:
+            # Un seul worker préchauffe les sessions publiées (verrou consultatif)
+            await warm_in_background()
+
+    startup_task = asyncio.create_task(startup())
+    yield
+    if not startup_task.done():
+        startup_task.cancel()
+    await login_guard.flush()
+    await close_connections()
 
 # Initialiser FastAPI
 app = FastAPI(
@@ -33,9 +76,13 @@ app = FastAPI(
     version="1.0.0",
     openapi_url="/openapi.json",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
+# Contrôle d'admission : placé sous CORS pour que les 503/429 restent lisibles par le navigateur
+app.add_middleware(AdmissionControlMiddleware)
+
 # Middleware CORS
 app.add_middleware(
     CORSMiddleware,
@@ -45,22 +92,55 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Middleware de compression
-app.add_middleware(GZipMiddleware, minimum_size=1000)
+# Middleware de compression (br, zstd, gzip ; gros corps compressés hors de la boucle)
+app.add_middleware(CompressionMiddleware)
 
 # Middleware de logging et métriques
 @app.middleware("http")
 async def add_process_time_header(request: Request, call_next):
     start_time = time.time()
-    response = await call_next(request)
+    metrics.request_started(request.method)
+    profile_token = query_profiler.start()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+    finally:
+        profile = query_profiler.stop(profile_token) if profile_token else None
+        metrics.request_finished(request, status_code, time.time() - start_time)
     process_time = time.time() - start_time
     response.headers["X-Process-Time"] = str(process_time)
     
-    # Log des requêtes
-    logger.info(
-        f"{request.method} {request.url.path} - "
-        f"Status: {response.status_code} - "
-        f"Time: {process_time:.3f}s"
+    access = {
+        "method": request.method,
+        "path": request.url.path,
+        "route": metrics.route_template(request),
+        "status": response.status_code,
+        "duration_ms": round(process_time * 1000, 1)
+    }
+    db_info = ""
+    if profile:
+        if exposes_db_profile(request):
+            response.headers["X-DB-Query-Count"] = str(profile.count)
+            response.headers["X-DB-Time"] = f"{profile.duration * 1000:.2f}"
+            response.headers["X-DB-Duplicate-Queries"] = str(profile.duplicates)
+        access.update(
+            db_queries=profile.count,
+            db_time_ms=round(profile.duration * 1000, 1),
+            db_duplicates=profile.duplicates
+        )
+        db_info = (
+            f" - Queries: {profile.count} - DB: {profile.duration * 1000:.1f}ms"
+            f" - Duplicates: {profile.duplicates}"
+        )
+        query_profiler.report_n_plus_one(profile, request.method, request.url.path)
+    
+    # Log des requêtes (logger 'access', échantillonnable via LOG_SAMPLE_RATES ; les 5xx sont toujours gardés)
+    access_logger.log(
+        logging.WARNING if response.status_code >= 500 else logging.INFO,
+        "%s %s - Status: %s - Time: %.3fs%s",
+        request.method, request.url.path, response.status_code, process_time, db_info,
+        extra=access
     )
     
     return response
@@ -105,6 +185,12 @@ async def root():
         "version": "1.0.0"
     }
 
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """Métriques Prometheus (latences par route, requêtes en cours, cache, pool DB, uploads)"""
+    content, content_type = metrics.render()
+    return Response(content=content, media_type=content_type)
+
 @app.get("/health/redis")
 async def redis_health_check():
     """Vérifier la santé de Redis"""
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Création du schéma de la base (tables et index déclarés dans models/database.py)
+
+L'application ne crée plus les tables à son import : cette commande est lancée une fois au
+déploiement, avant les workers. Les tables existantes ne sont pas modifiées ; une base
+existante reçoit les évolutions par les scripts de db/migrations/ (psql).
+
+Usage:
+    python migrate.py            # crée les tables manquantes
+    python migrate.py --check    # liste les tables manquantes sans rien créer (code 1 s'il en manque)
+"""
+
+import argparse
+import sys
+from sqlalchemy import inspect
+from database import Base, engine
+import models.database  # noqa: F401 (déclare les tables sur Base.metadata)
+
+def missing_tables():
+    existing = set(inspect(engine).get_table_names())
+    return [table.name for table in Base.metadata.sorted_tables if table.name not in existing]
+
+def create_schema():
+    """Crée les tables manquantes et leurs index ; retourne leurs noms"""
+    missing = missing_tables()
+    Base.metadata.create_all(bind=engine)
+    return missing
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Création du schéma de la base")
+    parser.add_argument("--check", action="store_true", help="Liste les tables manquantes sans les créer")
+    args = parser.parse_args()
+
+    if args.check:
+        missing = missing_tables()
+        for name in missing:
+            print(f"  • {name}")
+        print(f"{len(missing)} table(s) manquante(s)" if missing else "Schéma complet")
+        return 1 if missing else 0
+
+    created = create_schema()
+    for name in created:
+        print(f"  • {name}")
+    print(f"{len(created)} table(s) créée(s)" if created else "Schéma déjà à jour")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
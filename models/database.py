@@ -1,5 +1,5 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, DECIMAL, Date, ForeignKey, JSON, Index
-from sqlalchemy.dialects.postgresql import UUID, INET
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, DECIMAL, Date, ForeignKey, JSON, Index, LargeBinary
+from sqlalchemy.dialects.postgresql import UUID, INET, JSONB
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 import uuid
@@ -85,12 +85,14 @@ class ExamSession(Base):
     total_candidates = Column(Integer, default=0)
     total_passed = Column(Integer, default=0)
     pass_rate = Column(DECIMAL(5, 2))
+    data_version = Column(Integer, default=0, nullable=False)  # Incrémenté à chaque recalcul des données dérivées
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
 class ExamResult(Base):
     __tablename__ = "exam_results"
     
+    # Base partitionnée par session (migration 004) : clé primaire (id, session_id) côté PostgreSQL
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     session_id = Column(Integer, ForeignKey("exam_sessions.id"))
     etablissement_id = Column(Integer, ForeignKey("ref_etablissements.id"))
@@ -142,6 +144,96 @@ class ExamResult(Base):
     wilaya = relationship("RefWilaya")
     moughata = relationship("RefMoughata")
 
+class EntityRanking(Base):
+    __tablename__ = "entity_rankings"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    session_id = Column(Integer, ForeignKey("exam_sessions.id"), nullable=False)
+    entity_type = Column(String(20), nullable=False)  # 'wilaya', 'etablissement'
+    entity_id = Column(Integer, nullable=False)
+    wilaya_id = Column(Integer, ForeignKey("ref_wilayas.id"))  # Wilaya de rattachement (établissements)
+    
+    total_candidats = Column(Integer, default=0)
+    total_admis = Column(Integer, default=0)
+    taux_reussite = Column(DECIMAL(5, 2))
+    moyenne = Column(DECIMAL(5, 2))
+    rang = Column(Integer)  # Rang national (wilaya) ou rang dans la wilaya (établissement)
+    
+    computed_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class ResultsRollup(Base):
+    __tablename__ = "results_rollup"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    session_id = Column(Integer, ForeignKey("exam_sessions.id"), nullable=False)
+    year = Column(Integer, nullable=False)
+    exam_type = Column(String(20), nullable=False)
+    wilaya_id = Column(Integer)
+    etablissement_id = Column(Integer)
+    serie_id = Column(Integer)
+    sexe = Column(String(1))
+    decision = Column(String(30), nullable=False)
+    
+    total_candidats = Column(Integer, nullable=False, default=0)
+    total_notes = Column(Integer, nullable=False, default=0)  # Candidats avec une moyenne
+    somme_moyennes = Column(DECIMAL(14, 2), nullable=False, default=0)
+
+class ResultsSearch(Base):
+    __tablename__ = "exam_results_search"
+    
+    # Projection de lecture des résultats publiés (services/search_projection_service.py) : session,
+    # code de série et références recopiés, recherche et détail servis sans jointure
+    id = Column(UUID(as_uuid=True), primary_key=True)  # exam_results.id
+    session_id = Column(Integer, nullable=False)
+    year = Column(Integer, nullable=False)
+    exam_type = Column(String(20), nullable=False)
+    etablissement_id = Column(Integer)
+    serie_id = Column(Integer)
+    wilaya_id = Column(Integer)
+    serie_code = Column(String(10))
+    
+    nni = Column(String(20), nullable=False)
+    numero_dossier = Column(String(20))
+    nom_complet_fr = Column(String(200), nullable=False)
+    nom_complet_ar = Column(String(200))
+    nom_pere = Column(String(150))
+    lieu_naissance = Column(String(100))
+    date_naissance = Column(Date)
+    sexe = Column(String(1))
+    type_candidat = Column(String(20))
+    centre_examen = Column(String(200))
+    
+    moyenne_generale = Column(DECIMAL(5, 2))
+    total_points = Column(DECIMAL(8, 2))
+    decision = Column(String(30), nullable=False)
+    mention = Column(String(30))
+    rang_etablissement = Column(Integer)
+    rang_wilaya = Column(Integer)
+    rang_national = Column(Integer)
+    
+    is_published = Column(Boolean, default=True, nullable=False)
+    view_count = Column(Integer, default=0)
+    published_at = Column(DateTime(timezone=True))
+    created_at = Column(DateTime(timezone=True))
+    
+    # Références sous la forme des schémas de réponse (EtablissementResponse, SerieResponse, WilayaResponse)
+    etablissement = Column(JSONB)
+    serie = Column(JSONB)
+    wilaya = Column(JSONB)
+
+class ResponseSnapshot(Base):
+    __tablename__ = "response_snapshots"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    session_id = Column(Integer, ForeignKey("exam_sessions.id"), nullable=False)
+    data_version = Column(Integer, nullable=False)  # Génération de la session au moment du calcul
+    cache_key = Column(String(500), nullable=False)  # Gabarit de route + paramètres normalisés
+    body = Column(LargeBinary, nullable=False)       # JSON sérialisé
+    body_gzip = Column(LargeBinary)                  # Variantes pré-compressées (corps assez gros)
+    body_br = Column(LargeBinary)
+    body_zstd = Column(LargeBinary)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
 class SocialShare(Base):
     __tablename__ = "social_shares"
     
@@ -187,4 +279,36 @@ class AdminUser(Base):
 # Index pour performance
 Index('idx_exam_results_nni', ExamResult.nni)
 Index('idx_exam_results_numero_dossier', ExamResult.numero_dossier)
-Index('idx_exam_results_session_published', ExamResult.session_id, ExamResult.is_published)
\ No newline at end of file
+Index('idx_exam_results_session_published', ExamResult.session_id, ExamResult.is_published)
+# Chemins d'accès publics (db/migrations/003_exam_results_indexes.sql) : résultats publiés d'une session
+# triés par moyenne ; les index trigram du nom exigent pg_trgm et restent dans le schéma SQL
+_published = ExamResult.is_published == True
+_rank = (ExamResult.moyenne_generale.desc().nullslast(), ExamResult.created_at.desc())
+Index('idx_exam_results_published_rank', ExamResult.session_id, *_rank,
+      postgresql_where=_published,
+      postgresql_include=['decision', 'wilaya_id', 'etablissement_id', 'serie_id'])
+Index('idx_exam_results_published_wilaya', ExamResult.session_id, ExamResult.wilaya_id, *_rank,
+      postgresql_where=_published)
+Index('idx_exam_results_published_etablissement', ExamResult.session_id, ExamResult.etablissement_id, *_rank,
+      postgresql_where=_published)
+Index('idx_exam_results_published_serie', ExamResult.session_id, ExamResult.serie_id, *_rank,
+      postgresql_where=_published)
+Index('idx_exam_results_wilaya', ExamResult.wilaya_id)
+Index('idx_exam_results_etablissement', ExamResult.etablissement_id)
+# Projection de recherche (db/migrations/005_exam_results_search.sql) : mêmes chemins que les index
+# publiés de exam_results, l'année et le type d'examen remplaçant la session
+_search_rank = (ResultsSearch.moyenne_generale.desc().nullslast(), ResultsSearch.created_at.desc())
+Index('idx_results_search_nni', ResultsSearch.nni)
+Index('idx_results_search_numero_dossier', ResultsSearch.numero_dossier)
+Index('idx_results_search_session', ResultsSearch.session_id)
+Index('idx_results_search_rank', ResultsSearch.year, ResultsSearch.exam_type, *_search_rank,
+      postgresql_include=['decision', 'serie_code'])
+Index('idx_results_search_wilaya', ResultsSearch.wilaya_id, ResultsSearch.year, ResultsSearch.exam_type, *_search_rank)
+Index('idx_results_search_etablissement', ResultsSearch.etablissement_id, ResultsSearch.year, ResultsSearch.exam_type,
+      *_search_rank)
+Index('idx_results_search_serie', ResultsSearch.serie_id, ResultsSearch.year, ResultsSearch.exam_type, *_search_rank)
+Index('idx_entity_rankings_lookup', EntityRanking.session_id, EntityRanking.entity_type, EntityRanking.entity_id, unique=True)
+Index('idx_results_rollup_exam_year', ResultsRollup.exam_type, ResultsRollup.year)
+Index('idx_results_rollup_session', ResultsRollup.session_id)
+Index('idx_response_snapshots_key', ResponseSnapshot.cache_key, ResponseSnapshot.data_version, unique=True)
+Index('idx_response_snapshots_session', ResponseSnapshot.session_id)
\ No newline at end of file
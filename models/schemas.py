@@ -104,6 +104,8 @@ class SearchParams(BaseModel):
     exam_type: Optional[str] = None
     page: int = Field(1, ge=1)
     size: int = Field(50, ge=1, le=1000)
+    fields: Optional[List[str]] = None  # Champs de ExamResultResponse à renvoyer (None : tous)
+    compact: bool = False               # Résultats en tableau de lignes, la première étant l'en-tête
 
 class SearchResponse(BaseModel):
     results: List[ExamResultResponse]
@@ -114,6 +116,26 @@ class SearchResponse(BaseModel):
     has_next: bool
     has_prev: bool
 
+# Recherche groupée par identifiant
+class BatchLookupRequest(BaseModel):
+    year: int
+    exam_type: str
+    key: str = Field("nni", pattern="^(nni|numero_dossier)$")
+    values: List[str] = Field(..., min_length=1)
+
+class BatchLookupItem(BaseModel):
+    value: str
+    found: bool
+    result: Optional[ExamResultResponse] = None
+
+class BatchLookupResponse(BaseModel):
+    year: int
+    exam_type: str
+    key: str
+    total: int
+    found: int
+    results: List[BatchLookupItem]
+
 # Schémas pour partage social
 class SocialShareCreate(BaseModel):
     result_id: uuid.UUID
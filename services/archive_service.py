@@ -0,0 +1,441 @@
+import io
+import json
+import os
+import shutil
+import uuid
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from sqlalchemy import Boolean, Date, DateTime, Integer, Numeric, bindparam, select, text
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import Session, joinedload
+from models.database import ExamResult, ExamSession, RefEtablissement, RefWilaya, RefSerie
+from models.schemas import ExamResultResponse, SearchParams
+from core.archive_reader import archive_reader
+from core.statements import statements
+from services.partition_service import PARENT_TABLE, PartitionService
+from services.search_projection_service import SearchProjectionService
+from services.ranking_service import DECISIONS_ADMIS
+from services.leaderboard_service import LeaderboardService, MIN_CANDIDATS_ECOLE
+from config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_COLUMNS = [column.name for column in ExamResult.__table__.columns]
+SORT_COLUMNS = ["id", "moyenne_generale", "created_at"]
+
+def _arrow_type(column):
+    """Type Arrow d'une colonne de exam_results (décimaux exacts, horodatages UTC)"""
+    import pyarrow as pa
+
+    kind = column.type
+    if isinstance(kind, UUID):
+        return pa.string()
+    if isinstance(kind, Boolean):
+        return pa.bool_()
+    if isinstance(kind, Integer):
+        return pa.int32()
+    if isinstance(kind, Numeric):
+        return pa.decimal128(kind.precision, kind.scale)
+    if isinstance(kind, DateTime):
+        return pa.timestamp("us", tz="UTC")
+    if isinstance(kind, Date):
+        return pa.date32()
+    return pa.string()
+
+class ArchiveService:
+    """Archive froide : les résultats d'une session archivée quittent PostgreSQL pour un fichier
+    Parquet compressé (un par session, trié par NNI), lu à la demande par core/archive_reader.py.
+
+    Recherches, détail d'un résultat, statistiques et classements d'une session en archive froide
+    sont servis depuis ce fichier ; la restauration recharge les lignes dans exam_results.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    # Écriture et restauration
+    def archive_session(self, session_id: int) -> Optional[Dict[str, Any]]:
+        """Exporte les résultats de la session en Parquet puis les supprime de la base"""
+        session = self.db.query(ExamSession).filter(ExamSession.id == session_id).first()
+        if not session:
+            return None
+        if archive_reader.has_archive(session.id):
+            raise ValueError("La session est déjà en archive froide")
+
+        partitions = PartitionService(self.db)
+        if not session.is_archived:
+            # Partition détachée d'abord : les lectures en ligne ne voient plus la session pendant l'export
+            partitions.archive_session(session.id)
+
+        source = partitions.detached_table(session.id) or PARENT_TABLE
+        rows = self._write_archive(session, source)
+
+        if source == PARENT_TABLE:
+            self.db.execute(text(f"DELETE FROM {PARENT_TABLE} WHERE session_id = :id"), {"id": session.id})
+        else:
+            self.db.execute(text(f"DROP TABLE {source}"))
+        self.db.commit()
+        archive_reader.forget(session.id)
+        SearchProjectionService(self.db).refresh_session(session.id)
+
+        manifest = archive_reader.manifest(session.id)
+        logger.info(f"Session {session.exam_type} {session.year} en archive froide: {rows} lignes, "
+                    f"{manifest['size_bytes']} octets")
+        return {"session_id": session.id, "rows": rows, "size_bytes": manifest["size_bytes"],
+                "path": archive_reader.data_path(session.id), "source": source}
+
+    def restore_session(self, session_id: int) -> Optional[Dict[str, Any]]:
+        """Recharge l'archive froide dans exam_results et rend la session de nouveau active"""
+        session = self.db.query(ExamSession).filter(ExamSession.id == session_id).first()
+        if not session:
+            return None
+        manifest = archive_reader.manifest(session.id)
+        if not manifest:
+            raise ValueError("Aucune archive froide pour cette session")
+
+        import pyarrow.csv as pa_csv
+        import pyarrow.parquet as pq
+
+        PartitionService(self.db).create_partition(session.id)
+
+        # COPY par groupe de lignes, dans la transaction de la session (annulée si incomplète)
+        cursor = self.db.connection().connection.cursor()
+        parquet = pq.ParquetFile(archive_reader.data_path(session.id))
+        for batch in parquet.iter_batches(batch_size=settings.archive_row_group_size):
+            buffer = io.BytesIO()
+            pa_csv.write_csv(batch, buffer, pa_csv.WriteOptions(include_header=False))
+            buffer.seek(0)
+            cursor.copy_expert(
+                f"COPY {PARENT_TABLE} ({', '.join(batch.schema.names)}) FROM STDIN WITH (FORMAT csv)", buffer
+            )
+
+        restored = self.db.execute(
+            text(f"SELECT count(*) FROM {PARENT_TABLE} WHERE session_id = :id"), {"id": session.id}
+        ).scalar()
+        if restored != manifest["rows"]:
+            self.db.rollback()
+            raise ValueError(f"Restauration incomplète: {restored} lignes sur {manifest['rows']}")
+
+        session.is_archived = False
+        self.db.commit()
+
+        shutil.rmtree(archive_reader.directory(session.id), ignore_errors=True)
+        archive_reader.forget(session.id)
+        SearchProjectionService(self.db).refresh_session(session.id)
+        logger.info(f"Session {session.exam_type} {session.year} restaurée: {restored} lignes")
+        return {"session_id": session.id, "rows": restored, "is_archived": False}
+
+    def _write_archive(self, session: ExamSession, source: str) -> int:
+        """Lecture par curseur serveur, un groupe de lignes par lot, fichier temporaire puis renommage"""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        columns = list(ExamResult.__table__.columns)
+        schema = pa.schema([(column.name, _arrow_type(column)) for column in columns])
+        is_uuid = [isinstance(column.type, UUID) for column in columns]
+
+        expected = self.db.execute(
+            text(f"SELECT count(*) FROM {source} WHERE session_id = :id"), {"id": session.id}
+        ).scalar()
+
+        directory = archive_reader.directory(session.id)
+        os.makedirs(directory, exist_ok=True)
+        path = archive_reader.data_path(session.id)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+
+        # Trié par NNI : les statistiques min/max de chaque groupe de lignes ciblent les recherches
+        statement = text(
+            f"SELECT {', '.join(ARCHIVE_COLUMNS)} FROM {source} WHERE session_id = :id ORDER BY nni, id"
+        ).execution_options(yield_per=settings.archive_row_group_size)
+        try:
+            with pq.ParquetWriter(tmp_path, schema, compression="zstd") as writer:
+                for batch in self.db.execute(statement, {"id": session.id}).partitions():
+                    arrays = []
+                    for convert, kind, values in zip(is_uuid, schema.types, zip(*batch)):
+                        if convert:
+                            values = [None if v is None else str(v) for v in values]
+                        arrays.append(pa.array(values, type=kind))
+                    writer.write_table(pa.Table.from_arrays(arrays, schema=schema),
+                                       row_group_size=settings.archive_row_group_size)
+
+            written = pq.read_metadata(tmp_path).num_rows
+            if written != expected:
+                raise ValueError(f"Archive incomplète: {written} lignes écrites sur {expected}")
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        # Manifeste en dernier : l'archive n'est visible qu'une fois le fichier complet
+        manifest = {
+            "session_id": session.id,
+            "year": session.year,
+            "exam_type": session.exam_type,
+            "data_version": session.data_version or 0,
+            "rows": written,
+            "size_bytes": os.path.getsize(path),
+            "archived_at": datetime.now(timezone.utc).isoformat()
+        }
+        manifest_path = archive_reader.manifest_path(session.id)
+        with open(f"{manifest_path}.tmp", "w") as f:
+            json.dump(manifest, f)
+        os.replace(f"{manifest_path}.tmp", manifest_path)
+        return written
+
+    # Lecture
+    def cold_session_ids(self, year: Optional[int] = None, exam_type: Optional[str] = None) -> List[int]:
+        """Sessions archivées dont les résultats sont en archive froide (filtrées par année et type)"""
+        # Lue à chaque recherche : gabarit précompilé par combinaison de filtres
+        values = {name: value for name, value in (("year", year), ("exam_type", exam_type)) if value}
+        query = statements.get("archive.cold_sessions", lambda: select(ExamSession.id).where(
+            ExamSession.is_archived == True, *[getattr(ExamSession, name) == bindparam(name) for name in values]
+        ), *values)
+        return [session_id for session_id in self.db.execute(query, values).scalars()
+                if archive_reader.has_archive(session_id)]
+
+    def search(self, session_ids: Sequence[int], params: SearchParams, limit: int) -> Tuple[int, List[Dict[str, Any]]]:
+        """Total et `limit` premiers résultats (moyenne décroissante) des sessions en archive froide"""
+        filters = params.model_dump(exclude={"page", "size", "year", "exam_type", "fields", "compact"})
+        key = ("search", *[archive_reader.token(s) for s in session_ids],
+               json.dumps(filters, sort_keys=True), limit)
+        return archive_reader.cached(key, lambda: self._search(session_ids, filters, limit))
+
+    def _search(self, session_ids: Sequence[int], filters: Dict[str, Any], limit: int):
+        import pyarrow as pa
+        import pyarrow.compute as pc
+
+        expression = self._filter_expression(filters)
+        if expression is False:
+            return 0, []
+
+        # Colonnes de tri seulement pour compter et classer, lignes complètes pour la page
+        keys = pa.concat_tables([archive_reader.read(s, SORT_COLUMNS, expression) for s in session_ids])
+        if not keys.num_rows or not limit:
+            return keys.num_rows, []
+
+        # Moyennes nulles en dernier (placement par défaut d'Arrow), comme NULLS LAST
+        order = pc.sort_indices(keys, sort_keys=[("moyenne_generale", "descending"), ("created_at", "descending")])
+        page_ids = keys["id"].take(order[:limit]).to_pylist()
+        rows = self._rows_by_id(session_ids, page_ids)
+        by_id = {row["id"]: row for row in rows}
+        results = self._results([by_id[i] for i in page_ids if i in by_id])
+        return keys.num_rows, [ExamResultResponse.model_validate(r).model_dump() for r in results]
+
+    def _filter_expression(self, filters: Dict[str, Any]):
+        import pyarrow.compute as pc
+        import pyarrow.dataset as ds
+
+        conditions = []
+        for name in ("nni", "numero_dossier", "wilaya_id", "etablissement_id", "serie_id", "decision"):
+            if filters.get(name):
+                conditions.append(ds.field(name) == filters[name])
+
+        if filters.get("serie_code"):
+            serie = self.db.query(RefSerie.id).filter(RefSerie.code == filters["serie_code"]).first()
+            if not serie:
+                return False
+            conditions.append(ds.field("serie_id") == serie.id)
+
+        if filters.get("nom"):
+            conditions.append(
+                pc.match_substring(ds.field("nom_complet_fr"), filters["nom"], ignore_case=True)
+                | pc.match_substring(ds.field("nom_complet_ar"), filters["nom"], ignore_case=True)
+            )
+
+        expression = None
+        for condition in conditions:
+            expression = condition if expression is None else expression & condition
+        return expression
+
+    def _rows_by_id(self, session_ids: Sequence[int], ids: List[str]) -> List[Dict[str, Any]]:
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+
+        wanted = ds.field("id").isin(pa.array(ids, type=pa.string()))
+        return [row for s in session_ids for row in archive_reader.read(s, filter=wanted).to_pylist()]
+
+    def find_result(self, result_id: uuid.UUID) -> Optional[SimpleNamespace]:
+        """Résultat publié d'une session en archive froide, avec ses références (détail)"""
+        sessions = self.cold_session_ids()
+        if not sessions:
+            return None
+
+        key = ("result", *[archive_reader.token(s) for s in sessions], str(result_id))
+        rows = archive_reader.cached(key, lambda: self._rows_by_id(sessions, [str(result_id)]))
+        return self._results(rows)[0] if rows else None
+
+    def lookup(self, session_id: int, key: str, values: List[str]) -> List[Dict[str, Any]]:
+        """Résultats publiés d'une session en archive froide dont le NNI ou le n° de dossier (key) est dans values"""
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+
+        # Fichier trié par NNI : les statistiques des row groups écartent la plupart des lectures
+        wanted = ds.field(key).isin(pa.array(values, type=pa.string()))
+        rows = archive_reader.read(session_id, filter=wanted).to_pylist()
+        return [ExamResultResponse.model_validate(r).model_dump() for r in self._results(rows)]
+
+    def _results(self, rows: List[Dict[str, Any]]) -> List[SimpleNamespace]:
+        """Lignes d'archive sous la forme attendue par les schémas de réponse (from_attributes)"""
+        def ids(name):
+            return {row[name] for row in rows if row[name] is not None}
+
+        etablissements = {e.id: e for e in self.db.query(RefEtablissement).options(
+            joinedload(RefEtablissement.wilaya)).filter(RefEtablissement.id.in_(ids("etablissement_id")))}
+        series = {s.id: s for s in self.db.query(RefSerie).filter(RefSerie.id.in_(ids("serie_id")))}
+        wilayas = {w.id: w for w in self.db.query(RefWilaya).filter(RefWilaya.id.in_(ids("wilaya_id")))}
+
+        return [
+            SimpleNamespace(
+                **dict(row, id=uuid.UUID(row["id"])),
+                etablissement=etablissements.get(row["etablissement_id"]),
+                serie=series.get(row["serie_id"]),
+                wilaya=wilayas.get(row["wilaya_id"])
+            )
+            for row in rows
+        ]
+
+    # Statistiques et classements
+    def session_results(self, session_id: int, **equals) -> List[SimpleNamespace]:
+        """Résultats publiés (décision, moyenne, série) d'une session filtrés par égalité"""
+        import pyarrow.dataset as ds
+
+        def compute():
+            expression = None
+            for name, value in equals.items():
+                condition = ds.field(name) == value
+                expression = condition if expression is None else expression & condition
+            table = archive_reader.read(session_id, ["decision", "moyenne_generale", "serie_id"], expression)
+            return [SimpleNamespace(**row) for row in table.to_pylist()]
+
+        key = ("results", archive_reader.token(session_id), json.dumps(equals, sort_keys=True))
+        return archive_reader.cached(key, compute)
+
+    def global_aggregates(self, session_id: int):
+        """Lignes par wilaya et par série et nombre d'établissements, comme les agrégats SQL"""
+        key = ("global", archive_reader.token(session_id))
+        return archive_reader.cached(key, lambda: self._global_aggregates(session_id))
+
+    def _global_aggregates(self, session_id: int):
+        import pyarrow.compute as pc
+
+        table = self._scored_table(session_id)
+        wilayas = {w.id: w for w in self.db.query(RefWilaya.id, RefWilaya.name_fr, RefWilaya.name_ar)}
+        series = {s.id: s for s in self.db.query(RefSerie.id, RefSerie.code, RefSerie.name_fr, RefSerie.name_ar)}
+
+        wilaya_rows = []
+        for group in table.group_by("wilaya_id").aggregate(
+                [("admis", "count"), ("admis", "sum"), ("moyenne", "mean")]).to_pylist():
+            wilaya = wilayas.get(group["wilaya_id"])
+            if wilaya:
+                wilaya_rows.append(SimpleNamespace(
+                    id=wilaya.id, name_fr=wilaya.name_fr, name_ar=wilaya.name_ar,
+                    total_candidats=group["admis_count"], total_admis=group["admis_sum"],
+                    moyenne=group["moyenne_mean"]
+                ))
+
+        serie_rows = []
+        for group in table.group_by("serie_id").aggregate([("admis", "count"), ("admis", "sum")]).to_pylist():
+            serie = series.get(group["serie_id"])
+            if serie:
+                serie_rows.append(SimpleNamespace(
+                    id=serie.id, code=serie.code, name_fr=serie.name_fr, name_ar=serie.name_ar,
+                    total_candidats=group["admis_count"], total_admis=group["admis_sum"]
+                ))
+
+        total_etablissements = pc.count_distinct(table["etablissement_id"]).as_py()
+        return wilaya_rows, serie_rows, total_etablissements
+
+    def top_students(self, session_id: int, limit: int, wilaya_id: Optional[int] = None,
+                     serie_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Top élèves admis d'une session en archive froide (même contenu que les leaderboards)"""
+        key = ("students", archive_reader.token(session_id), limit, wilaya_id, serie_id)
+        return archive_reader.cached(key, lambda: self._top_students(session_id, limit, wilaya_id, serie_id))
+
+    def _top_students(self, session_id: int, limit: int, wilaya_id: Optional[int], serie_id: Optional[int]):
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.dataset as ds
+
+        expression = ds.field("decision").isin(pa.array(DECISIONS_ADMIS)) & ds.field("moyenne_generale").is_valid()
+        if wilaya_id:
+            expression = expression & (ds.field("wilaya_id") == wilaya_id)
+        if serie_id:
+            expression = expression & (ds.field("serie_id") == serie_id)
+
+        table = archive_reader.read(session_id, [
+            "id", "nom_complet_fr", "moyenne_generale", "decision", "wilaya_id", "serie_id", "etablissement_id"
+        ], expression)
+        if not table.num_rows:
+            return []
+
+        names = self._reference_names()
+        students = []
+        order = pc.sort_indices(table, sort_keys=[("moyenne_generale", "descending")])
+        for row in table.take(order).to_pylist():
+            etablissement = names["etablissements"].get(row["etablissement_id"])
+            wilaya = names["wilayas"].get(row["wilaya_id"])
+            serie = names["series"].get(row["serie_id"])
+            # Jointures internes du calcul SQL : références manquantes exclues
+            if not (etablissement and wilaya and serie):
+                continue
+            students.append(LeaderboardService._student_payload(
+                row["id"], row["nom_complet_fr"], float(row["moyenne_generale"]), row["decision"],
+                wilaya, serie, etablissement[0]
+            ))
+            if len(students) == limit:
+                break
+        return students
+
+    def top_schools(self, session_id: int, limit: int, wilaya_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Top écoles d'une session en archive froide, triées comme les leaderboards"""
+        key = ("schools", archive_reader.token(session_id), limit, wilaya_id)
+        return archive_reader.cached(key, lambda: self._top_schools(session_id, limit, wilaya_id))
+
+    def _top_schools(self, session_id: int, limit: int, wilaya_id: Optional[int]):
+        table = self._scored_table(session_id)
+        names = self._reference_names()
+
+        schools = []
+        for group in table.group_by("etablissement_id").aggregate(
+                [("admis", "count"), ("admis", "sum"), ("moyenne", "sum"), ("moyenne", "count")]).to_pylist():
+            etablissement = names["etablissements"].get(group["etablissement_id"])
+            if not etablissement or not etablissement[1] or group["admis_count"] < MIN_CANDIDATS_ECOLE:
+                continue
+            if wilaya_id and etablissement[1] != wilaya_id:
+                continue
+            schools.append(LeaderboardService._school_payload({
+                "id": group["etablissement_id"],
+                "nom": etablissement[0],
+                "wilaya": names["wilayas"].get(etablissement[1]),
+                "candidats": group["admis_count"],
+                "admis": group["admis_sum"],
+                "somme_moyennes": group["moyenne_sum"] or 0.0,
+                "nb_moyennes": group["moyenne_count"]
+            }))
+
+        schools.sort(key=lambda s: LeaderboardService._school_score(s["taux_reussite"], s["moyenne"]), reverse=True)
+        return schools[:limit]
+
+    def _reference_names(self) -> Dict[str, Dict]:
+        return {
+            "wilayas": {w.id: w.name_fr for w in self.db.query(RefWilaya.id, RefWilaya.name_fr)},
+            "series": {s.id: s.code for s in self.db.query(RefSerie.id, RefSerie.code)},
+            "etablissements": {
+                e.id: (e.name_fr, e.wilaya_id)
+                for e in self.db.query(RefEtablissement.id, RefEtablissement.name_fr, RefEtablissement.wilaya_id)
+            }
+        }
+
+    def _scored_table(self, session_id: int):
+        """Colonnes d'agrégation : admis (0/1) et moyenne en flottant"""
+        import pyarrow as pa
+        import pyarrow.compute as pc
+
+        table = archive_reader.read(session_id, ["wilaya_id", "serie_id", "etablissement_id",
+                                                 "decision", "moyenne_generale"])
+        admis = pc.is_in(table["decision"], value_set=pa.array(DECISIONS_ADMIS)).fill_null(False)
+        return table.append_column("admis", pc.cast(admis, pa.int64())).append_column(
+            "moyenne", pc.cast(table["moyenne_generale"], pa.float64())
+        )
@@ -0,0 +1,227 @@
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, Any, List, Optional
+from sqlalchemy.orm import Session
+from sqlalchemy import and_, select
+from models.database import ExamResult, ExamSession, RefEtablissement, RefWilaya, RefSerie
+from config import settings
+
+if TYPE_CHECKING:
+    import numpy as np
+
+DIMENSIONS = ("national", "wilaya", "serie", "etablissement")
+MENTIONS = ["Très Bien", "Bien", "Assez Bien", "Passable"]
+QUANTILES = {"p10": 0.10, "q1": 0.25, "mediane": 0.50, "q3": 0.75, "p90": 0.90}
+
+class SessionArrays:
+    """Notes et dimensions d'une session sous forme de tableaux NumPy compacts"""
+
+    def __init__(self, rows: List[tuple], exam_type: str):
+        # Import différé : NumPy n'est chargé qu'au premier calcul de distribution
+        import numpy as np
+
+        columns = list(zip(*rows)) if rows else [()] * 6
+        self.scores = np.array([np.nan if v is None else float(v) for v in columns[0]], dtype=np.float64)
+        self.wilaya = np.array([v or 0 for v in columns[1]], dtype=np.int32)
+        self.serie = np.array([v or 0 for v in columns[2]], dtype=np.int32)
+        self.etablissement = np.array([v or 0 for v in columns[3]], dtype=np.int32)
+
+        self.decision_labels, self.decisions = np.unique(np.array(columns[4], dtype=object).astype(str), return_inverse=True)
+        mention_index = {m: i for i, m in enumerate(MENTIONS)}
+        # Code len(MENTIONS) = sans mention
+        self.mentions = np.array([mention_index.get(v, len(MENTIONS)) for v in columns[5]], dtype=np.int8)
+
+        # Échelle des notes : /20 sauf pour les concours (total des points) ; au moins 1, les bornes
+        # des classes de l'histogramme divisent par l'échelle (concours où toutes les notes valent 0)
+        valid = self.scores[~np.isnan(self.scores)]
+        if exam_type == "concours" and valid.size:
+            self.max_score = max(float(np.ceil(valid.max())), 1.0)
+        else:
+            self.max_score = 20.0
+
+    def groups(self, group_by: str) -> "np.ndarray":
+        import numpy as np
+
+        if group_by == "national":
+            return np.zeros(self.scores.shape[0], dtype=np.int32)
+        return getattr(self, group_by)
+
+class DistributionService:
+    """Statistiques de distribution (quantiles, histogrammes, écart-type, mentions) vectorisées"""
+
+    # Caches partagés par le processus, indexés par (session, génération)
+    _arrays_cache: "OrderedDict[tuple, SessionArrays]" = OrderedDict()
+    _results_cache: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+    # Appels depuis le pool de threads : lecture, réordonnancement et éviction sous verrou
+    _cache_lock = threading.Lock()
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def get_distribution(self, year: int, exam_type: str, group_by: str = "national",
+                         group_id: Optional[int] = None, bins: int = 20) -> Optional[Dict[str, Any]]:
+        """Distribution des notes d'une session, regroupée par dimension"""
+
+        if group_by not in DIMENSIONS:
+            raise ValueError(f"Dimension inconnue: {group_by}. Valeurs possibles: {', '.join(DIMENSIONS)}")
+
+        session = self.db.query(ExamSession).filter(
+            and_(ExamSession.year == year, ExamSession.exam_type == exam_type)
+        ).first()
+
+        if not session:
+            return None
+
+        generation = (session.id, session.data_version or 0)
+        result_key = generation + (group_by, group_id, bins)
+        cached = self._cache_get(DistributionService._results_cache, result_key)
+        if cached is not None:
+            return cached
+
+        arrays = self._cache_get(DistributionService._arrays_cache, generation)
+        if arrays is None:
+            arrays = self._load_arrays(session)
+            self._cache_put(DistributionService._arrays_cache, generation, arrays, settings.distribution_cache_sessions)
+
+        groups = self._compute(arrays, group_by, group_id, bins)
+        names = self._group_names(group_by, [g["group_id"] for g in groups])
+        for g in groups:
+            g["nom"] = names.get(g["group_id"])
+
+        result = {
+            "year": year,
+            "exam_type": exam_type,
+            "group_by": group_by,
+            "echelle": arrays.max_score,
+            "groupes": groups
+        }
+        self._cache_put(DistributionService._results_cache, result_key, result, settings.distribution_cache_results)
+        return result
+
+    @staticmethod
+    def _cache_get(cache: OrderedDict, key):
+        with DistributionService._cache_lock:
+            value = cache.get(key)
+            if value is not None:
+                cache.move_to_end(key)
+            return value
+
+    @staticmethod
+    def _cache_put(cache: OrderedDict, key, value, max_size: int):
+        with DistributionService._cache_lock:
+            cache[key] = value
+            cache.move_to_end(key)
+            while len(cache) > max_size:
+                cache.popitem(last=False)
+
+    def _load_arrays(self, session: ExamSession) -> SessionArrays:
+        score = ExamResult.total_points if session.exam_type == "concours" else ExamResult.moyenne_generale
+        rows = self.db.execute(
+            select(
+                score,
+                ExamResult.wilaya_id,
+                ExamResult.serie_id,
+                ExamResult.etablissement_id,
+                ExamResult.decision,
+                ExamResult.mention
+            ).where(
+                and_(ExamResult.session_id == session.id, ExamResult.is_published == True)
+            )
+        ).all()
+        return SessionArrays(rows, session.exam_type)
+
+    def _compute(self, arrays: SessionArrays, group_by: str, group_id: Optional[int], bins: int) -> List[Dict[str, Any]]:
+        import numpy as np
+
+        group_values = arrays.groups(group_by)
+        mask = np.ones(group_values.shape[0], dtype=bool)
+        if group_id is not None and group_by != "national":
+            mask = group_values == group_id
+        # Les candidats sans rattachement (code 0) sont exclus des regroupements
+        if group_by != "national":
+            mask &= group_values != 0
+
+        keys, inverse = np.unique(group_values[mask], return_inverse=True)
+        n_groups = keys.shape[0]
+        if n_groups == 0:
+            return []
+
+        scores = arrays.scores[mask]
+        counts = np.bincount(inverse, minlength=n_groups)
+
+        # Moments sur les notes renseignées
+        valid = ~np.isnan(scores)
+        g = inverse[valid]
+        s = scores[valid]
+        n = np.bincount(g, minlength=n_groups)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.bincount(g, weights=s, minlength=n_groups) / n
+            var = np.bincount(g, weights=s * s, minlength=n_groups) / n - mean ** 2
+        std = np.sqrt(np.clip(var, 0, None))
+
+        # Quantiles par interpolation linéaire sur les notes triées par groupe
+        order = np.lexsort((s, g))
+        sorted_scores = s[order]
+        has_scores = n > 0
+        quantiles = {label: np.full(n_groups, np.nan) for label in QUANTILES}
+        minimum = np.full(n_groups, np.nan)
+        maximum = np.full(n_groups, np.nan)
+        if sorted_scores.size:
+            top = sorted_scores.size - 1
+            starts = np.minimum(np.concatenate(([0], np.cumsum(n)[:-1])), top)
+            last = np.minimum(starts + np.maximum(n - 1, 0), top)
+            minimum = np.where(has_scores, sorted_scores[starts], np.nan)
+            maximum = np.where(has_scores, sorted_scores[last], np.nan)
+            for label, q in QUANTILES.items():
+                pos = starts + q * np.maximum(n - 1, 0)
+                lo = np.floor(pos).astype(np.int64)
+                hi = np.minimum(lo + 1, last)
+                values = sorted_scores[lo] + (sorted_scores[hi] - sorted_scores[lo]) * (pos - lo)
+                quantiles[label] = np.where(has_scores, values, np.nan)
+
+        # Histogrammes de tous les groupes en un seul bincount
+        edges = np.linspace(0, arrays.max_score, bins + 1)
+        bin_index = np.clip((s / arrays.max_score * bins).astype(np.int64), 0, bins - 1)
+        histograms = np.bincount(g * bins + bin_index, minlength=n_groups * bins).reshape(n_groups, bins)
+
+        # Répartition des mentions et des décisions
+        n_mentions = len(MENTIONS) + 1
+        mentions = np.bincount(inverse * n_mentions + arrays.mentions[mask], minlength=n_groups * n_mentions) \
+            .reshape(n_groups, n_mentions)
+        n_decisions = arrays.decision_labels.shape[0]
+        decisions = np.bincount(inverse * n_decisions + arrays.decisions[mask], minlength=n_groups * n_decisions) \
+            .reshape(n_groups, n_decisions)
+
+        def value(x):
+            return None if np.isnan(x) else round(float(x), 2)
+
+        results = []
+        for i in range(n_groups):
+            results.append({
+                "group_id": int(keys[i]) if group_by != "national" else None,
+                "total_candidats": int(counts[i]),
+                "total_notes": int(n[i]),
+                "moyenne": value(mean[i]),
+                "ecart_type": value(std[i]),
+                "min": value(minimum[i]),
+                "max": value(maximum[i]),
+                **{label: value(quantiles[label][i]) for label in QUANTILES},
+                "histogramme": {
+                    "bornes": [round(float(e), 2) for e in edges],
+                    "effectifs": histograms[i].tolist()
+                },
+                "mentions": {
+                    **{m: int(mentions[i, j]) for j, m in enumerate(MENTIONS)},
+                    "Sans mention": int(mentions[i, len(MENTIONS)])
+                },
+                "decisions": {str(label): int(decisions[i, j]) for j, label in enumerate(arrays.decision_labels)}
+            })
+        return results
+
+    def _group_names(self, group_by: str, group_ids: List[Optional[int]]) -> Dict[Optional[int], str]:
+        if group_by == "national":
+            return {None: "National"}
+
+        model = {"wilaya": RefWilaya, "serie": RefSerie, "etablissement": RefEtablissement}[group_by]
+        rows = self.db.query(model.id, model.name_fr).filter(model.id.in_(group_ids)).all()
+        return {row.id: row.name_fr for row in rows}
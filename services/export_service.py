@@ -0,0 +1,281 @@
+import csv
+import glob
+import io
+import os
+import uuid
+from typing import Dict, Iterator, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from sqlalchemy import and_, select
+from database import SessionLocal
+from models.database import ExamResult, ExamSession, RefEtablissement, RefWilaya, RefSerie
+from core.archive_reader import archive_reader
+from config import settings
+
+EXPORT_FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "parquet": "application/vnd.apache.parquet"
+}
+
+# (nom de colonne, expression, type Arrow)
+EXPORT_COLUMNS = [
+    ("numero_dossier", ExamResult.numero_dossier, "string"),
+    ("nni", ExamResult.nni, "string"),
+    ("nom_complet_fr", ExamResult.nom_complet_fr, "string"),
+    ("nom_complet_ar", ExamResult.nom_complet_ar, "string"),
+    ("sexe", ExamResult.sexe, "string"),
+    ("date_naissance", ExamResult.date_naissance, "date"),
+    ("lieu_naissance", ExamResult.lieu_naissance, "string"),
+    ("wilaya", RefWilaya.name_fr, "string"),
+    ("etablissement", RefEtablissement.name_fr, "string"),
+    ("serie", RefSerie.code, "string"),
+    ("moyenne_generale", ExamResult.moyenne_generale, "float"),
+    ("total_points", ExamResult.total_points, "float"),
+    ("decision", ExamResult.decision, "string"),
+    ("mention", ExamResult.mention, "string"),
+    ("rang_etablissement", ExamResult.rang_etablissement, "int"),
+    ("rang_wilaya", ExamResult.rang_wilaya, "int"),
+    ("rang_national", ExamResult.rang_national, "int")
+]
+
+class _ChunkSink:
+    """Fichier en écriture seule dont on récupère le contenu au fur et à mesure (sortie Parquet)"""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+class ExportService:
+    """Export en flux des résultats d'une session (CSV ou Parquet), à mémoire constante"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def get_session(self, year: int, exam_type: str) -> Optional[ExamSession]:
+        return self.db.query(ExamSession).filter(
+            and_(ExamSession.year == year, ExamSession.exam_type == exam_type)
+        ).first()
+
+    def cache_path(self, session: ExamSession, fmt: str, filters: Dict[str, Optional[int]]) -> Optional[str]:
+        """Chemin du fichier en cache, uniquement pour une session figée (archivée)"""
+        if not session.is_archived:
+            return None
+
+        suffix = "-".join(f"{key[0]}{value or 0}" for key, value in sorted(filters.items()))
+        return os.path.join(
+            settings.export_cache_path,
+            f"{session.id}-v{session.data_version or 0}-{suffix}.{fmt}"
+        )
+
+    def stream(self, session: ExamSession, fmt: str, filters: Dict[str, Optional[int]],
+               offset: int = 0) -> Iterator[bytes]:
+        """Générateur d'octets ; écrit aussi le fichier en cache lorsque la session est figée"""
+
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Format inconnu: {fmt}. Valeurs possibles: {', '.join(EXPORT_FORMATS)}")
+
+        encoder = self._encode_csv if fmt == "csv" else self._encode_parquet
+        chunks = encoder(self._iter_batches(session.id, filters, offset), header=offset == 0)
+
+        path = self.cache_path(session, fmt, filters) if offset == 0 else None
+        if path is None:
+            return chunks
+        return self._tee_to_cache(chunks, path)
+
+    def _iter_batches(self, session_id: int, filters: Dict[str, Optional[int]], offset: int) -> Iterator[list]:
+        """Lecture par curseur serveur (yield_per), par lots de export_chunk_size lignes"""
+
+        if archive_reader.has_archive(session_id):
+            yield from self._iter_archive_batches(session_id, filters, offset)
+            return
+
+        statement = select(*[column for _, column, _ in EXPORT_COLUMNS]).outerjoin(
+            RefWilaya, RefWilaya.id == ExamResult.wilaya_id
+        ).outerjoin(
+            RefEtablissement, RefEtablissement.id == ExamResult.etablissement_id
+        ).outerjoin(
+            RefSerie, RefSerie.id == ExamResult.serie_id
+        ).where(
+            and_(ExamResult.session_id == session_id, ExamResult.is_published == True)
+        )
+
+        if filters.get("wilaya_id"):
+            statement = statement.where(ExamResult.wilaya_id == filters["wilaya_id"])
+        if filters.get("etablissement_id"):
+            statement = statement.where(ExamResult.etablissement_id == filters["etablissement_id"])
+        if filters.get("serie_id"):
+            statement = statement.where(ExamResult.serie_id == filters["serie_id"])
+
+        # Ordre stable pour que la reprise par offset retombe sur les mêmes lignes
+        statement = statement.order_by(ExamResult.numero_dossier, ExamResult.id)
+        if offset:
+            statement = statement.offset(offset)
+
+        # Session dédiée : la réponse est consommée après la fin de la requête
+        db = SessionLocal()
+        try:
+            result = db.execute(statement.execution_options(yield_per=settings.export_chunk_size))
+            for batch in result.partitions():
+                yield batch
+        finally:
+            db.close()
+
+    def _iter_archive_batches(self, session_id: int, filters: Dict[str, Optional[int]], offset: int) -> Iterator[list]:
+        """Session en archive froide : mêmes colonnes et même ordre, lus depuis le fichier Parquet"""
+        import pyarrow.compute as pc
+        import pyarrow.dataset as ds
+
+        expression = None
+        for name in ("wilaya_id", "etablissement_id", "serie_id"):
+            if filters.get(name):
+                condition = ds.field(name) == filters[name]
+                expression = condition if expression is None else expression & condition
+
+        references = {"wilaya_id", "etablissement_id", "serie_id"}
+        table = archive_reader.read(session_id, ["id"] + sorted(references) + [
+            name for name, _, _ in EXPORT_COLUMNS if name not in ("wilaya", "etablissement", "serie")
+        ], expression)
+        table = table.take(pc.sort_indices(table, sort_keys=[("numero_dossier", "ascending"), ("id", "ascending")]))
+        if offset:
+            table = table.slice(offset)
+
+        # Session dédiée : la réponse est consommée après la fin de la requête
+        db = SessionLocal()
+        try:
+            names = {
+                "wilaya": {w.id: w.name_fr for w in db.query(RefWilaya.id, RefWilaya.name_fr)},
+                "etablissement": {e.id: e.name_fr for e in db.query(RefEtablissement.id, RefEtablissement.name_fr)},
+                "serie": {s.id: s.code for s in db.query(RefSerie.id, RefSerie.code)}
+            }
+        finally:
+            db.close()
+        for batch in table.to_batches(max_chunksize=settings.export_chunk_size):
+            yield [
+                tuple(
+                    names[name].get(row[f"{name}_id"]) if name in names else row[name]
+                    for name, _, _ in EXPORT_COLUMNS
+                )
+                for row in batch.to_pylist()
+            ]
+
+    @staticmethod
+    def _encode_csv(batches: Iterator[list], header: bool) -> Iterator[bytes]:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if header:
+            # BOM pour qu'Excel reconnaisse l'UTF-8 (noms en arabe)
+            buffer.write("\ufeff")
+            writer.writerow([name for name, _, _ in EXPORT_COLUMNS])
+
+        for batch in batches:
+            writer.writerows(batch)
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+
+        if buffer.tell():
+            yield buffer.getvalue().encode("utf-8")
+
+    @staticmethod
+    def _encode_parquet(batches: Iterator[list], header: bool) -> Iterator[bytes]:
+        # Import différé : pyarrow n'est nécessaire que pour cet export
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        types = {"string": pa.string(), "date": pa.date32(), "float": pa.float64(), "int": pa.int32()}
+        schema = pa.schema([(name, types[kind]) for name, _, kind in EXPORT_COLUMNS])
+        kinds = [kind for _, _, kind in EXPORT_COLUMNS]
+
+        sink = _ChunkSink()
+        writer = pq.ParquetWriter(sink, schema, compression="zstd")
+        try:
+            for batch in batches:
+                arrays = []
+                for kind, column in zip(kinds, zip(*batch)):
+                    if kind == "float":
+                        column = [None if v is None else float(v) for v in column]
+                    arrays.append(pa.array(column, type=types[kind]))
+                writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+                yield sink.drain()
+        finally:
+            writer.close()
+        yield sink.drain()
+
+    @staticmethod
+    def _tee_to_cache(chunks: Iterator[bytes], path: str) -> Iterator[bytes]:
+        """Transmet les octets au client tout en les écrivant dans le fichier de cache"""
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        completed = False
+        try:
+            with open(tmp_path, "wb") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    yield chunk
+            os.replace(tmp_path, path)
+            completed = True
+
+            # Les fichiers des générations précédentes de la session ne servent plus
+            session_id, version = os.path.basename(path).split("-")[:2]
+            for old in glob.glob(os.path.join(os.path.dirname(path), f"{session_id}-v*")):
+                if not old.endswith(".tmp") and os.path.basename(old).split("-")[1] != version:
+                    os.remove(old)
+        finally:
+            if not completed and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    @staticmethod
+    def parse_range(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+        """Interprète un en-tête Range 'bytes=debut-fin' (une seule plage) ; lève ValueError si invalide"""
+        if not range_header:
+            return None
+
+        unit, _, spec = range_header.partition("=")
+        if unit.strip() != "bytes" or "," in spec:
+            raise ValueError("Plage non supportée")
+
+        start, _, end = spec.strip().partition("-")
+        if start == "":
+            # Suffixe : les N derniers octets
+            length = int(end)
+            start, end = max(size - length, 0), size - 1
+        else:
+            start = int(start)
+            end = int(end) if end else size - 1
+
+        if start >= size or start > end:
+            raise ValueError("Plage hors du fichier")
+        return start, min(end, size - 1)
+
+    @staticmethod
+    def iter_file(path: str, start: int, end: int, block_size: int = 64 * 1024) -> Iterator[bytes]:
+        with open(path, "rb") as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                data = f.read(min(block_size, remaining))
+                if not data:
+                    break
+                remaining -= len(data)
+                yield data
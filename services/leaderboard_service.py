@@ -0,0 +1,412 @@
+import json
+import time
+from typing import List, Dict, Any, Optional, Tuple
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+from sqlalchemy import func, and_, select, bindparam
+from models.database import ExamResult, ExamSession, RefEtablissement, RefWilaya, RefSerie
+from core.cache import cache_manager
+from core.local_store import local_store
+from core.coalescing import request_coalescer, own_session
+from core.statements import statements
+from services.ranking_service import DECISIONS_ADMIS
+from config import settings
+
+MIN_CANDIDATS_ECOLE = 5  # Au moins 5 candidats pour figurer au classement des écoles
+
+class LeaderboardService:
+    """Classements top-K (élèves et écoles) maintenus dans des sorted sets.
+
+    Les sorted sets vivent dans Redis quand le cache est actif, sinon dans le
+    stand-in local. Les tableaux élèves sont bornés à K entrées ; les tableaux
+    écoles gardent toutes les écoles éligibles (quelques centaines par session)
+    pour rester exacts lors des mises à jour incrémentales. Pendant un upload, chaque
+    lot validé (après son commit) est appliqué aux tableaux ; ils sont reconstruits
+    depuis la base après chaque recalcul de la session et portent sa génération
+    (data_version) : ceux d'une génération précédente sont reconstruits.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+        self._names = None
+
+    async def _store(self):
+        redis = await cache_manager.get_redis()
+        return redis if redis else local_store
+
+    # Clés
+    @staticmethod
+    def _meta_key(session_id: int) -> str:
+        return f"lb:{session_id}:meta"
+
+    @staticmethod
+    def _students_key(session_id: int, wilaya_id: Optional[int] = None, serie_id: Optional[int] = None) -> str:
+        # Un seul filtre par tableau (get_top_students écarte la combinaison des deux)
+        if wilaya_id:
+            return f"lb:{session_id}:students:wilaya:{wilaya_id}"
+        if serie_id:
+            return f"lb:{session_id}:students:serie:{serie_id}"
+        return f"lb:{session_id}:students"
+
+    @staticmethod
+    def _schools_key(session_id: int, wilaya_id: Optional[int] = None) -> str:
+        if wilaya_id:
+            return f"lb:{session_id}:schools:wilaya:{wilaya_id}"
+        return f"lb:{session_id}:schools"
+
+    @staticmethod
+    def _school_score(taux_reussite: float, moyenne: Optional[float]) -> float:
+        """Tri par taux de réussite puis par moyenne, encodé dans un seul score"""
+        return round(taux_reussite * 100) * 10000 + round((moyenne or 0) * 100)
+
+    # Lecture
+    async def get_top_students(self, session_id: int, limit: int,
+                               wilaya_id: Optional[int] = None,
+                               serie_id: Optional[int] = None,
+                               data_version: Optional[int] = None) -> Optional[List[Dict[str, Any]]]:
+        """Top élèves en O(K) ; None si la limite dépasse la taille des tableaux ou si wilaya et série
+        sont combinées (pas de tableau par couple : l'appelant lit la base).
+        data_version : génération déjà lue par l'appelant (sinon lue hors de la boucle)"""
+        if limit > settings.leaderboard_size or (wilaya_id and serie_id):
+            return None
+
+        store = await self._ensure_built(session_id, data_version)
+        key = self._students_key(session_id, wilaya_id, serie_id)
+        members = await store.zrevrange(key, 0, limit - 1)
+        if not members:
+            return []
+
+        payloads = await store.hmget(f"lb:{session_id}:students:data", members)
+        return [json.loads(p) for p in payloads if p]
+
+    async def get_top_schools(self, session_id: int, limit: int,
+                              wilaya_id: Optional[int] = None,
+                              data_version: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Top écoles en O(K)"""
+        store = await self._ensure_built(session_id, data_version)
+        key = self._schools_key(session_id, wilaya_id)
+        members = await store.zrevrange(key, 0, limit - 1)
+        if not members:
+            return []
+
+        records = await store.hmget(f"lb:{session_id}:schools:data", members)
+        return [self._school_payload(json.loads(r)) for r in records if r]
+
+    @staticmethod
+    def _school_payload(record: Dict[str, Any]) -> Dict[str, Any]:
+        candidats = record["candidats"]
+        return {
+            "id": record["id"],
+            "nom": record["nom"],
+            "wilaya": record["wilaya"],
+            "candidats": candidats,
+            "admis": record["admis"],
+            "taux_reussite": round(record["admis"] / candidats * 100, 2) if candidats else 0,
+            "moyenne": round(record["somme_moyennes"] / record["nb_moyennes"], 2) if record["nb_moyennes"] else None
+        }
+
+    # Construction depuis la base
+    def _data_version(self, session_id: int) -> int:
+        query = statements.get("leaderboards.data_version", lambda: select(ExamSession.data_version).where(
+            ExamSession.id == bindparam("session_id")
+        ))
+        return self.db.execute(query, {"session_id": session_id}).scalar() or 0
+
+    async def _is_built(self, store, session_id: int, data_version: Optional[int] = None) -> bool:
+        meta = await store.hgetall(self._meta_key(session_id))
+        if not meta or meta.get("stale"):
+            return False
+        if data_version is None:
+            data_version = await run_in_threadpool(self._data_version, session_id)
+        # Recalcul de la session dans un autre processus (tableaux en mémoire locale) : génération dépassée
+        return meta.get("data_version") == str(data_version)
+
+    async def _ensure_built(self, session_id: int, data_version: Optional[int] = None):
+        store = await self._store()
+        if not await self._is_built(store, session_id, data_version):
+            # Une seule reconstruction par rafale de lectures, sur sa propre session SQLAlchemy :
+            # des reconstructions concurrentes effaceraient les clés l'une de l'autre
+            await request_coalescer.share(
+                f"lb-rebuild {session_id}", "leaderboards",
+                lambda: own_session(self.rebuild_session)(session_id)
+            )
+        return store
+
+    async def invalidate_session(self, session_id: int):
+        """Marque les tableaux comme périmés : reconstruction à la prochaine lecture"""
+        store = await self._store()
+        if await store.exists(self._meta_key(session_id)):
+            await store.hset(self._meta_key(session_id), "stale", "1")
+
+    async def rebuild_session(self, session_id: int):
+        """Reconstruit tous les tableaux d'une session (publication, fin d'upload, expiration)"""
+
+        store = await self._store()
+        meta_key = self._meta_key(session_id)
+        # Lue avant la construction : un recalcul concurrent laisse les tableaux périmés
+        data_version = await run_in_threadpool(self._data_version, session_id)
+        previous_keys = json.loads(await store.hget(meta_key, "keys") or "[]")
+        if previous_keys:
+            await store.delete(*previous_keys)
+
+        keys = set()
+        keys.update(await self._build_students(store, session_id))
+        keys.update(await self._build_schools(store, session_id))
+
+        await store.delete(meta_key)
+        await store.hset(meta_key, mapping={
+            "built_at": str(time.time()), "data_version": str(data_version), "keys": json.dumps(sorted(keys))
+        })
+        for key in list(keys) + [meta_key]:
+            await store.expire(key, settings.leaderboard_ttl)
+
+    async def _build_students(self, store, session_id: int) -> List[str]:
+        k = settings.leaderboard_size
+        base = and_(
+            ExamResult.session_id == session_id,
+            ExamResult.is_published == True,
+            ExamResult.decision.in_(DECISIONS_ADMIS),
+            ExamResult.moyenne_generale.isnot(None)
+        )
+        by_moyenne = ExamResult.moyenne_generale.desc()
+
+        # Une seule requête : rangs national, par wilaya et par série, filtrés sur le top K
+        ranked = select(
+            ExamResult.id,
+            ExamResult.nom_complet_fr,
+            ExamResult.moyenne_generale,
+            ExamResult.decision,
+            ExamResult.wilaya_id,
+            ExamResult.serie_id,
+            RefWilaya.name_fr.label('wilaya_name'),
+            RefSerie.code.label('serie_code'),
+            RefEtablissement.name_fr.label('etablissement_name'),
+            func.row_number().over(order_by=by_moyenne).label('rn_national'),
+            func.row_number().over(partition_by=ExamResult.wilaya_id, order_by=by_moyenne).label('rn_wilaya'),
+            func.row_number().over(partition_by=ExamResult.serie_id, order_by=by_moyenne).label('rn_serie')
+        ).join(
+            RefWilaya, ExamResult.wilaya_id == RefWilaya.id
+        ).join(
+            RefSerie, ExamResult.serie_id == RefSerie.id
+        ).join(
+            RefEtablissement, ExamResult.etablissement_id == RefEtablissement.id
+        ).where(base).subquery()
+
+        # Fenêtres sur toute la session : requête exécutée hors de la boucle d'événements
+        query = select(ranked).where(
+            (ranked.c.rn_national <= k) | (ranked.c.rn_wilaya <= k) | (ranked.c.rn_serie <= k)
+        )
+        rows = await run_in_threadpool(lambda: self.db.execute(query).all())
+
+        boards: Dict[str, Dict[str, float]] = {}
+        payloads: Dict[str, str] = {}
+        for row in rows:
+            member = str(row.id)
+            score = float(row.moyenne_generale)
+            payloads[member] = json.dumps(self._student_payload(
+                member, row.nom_complet_fr, score, row.decision,
+                row.wilaya_name, row.serie_code, row.etablissement_name
+            ))
+            if row.rn_national <= k:
+                boards.setdefault(self._students_key(session_id), {})[member] = score
+            if row.rn_wilaya <= k:
+                boards.setdefault(self._students_key(session_id, wilaya_id=row.wilaya_id), {})[member] = score
+            if row.rn_serie <= k:
+                boards.setdefault(self._students_key(session_id, serie_id=row.serie_id), {})[member] = score
+
+        data_key = f"lb:{session_id}:students:data"
+        await store.delete(data_key, *boards)
+        if payloads:
+            await store.hset(data_key, mapping=payloads)
+        for key, mapping in boards.items():
+            await store.zadd(key, mapping)
+        return list(boards) + [data_key]
+
+    async def _build_schools(self, store, session_id: int) -> List[str]:
+        query = self.db.query(
+            RefEtablissement.id,
+            RefEtablissement.name_fr,
+            RefEtablissement.wilaya_id,
+            RefWilaya.name_fr.label('wilaya_name'),
+            func.count(ExamResult.id).label('total_candidats'),
+            func.count().filter(ExamResult.decision.in_(DECISIONS_ADMIS)).label('total_admis'),
+            func.sum(ExamResult.moyenne_generale).label('somme_moyennes'),
+            func.count(ExamResult.moyenne_generale).label('nb_moyennes')
+        ).join(
+            ExamResult, RefEtablissement.id == ExamResult.etablissement_id
+        ).join(
+            RefWilaya, RefEtablissement.wilaya_id == RefWilaya.id
+        ).filter(
+            and_(ExamResult.session_id == session_id, ExamResult.is_published == True)
+        ).group_by(
+            RefEtablissement.id, RefEtablissement.name_fr, RefEtablissement.wilaya_id, RefWilaya.name_fr
+        )
+        stats = await run_in_threadpool(query.all)
+
+        records = {}
+        for etab in stats:
+            records[str(etab.id)] = {
+                "id": etab.id,
+                "nom": etab.name_fr,
+                "wilaya": etab.wilaya_name,
+                "wilaya_id": etab.wilaya_id,
+                "candidats": etab.total_candidats,
+                "admis": etab.total_admis,
+                "somme_moyennes": float(etab.somme_moyennes or 0),
+                "nb_moyennes": etab.nb_moyennes
+            }
+
+        data_key = f"lb:{session_id}:schools:data"
+        keys = [data_key]
+        await store.delete(data_key, self._schools_key(session_id), *{
+            self._schools_key(session_id, r["wilaya_id"]) for r in records.values()
+        })
+        if records:
+            await store.hset(data_key, mapping={m: json.dumps(r) for m, r in records.items()})
+        for member, record in records.items():
+            keys.extend(await self._place_school(store, session_id, member, record))
+        return keys
+
+    async def _place_school(self, store, session_id: int, member: str, record: Dict[str, Any]) -> List[str]:
+        """Insère, déplace ou retire une école de ses tableaux selon ses compteurs"""
+        keys = [self._schools_key(session_id), self._schools_key(session_id, record["wilaya_id"])]
+        if record["candidats"] < MIN_CANDIDATS_ECOLE:
+            for key in keys:
+                await store.zrem(key, member)
+            return []
+
+        payload = self._school_payload(record)
+        score = self._school_score(payload["taux_reussite"], payload["moyenne"])
+        for key in keys:
+            await store.zadd(key, {member: score})
+        return keys
+
+    @staticmethod
+    def _student_payload(result_id: str, nom: str, moyenne: float, decision: str,
+                         wilaya: str, serie: str, etablissement: str) -> Dict[str, Any]:
+        return {
+            "id": result_id,
+            "nom_complet": nom,
+            "moyenne": moyenne,
+            "decision": decision,
+            "wilaya": wilaya,
+            "serie": serie,
+            "etablissement": etablissement
+        }
+
+    # Mises à jour incrémentales (ingestion, après le commit de chaque lot)
+    def _reference_names(self) -> Dict[str, Dict]:
+        if self._names is None:
+            self._names = {
+                "wilayas": {w.id: w.name_fr for w in self.db.query(RefWilaya.id, RefWilaya.name_fr)},
+                "series": {s.id: s.code for s in self.db.query(RefSerie.id, RefSerie.code)},
+                "etablissements": {
+                    e.id: (e.name_fr, e.wilaya_id)
+                    for e in self.db.query(RefEtablissement.id, RefEtablissement.name_fr, RefEtablissement.wilaya_id)
+                }
+            }
+        return self._names
+
+    @staticmethod
+    def _is_top_candidate(data: Dict[str, Any]) -> bool:
+        return bool(
+            data.get("is_published")
+            and data.get("decision") in DECISIONS_ADMIS
+            and data.get("moyenne_generale") is not None
+            and data.get("wilaya_id") and data.get("serie_id") and data.get("etablissement_id")
+        )
+
+    async def record_results(self, session_id: int, changes: List[Tuple[str, Dict[str, Any], Optional[Dict[str, Any]]]]):
+        """Applique un lot de résultats validés en base : (id, valeurs, valeurs précédentes ou None pour un ajout).
+        À appeler après le commit du lot, jamais avant : un lot annulé ne laisse rien dans les tableaux"""
+        if not changes:
+            return
+        store = await self._store()
+        if not await self._is_built(store, session_id):
+            # Tableaux absents ou périmés : ils seront reconstruits depuis la base à la prochaine lecture
+            return
+
+        names = await run_in_threadpool(self._reference_names)
+        for result_id, data, previous in changes:
+            if not await self._record_result(store, names, session_id, str(result_id), data, previous):
+                return
+
+    async def _record_result(self, store, names: Dict[str, Dict], session_id: int, member: str,
+                             data: Dict[str, Any], previous: Optional[Dict[str, Any]]) -> bool:
+        """Applique un résultat ; False si les tableaux ont dû être invalidés"""
+
+        # Élèves
+        if previous and self._is_top_candidate(previous):
+            new_score = float(data["moyenne_generale"]) if self._is_top_candidate(data) else None
+            if new_score is None or new_score < float(previous["moyenne_generale"]) \
+                    or previous["wilaya_id"] != data.get("wilaya_id") or previous["serie_id"] != data.get("serie_id"):
+                # Un élève qui recule peut céder sa place à un élève hors du top K : on invalide
+                await self.invalidate_session(session_id)
+                return False
+
+        if self._is_top_candidate(data):
+            score = float(data["moyenne_generale"])
+            etablissement_name = names["etablissements"].get(data["etablissement_id"], (None, None))[0]
+            await store.hset(f"lb:{session_id}:students:data", member, json.dumps(self._student_payload(
+                member, data["nom_complet_fr"], score, data["decision"],
+                names["wilayas"].get(data["wilaya_id"]), names["series"].get(data["serie_id"]),
+                etablissement_name
+            )))
+            for key in (self._students_key(session_id),
+                        self._students_key(session_id, wilaya_id=data["wilaya_id"]),
+                        self._students_key(session_id, serie_id=data["serie_id"])):
+                if not await store.exists(key):
+                    await self._register_key(store, session_id, key)
+                await store.zadd(key, {member: score})
+                await store.zremrangebyrank(key, 0, -(settings.leaderboard_size + 1))
+                await store.expire(key, settings.leaderboard_ttl)
+
+        # Écoles : on retire l'ancienne contribution puis on ajoute la nouvelle
+        if previous and previous.get("is_published") and previous.get("etablissement_id"):
+            await self._apply_school_delta(store, names, session_id, previous, -1)
+        if data.get("is_published") and data.get("etablissement_id"):
+            await self._apply_school_delta(store, names, session_id, data, 1)
+        return True
+
+    async def _apply_school_delta(self, store, names: Dict[str, Dict], session_id: int,
+                                  data: Dict[str, Any], sign: int):
+        etablissement_id = data["etablissement_id"]
+        etablissement = names["etablissements"].get(etablissement_id)
+        if not etablissement or not etablissement[1]:
+            return
+
+        data_key = f"lb:{session_id}:schools:data"
+        member = str(etablissement_id)
+        raw = await store.hget(data_key, member)
+        record = json.loads(raw) if raw else {
+            "id": etablissement_id,
+            "nom": etablissement[0],
+            "wilaya": names["wilayas"].get(etablissement[1]),
+            "wilaya_id": etablissement[1],
+            "candidats": 0,
+            "admis": 0,
+            "somme_moyennes": 0.0,
+            "nb_moyennes": 0
+        }
+
+        record["candidats"] += sign
+        if data.get("decision") in DECISIONS_ADMIS:
+            record["admis"] += sign
+        if data.get("moyenne_generale") is not None:
+            record["somme_moyennes"] += sign * float(data["moyenne_generale"])
+            record["nb_moyennes"] += sign
+
+        await store.hset(data_key, member, json.dumps(record))
+        new_keys = [k for k in (self._schools_key(session_id, record["wilaya_id"]),) if not await store.exists(k)]
+        for key in await self._place_school(store, session_id, member, record):
+            if key in new_keys:
+                await self._register_key(store, session_id, key)
+            await store.expire(key, settings.leaderboard_ttl)
+
+    async def _register_key(self, store, session_id: int, key: str):
+        """Référence un tableau créé hors reconstruction pour qu'il soit purgé à la suivante"""
+        meta_key = self._meta_key(session_id)
+        keys = json.loads(await store.hget(meta_key, "keys") or "[]")
+        if key not in keys:
+            keys.append(key)
+            await store.hset(meta_key, "keys", json.dumps(keys))
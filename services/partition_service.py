@@ -0,0 +1,185 @@
+from typing import Any, Dict, List, Optional
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+from models.database import ExamResult, ExamSession
+from core.archive_reader import archive_reader
+from services.search_projection_service import SearchProjectionService
+from config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+PARENT_TABLE = ExamResult.__tablename__
+DEFAULT_PARTITION = f"{PARENT_TABLE}_default"
+
+class PartitionService:
+    """Partitions LIST (session_id) de exam_results (migration 004) : une table par session.
+
+    Une session archivée est détachée : ses lignes restent dans une table autonome, hors des
+    plans, du vacuum et des index de la table chaude, et peuvent être rattachées. Sur une base
+    non partitionnée (create_all), seul l'indicateur is_archived change.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    @staticmethod
+    def partition_name(session_id: int) -> str:
+        return f"{PARENT_TABLE}_s{int(session_id)}"
+
+    def is_partitioned(self) -> bool:
+        return bool(self.db.execute(text(
+            "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+            "WHERE c.relname = :table AND pg_table_is_visible(c.oid)"
+        ), {"table": PARENT_TABLE}).scalar())
+
+    def list_partitions(self) -> List[Dict[str, Any]]:
+        """Partition de chaque session : rattachée ou non, lignes (estimation) et taille sur disque"""
+        sessions = self.db.query(ExamSession).order_by(ExamSession.year.desc(), ExamSession.exam_type).all()
+        names = [self.partition_name(s.id) for s in sessions] + [DEFAULT_PARTITION]
+        tables = {row.name: row for row in self.db.execute(text(
+            "SELECT c.relname AS name, greatest(c.reltuples, 0)::bigint AS rows, "
+            "pg_total_relation_size(c.oid) AS size_bytes, i.inhparent IS NOT NULL AS attached "
+            "FROM pg_class c LEFT JOIN pg_inherits i ON i.inhrelid = c.oid "
+            "WHERE c.relkind = 'r' AND c.relname = ANY(:names)"
+        ), {"names": names})}
+
+        def describe(name: str) -> Dict[str, Any]:
+            table = tables.get(name)
+            return {
+                "partition": name,
+                "exists": table is not None,
+                "attached": bool(table and table.attached),
+                "rows": table.rows if table else 0,
+                "size_bytes": table.size_bytes if table else 0
+            }
+
+        partitions = [
+            dict(describe(self.partition_name(s.id)), session_id=s.id, year=s.year,
+                 exam_type=s.exam_type, is_archived=bool(s.is_archived))
+            for s in sessions
+        ]
+        partitions.append(dict(describe(DEFAULT_PARTITION), session_id=None))
+        return partitions
+
+    def create_partition(self, session_id: int) -> bool:
+        """Crée la partition d'une session (création de session) ; False si déjà présente ou base
+        non partitionnée. Les lignes arrivées avant elle dans la partition par défaut y sont déplacées."""
+        if not self.is_partitioned() or self._exists(self.partition_name(session_id)):
+            return False
+
+        name = self.partition_name(session_id)
+        session_id = int(session_id)
+        try:
+            self._lock_timeout()
+            stranded = self.db.execute(
+                text(f"SELECT count(*) FROM {DEFAULT_PARTITION} WHERE session_id = :id"), {"id": session_id}
+            ).scalar()
+            if stranded:
+                self.db.execute(text(
+                    f"CREATE TABLE {name} (LIKE {PARENT_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+                ))
+                self.db.execute(text(
+                    f"INSERT INTO {name} SELECT * FROM {DEFAULT_PARTITION} WHERE session_id = {session_id}"
+                ))
+                self.db.execute(text(f"DELETE FROM {DEFAULT_PARTITION} WHERE session_id = {session_id}"))
+                self.db.execute(text(
+                    f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {name} FOR VALUES IN ({session_id})"
+                ))
+            else:
+                self.db.execute(text(
+                    f"CREATE TABLE {name} PARTITION OF {PARENT_TABLE} FOR VALUES IN ({session_id})"
+                ))
+            self.db.commit()
+        except OperationalError as e:
+            self._busy(e)
+
+        logger.info(f"Partition {name} créée ({stranded} lignes reprises de {DEFAULT_PARTITION})")
+        return True
+
+    def archive_session(self, session_id: int) -> Optional[Dict[str, Any]]:
+        """Marque la session archivée et détache sa partition de la table chaude"""
+        session = self.db.query(ExamSession).filter(ExamSession.id == session_id).first()
+        if not session:
+            return None
+
+        name = self.partition_name(session.id)
+        detached = False
+        try:
+            if self.is_partitioned() and self._is_attached(name):
+                self._lock_timeout()
+                self.db.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}"))
+                # Équivalent de la contrainte de partition : le rattachement évite un parcours complet
+                self.db.execute(text(
+                    f"ALTER TABLE {name} ADD CONSTRAINT {name}_session CHECK (session_id = {int(session.id)})"
+                ))
+                detached = True
+            session.is_archived = True
+            self.db.commit()
+        except OperationalError as e:
+            self._busy(e)
+
+        # Lignes détachées hors des recherches : la projection suit exam_results
+        SearchProjectionService(self.db).refresh_session(session.id)
+        logger.info(f"Session {session.exam_type} {session.year} archivée (partition détachée: {detached})")
+        return {"session_id": session.id, "partition": name, "is_archived": True,
+                "attached": self._is_attached(name)}
+
+    def unarchive_session(self, session_id: int) -> Optional[Dict[str, Any]]:
+        """Rattache la partition d'une session archivée et la rend de nouveau interrogeable"""
+        session = self.db.query(ExamSession).filter(ExamSession.id == session_id).first()
+        if not session:
+            return None
+
+        if archive_reader.has_archive(session.id):
+            # Lignes hors de la base (services/archive_service.py) : rien à rattacher
+            raise ValueError("Session en archive froide : utilisez la restauration de l'archive")
+
+        name = self.partition_name(session.id)
+        attached = False
+        try:
+            if self.is_partitioned() and self._exists(name) and not self._is_attached(name):
+                self._lock_timeout()
+                self.db.execute(text(
+                    f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {name} FOR VALUES IN ({int(session.id)})"
+                ))
+                self.db.execute(text(f"ALTER TABLE {name} DROP CONSTRAINT IF EXISTS {name}_session"))
+                attached = True
+            session.is_archived = False
+            self.db.commit()
+        except OperationalError as e:
+            self._busy(e)
+
+        SearchProjectionService(self.db).refresh_session(session.id)
+        logger.info(f"Session {session.exam_type} {session.year} désarchivée (partition rattachée: {attached})")
+        return {"session_id": session.id, "partition": name, "is_archived": False,
+                "attached": self._is_attached(name)}
+
+    def detached_table(self, session_id: int) -> Optional[str]:
+        """Table autonome d'une session archivée (partition détachée), None sinon"""
+        name = self.partition_name(session_id)
+        if self.is_partitioned() and self._exists(name) and not self._is_attached(name):
+            return name
+        return None
+
+    def _exists(self, name: str) -> bool:
+        return bool(self.db.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": name}).scalar())
+
+    def _is_attached(self, name: str) -> bool:
+        return bool(self.db.execute(text(
+            "SELECT 1 FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = CAST(:parent AS regclass) AND c.relname = :name"
+        ), {"parent": PARENT_TABLE, "name": name}).scalar())
+
+    def _lock_timeout(self):
+        # Le DDL de partition prend un verrou exclusif sur exam_results : ne pas bloquer les lectures
+        # derrière une requête longue, échouer et laisser l'administrateur réessayer
+        self.db.execute(text(f"SET LOCAL lock_timeout = {int(settings.partition_lock_timeout_ms)}"))
+
+    def _busy(self, error: OperationalError):
+        self.db.rollback()
+        if getattr(error.orig, "pgcode", None) != "55P03":  # lock_not_available
+            raise error
+        logger.warning(f"Opération de partition abandonnée: {error}")
+        raise ValueError("exam_results est occupée (verrou non obtenu), réessayez dans quelques instants")
@@ -0,0 +1,115 @@
+import asyncio
+from datetime import datetime
+from typing import Dict, List, Optional
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+from database import SessionLocal
+from models.database import ExamSession
+from services.ranking_service import RankingService
+from services.leaderboard_service import LeaderboardService
+from services.rollup_service import RollupService
+from services.search_projection_service import SearchProjectionService
+from services.warmup_service import warm_in_background
+from core.response_store import response_store
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Pipeline en cours (ou en attente) par session
+_refresh_tasks: Dict[int, asyncio.Task] = {}
+
+def schedule_refresh(session_id: int) -> asyncio.Task:
+    """Lance le pipeline post-publication en tâche de fond, avec sa propre session SQLAlchemy.
+    Les recalculs d'une même session s'enchaînent au lieu de se chevaucher"""
+    previous = _refresh_tasks.get(session_id)
+
+    async def run():
+        if previous is not None and not previous.done():
+            await asyncio.wait([previous])
+        db = SessionLocal()
+        try:
+            await PublicationService(db).refresh_session(session_id)
+        except Exception as e:
+            logger.error(f"Pipeline de publication en échec pour la session {session_id}: {e}")
+        finally:
+            db.close()
+
+    task = asyncio.create_task(run())
+    _refresh_tasks[session_id] = task
+
+    def forget(done: asyncio.Task):
+        if _refresh_tasks.get(session_id) is done:
+            del _refresh_tasks[session_id]
+
+    task.add_done_callback(forget)
+    return task
+
+class PublicationService:
+    """Traitements déclenchés à la publication d'une session ou à la fin d'un upload"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    async def publish_session(self, session_id: int) -> Optional[ExamSession]:
+        """Publie une session ; le pipeline post-publication est mis en file, sans être attendu"""
+
+        session = self.db.query(ExamSession).filter(ExamSession.id == session_id).first()
+        if not session:
+            return None
+
+        session.is_published = True
+        session.publication_date = datetime.utcnow()
+        self.db.commit()
+
+        schedule_refresh(session_id)
+        return session
+
+    async def refresh_session(self, session_id: int, warm: bool = True):
+        """Recalcule les données dérivées d'une session (classements, agrégats, projection de
+        recherche, leaderboards) puis lance en tâche de fond le préchauffage des pages les plus demandées"""
+        # Longues requêtes synchrones : dans le pool de threads, la boucle continue de servir
+        await run_in_threadpool(self._recompute, session_id)
+        
+        # Leaderboards marqués de la nouvelle génération (les autres processus reconstruisent les leurs)
+        await LeaderboardService(self.db).rebuild_session(session_id)
+        
+        if warm:
+            warm_in_background(session_id)
+        logger.info(f"Pipeline de publication terminé pour la session {session_id}")
+
+    def _recompute(self, session_id: int):
+        RankingService(self.db).compute_session_rankings(session_id)
+        RollupService(self.db).rebuild_session(session_id)
+        SearchProjectionService(self.db).refresh_session(session_id)  # Rangs recopiés : après le classement
+        
+        # Nouvelle génération, une fois les données dérivées à jour : invalide les caches indexés
+        # par data_version (une page calculée pendant le recalcul reste attachée à l'ancienne)
+        self._new_generation([session_id])
+
+    async def invalidate_sessions(self, session_ids: List[int]):
+        """Nouvelle génération pour des sessions dont les données servies ont changé sans recalcul
+        (référence renommée, partition détachée ou rattachée) : recherche, statistiques, instantanés
+        et leaderboards de l'ancienne génération ne sont plus servis"""
+        if not session_ids:
+            return
+        await run_in_threadpool(self._new_generation, session_ids)
+        leaderboards = LeaderboardService(self.db)
+        for session_id in session_ids:
+            await leaderboards.invalidate_session(session_id)
+
+    async def refresh_references(self, wilaya_id: Optional[int] = None, etablissement_id: Optional[int] = None,
+                                 serie_id: Optional[int] = None) -> int:
+        """Recopie une référence modifiée dans la projection puis invalide les sessions qui la citent"""
+        projection = SearchProjectionService(self.db)
+        updated = await run_in_threadpool(projection.refresh_references, wilaya_id, etablissement_id, serie_id)
+        sessions = await run_in_threadpool(projection.sessions_citing, wilaya_id, etablissement_id, serie_id)
+        await self.invalidate_sessions(sessions)
+        return updated
+
+    def _new_generation(self, session_ids: List[int]):
+        self.db.query(ExamSession).filter(ExamSession.id.in_(session_ids)).update(
+            {ExamSession.data_version: ExamSession.data_version + 1}, synchronize_session=False
+        )
+        self.db.commit()
+        for session_id in session_ids:
+            response_store.purge_stale(self.db, session_id)
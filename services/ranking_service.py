@@ -0,0 +1,144 @@
+from typing import Optional
+from sqlalchemy.orm import Session
+from sqlalchemy import func, and_, or_, case, select, update, delete, insert, literal, cast, Numeric
+from models.database import ExamResult, ExamSession, RefEtablissement, EntityRanking
+from config import settings
+
+DECISIONS_ADMIS = ['Admis', 'Passable']
+
+class RankingService:
+    """Calcul ensembliste des classements (candidats, wilayas, établissements)"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def _rank_function(self):
+        """Classement dense (1, 2, 2, 3) ou par compétition (1, 2, 2, 4) selon la configuration"""
+        if settings.ranking_method == "dense":
+            return func.dense_rank
+        return func.rank
+
+    def _score_column(self, session: ExamSession):
+        """Les concours sont classés sur le total des points, les autres examens sur la moyenne"""
+        if session.exam_type == "concours":
+            return ExamResult.total_points
+        return ExamResult.moyenne_generale
+
+    def compute_session_rankings(self, session_id: int) -> bool:
+        """Recalcule et enregistre tous les classements d'une session"""
+
+        session = self.db.query(ExamSession).filter(ExamSession.id == session_id).first()
+        if not session:
+            return False
+
+        self._rank_candidates(session)
+        self._rank_entities(session)
+        self.db.commit()
+        return True
+
+    def _rank_candidates(self, session: ExamSession):
+        """Rangs établissement, wilaya et national des candidats en une seule passe"""
+
+        rank = self._rank_function()
+        score = self._score_column(session)
+
+        ranked = select(
+            ExamResult.id.label("id"),
+            case(
+                (ExamResult.etablissement_id.isnot(None),
+                 rank().over(partition_by=ExamResult.etablissement_id, order_by=score.desc()))
+            ).label("rang_etablissement"),
+            case(
+                (ExamResult.wilaya_id.isnot(None),
+                 rank().over(partition_by=ExamResult.wilaya_id, order_by=score.desc()))
+            ).label("rang_wilaya"),
+            rank().over(order_by=score.desc()).label("rang_national")
+        ).where(
+            and_(
+                ExamResult.session_id == session.id,
+                ExamResult.is_published == True,
+                score.isnot(None)
+            )
+        ).subquery()
+
+        # Écriture en masse, limitée aux lignes dont le rang a changé
+        self.db.execute(
+            update(ExamResult).where(
+                and_(
+                    ExamResult.id == ranked.c.id,
+                    or_(
+                        ExamResult.rang_etablissement.is_distinct_from(ranked.c.rang_etablissement),
+                        ExamResult.rang_wilaya.is_distinct_from(ranked.c.rang_wilaya),
+                        ExamResult.rang_national.is_distinct_from(ranked.c.rang_national)
+                    )
+                )
+            ).values(
+                rang_etablissement=ranked.c.rang_etablissement,
+                rang_wilaya=ranked.c.rang_wilaya,
+                rang_national=ranked.c.rang_national
+            ).execution_options(synchronize_session=False)
+        )
+
+        # Effacer les rangs des candidats non classables (non publiés ou sans note)
+        self.db.execute(
+            update(ExamResult).where(
+                and_(
+                    ExamResult.session_id == session.id,
+                    or_(ExamResult.is_published.isnot(True), score.is_(None)),
+                    or_(
+                        ExamResult.rang_etablissement.isnot(None),
+                        ExamResult.rang_wilaya.isnot(None),
+                        ExamResult.rang_national.isnot(None)
+                    )
+                )
+            ).values(
+                rang_etablissement=None,
+                rang_wilaya=None,
+                rang_national=None
+            ).execution_options(synchronize_session=False)
+        )
+
+    def _rank_entities(self, session: ExamSession):
+        """Classement des wilayas (national) et des établissements (dans leur wilaya) par taux de réussite"""
+
+        rank = self._rank_function()
+        total = func.count(ExamResult.id)
+        admis = func.count().filter(ExamResult.decision.in_(DECISIONS_ADMIS))
+        taux = func.round(cast(admis, Numeric) * 100 / total, 2)
+        moyenne = func.round(func.avg(ExamResult.moyenne_generale), 2)
+        published = and_(ExamResult.session_id == session.id, ExamResult.is_published == True)
+
+        columns = [
+            "session_id", "entity_type", "entity_id", "wilaya_id",
+            "total_candidats", "total_admis", "taux_reussite", "moyenne", "rang"
+        ]
+
+        wilayas = select(
+            literal(session.id), literal("wilaya"), ExamResult.wilaya_id, ExamResult.wilaya_id,
+            total, admis, taux, moyenne,
+            rank().over(order_by=taux.desc())
+        ).where(
+            and_(published, ExamResult.wilaya_id.isnot(None))
+        ).group_by(ExamResult.wilaya_id)
+
+        etablissements = select(
+            literal(session.id), literal("etablissement"), ExamResult.etablissement_id, RefEtablissement.wilaya_id,
+            total, admis, taux, moyenne,
+            rank().over(partition_by=RefEtablissement.wilaya_id, order_by=taux.desc())
+        ).join(
+            RefEtablissement, ExamResult.etablissement_id == RefEtablissement.id
+        ).where(published).group_by(ExamResult.etablissement_id, RefEtablissement.wilaya_id)
+
+        self.db.execute(delete(EntityRanking).where(EntityRanking.session_id == session.id))
+        self.db.execute(insert(EntityRanking).from_select(columns, wilayas))
+        self.db.execute(insert(EntityRanking).from_select(columns, etablissements))
+
+    def get_entity_rank(self, session_id: int, entity_type: str, entity_id: int) -> Optional[int]:
+        """Lit le rang pré-calculé d'une wilaya ou d'un établissement"""
+        return self.db.query(EntityRanking.rang).filter(
+            and_(
+                EntityRanking.session_id == session_id,
+                EntityRanking.entity_type == entity_type,
+                EntityRanking.entity_id == entity_id
+            )
+        ).scalar()
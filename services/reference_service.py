@@ -0,0 +1,62 @@
+from typing import List, Dict, Any, Optional
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.orm import Session
+from models.database import RefWilaya, RefEtablissement, RefSerie
+from models.schemas import WilayaResponse, EtablissementResponse, SerieResponse
+from core.cache import cache_manager
+
+class ReferenceService:
+    """Listes de référence (wilayas, établissements, séries), mises en cache"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    async def get_wilayas(self, refresh: bool = False) -> List[Dict[str, Any]]:
+        return await self._cached("wilayas", {}, self.list_wilayas, refresh)
+
+    async def get_etablissements(self, wilaya_id: Optional[int] = None, type_etablissement: Optional[str] = None,
+                                 refresh: bool = False) -> List[Dict[str, Any]]:
+        params = {"wilaya_id": wilaya_id, "type_etablissement": type_etablissement}
+        return await self._cached(
+            "etablissements", params, lambda: self.list_etablissements(wilaya_id, type_etablissement), refresh
+        )
+
+    async def get_series(self, exam_type: Optional[str] = None, refresh: bool = False) -> List[Dict[str, Any]]:
+        return await self._cached("series", {"exam_type": exam_type}, lambda: self.list_series(exam_type), refresh)
+
+    async def _cached(self, name: str, params: dict, load, refresh: bool) -> List[Dict[str, Any]]:
+        if not refresh:
+            cached = await cache_manager.get_cached_references(name, params)
+            if cached is not None:
+                return cached
+
+        data = load()
+        await cache_manager.cache_references(name, params, data)
+        return data
+
+    # Lecture en base (sans cache)
+    def list_wilayas(self) -> List[Dict[str, Any]]:
+        wilayas = self.db.query(RefWilaya).order_by(RefWilaya.name_fr).all()
+        return jsonable_encoder([WilayaResponse.from_orm(w) for w in wilayas])
+
+    def list_etablissements(self, wilaya_id: Optional[int] = None,
+                            type_etablissement: Optional[str] = None) -> List[Dict[str, Any]]:
+        query = self.db.query(RefEtablissement).filter(RefEtablissement.status == "active")
+
+        if wilaya_id:
+            query = query.filter(RefEtablissement.wilaya_id == wilaya_id)
+
+        if type_etablissement:
+            query = query.filter(RefEtablissement.type_etablissement == type_etablissement)
+
+        etablissements = query.order_by(RefEtablissement.name_fr).all()
+        return jsonable_encoder([EtablissementResponse.from_orm(e) for e in etablissements])
+
+    def list_series(self, exam_type: Optional[str] = None) -> List[Dict[str, Any]]:
+        query = self.db.query(RefSerie)
+
+        if exam_type:
+            query = query.filter(RefSerie.exam_type == exam_type)
+
+        series = query.order_by(RefSerie.name_fr).all()
+        return jsonable_encoder([SerieResponse.from_orm(s) for s in series])
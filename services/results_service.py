@@ -1,89 +1,123 @@
-from typing import List, Optional, Dict, Any
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import and_, or_, func, desc
-from models.database import ExamResult, ExamSession, RefEtablissement, RefWilaya, RefSerie
-from models.schemas import SearchParams, ExamResultResponse, SearchResponse
+from functools import lru_cache
+from typing import List, Optional, Dict, Any, Tuple, Type, Union
+from pydantic import BaseModel, ConfigDict, create_model
+from sqlalchemy.orm import Session
+from sqlalchemy import or_, desc, func, select, update, bindparam, any_, String
+from sqlalchemy.dialects.postgresql import ARRAY
+from models.database import ExamResult, ExamSession, ResultsSearch
+from models.schemas import (
+    SearchParams, ExamResultResponse, ExamResultDetailResponse, SearchResponse,
+    BatchLookupRequest, BatchLookupItem, BatchLookupResponse
+)
+from core.archive_reader import archive_reader
 from core.cache import cache_manager
+from core.statements import statements
+from services.archive_service import ArchiveService
+from config import settings
 import uuid
 
+# Filtres de recherche : condition sur la projection, valeur passée en bindparam du même nom
+SEARCH_FILTERS = {
+    "nni": lambda: ResultsSearch.nni == bindparam("nni"),
+    "numero_dossier": lambda: ResultsSearch.numero_dossier == bindparam("numero_dossier"),
+    "nom": lambda: or_(
+        ResultsSearch.nom_complet_fr.ilike(bindparam("nom")),
+        ResultsSearch.nom_complet_ar.ilike(bindparam("nom"))
+    ),
+    "wilaya_id": lambda: ResultsSearch.wilaya_id == bindparam("wilaya_id"),
+    "etablissement_id": lambda: ResultsSearch.etablissement_id == bindparam("etablissement_id"),
+    "serie_id": lambda: ResultsSearch.serie_id == bindparam("serie_id"),
+    "serie_code": lambda: ResultsSearch.serie_code == bindparam("serie_code"),
+    "decision": lambda: ResultsSearch.decision == bindparam("decision"),
+    "year": lambda: ResultsSearch.year == bindparam("year"),
+    "exam_type": lambda: ResultsSearch.exam_type == bindparam("exam_type")
+}
+
+# Champs sélectionnables par fields= : ceux des réponses (toutes des colonnes de la projection),
+# dans leur ordre de déclaration, qui est aussi celui de l'en-tête du mode compact
+RESULT_FIELDS = tuple(ExamResultResponse.model_fields)
+RESULT_DETAIL_FIELDS = tuple(ExamResultDetailResponse.model_fields)
+
+@lru_cache(maxsize=256)
+def _fields_model(fields: Tuple[str, ...], detail: bool = False) -> Type[BaseModel]:
+    """Schéma réduit aux champs demandés : mêmes types et conversions que la réponse complète"""
+    base = ExamResultDetailResponse if detail else ExamResultResponse
+    return create_model(
+        f"{base.__name__}Fields",
+        __config__=ConfigDict(from_attributes=True),
+        **{name: (base.model_fields[name].annotation, base.model_fields[name]) for name in fields}
+    )
+
 class ResultsService:
     
     def __init__(self, db: Session):
         self.db = db
     
-    async def search_results(self, params: SearchParams) -> SearchResponse:
-        """Recherche des résultats avec cache et optimisations"""
+    async def search_results(self, params: SearchParams) -> Union[SearchResponse, Dict[str, Any]]:
+        """Recherche des résultats avec cache et optimisations.
+        
+        Avec params.fields ou params.compact, le dictionnaire de la réponse (déjà sérialisable) :
+        les résultats n'ont que les champs demandés, ou sont des lignes précédées de l'en-tête.
+        """
         
-        # Vérifier le cache d'abord
-        cache_key = params.dict()
+        # Vérifier le cache d'abord ; la génération des sessions couvertes fait partie de la clé :
+        # un recalcul (publication, upload) rend les pages précédentes caduques
+        cache_key = dict(params.dict(), data_version=self._data_version(params.year, params.exam_type))
         cached_result = await cache_manager.get_cached_search(cache_key)
         if cached_result and isinstance(cached_result, dict):
-            return SearchResponse(**cached_result)
-        
-        # Construire la requête
-        query = self.db.query(ExamResult).options(
-            joinedload(ExamResult.etablissement),
-            joinedload(ExamResult.serie),
-            joinedload(ExamResult.wilaya),
-            joinedload(ExamResult.session)
-        ).filter(ExamResult.is_published == True)
-        
-        # Appliquer les filtres
-        if params.nni:
-            query = query.filter(ExamResult.nni == params.nni)
-        
-        if params.numero_dossier:
-            query = query.filter(ExamResult.numero_dossier == params.numero_dossier)
-        
-        if params.nom:
-            # Recherche floue sur le nom
-            search_term = f"%{params.nom}%"
-            query = query.filter(
-                or_(
-                    ExamResult.nom_complet_fr.ilike(search_term),
-                    ExamResult.nom_complet_ar.ilike(search_term)
-                )
-            )
-        
-        if params.wilaya_id:
-            query = query.filter(ExamResult.wilaya_id == params.wilaya_id)
-        
-        if params.etablissement_id:
-            query = query.filter(ExamResult.etablissement_id == params.etablissement_id)
-        
-        if params.serie_id:
-            query = query.filter(ExamResult.serie_id == params.serie_id)
+            return self._search_response(cached_result, params)
         
-        if params.serie_code:
-            query = query.filter(ExamResult.serie.has(RefSerie.code == params.serie_code))
+        # Projection exam_results_search : résultats publiés, session et références recopiées,
+        # aucune jointure ni sous-requête. Gabarits précompilés par combinaison de filtres
+        values = self._search_values(params)
+        fields = tuple(params.fields) if params.fields else None
+        model = _fields_model(fields) if fields else ExamResultResponse
+        # Réponse non revalidée par SearchResponse (fields, compact) : valeurs déjà au format JSON
+        mode = "json" if fields or params.compact else "python"
         
-        if params.decision:
-            query = query.filter(ExamResult.decision == params.decision)
-        
-        if params.year:
-            query = query.filter(ExamResult.session.has(ExamSession.year == params.year))
-        
-        if params.exam_type:
-            query = query.filter(ExamResult.session.has(ExamSession.exam_type == params.exam_type))
+        # Sessions en archive froide : absentes de la projection, lues depuis leur fichier Parquet.
+        # Sans session, l'archive n'est lue que pour un candidat précis (NNI, dossier)
+        archives = ArchiveService(self.db)
+        if params.year or params.exam_type:
+            cold_sessions = archives.cold_session_ids(params.year, params.exam_type)
+        else:
+            cold_sessions = archives.cold_session_ids() if params.nni or params.numero_dossier else []
         
         # Compter le total
-        total = query.count()
+        total = self._search_count(values)
         
         # Appliquer la pagination avec tri par moyenne décroissante
         offset = (params.page - 1) * params.size
-        results = query.order_by(
-            ExamResult.moyenne_generale.desc().nullslast(),
-            desc(ExamResult.created_at)
-        ).offset(offset).limit(params.size).all()
+        
+        if cold_sessions:
+            # Les offset + size premiers de chaque côté suffisent à composer la page fusionnée
+            hot = [ExamResultResponse.model_validate(r).model_dump()
+                   for r in self._search_rows(values, 0, offset + params.size)]
+            cold_total, cold = archives.search(cold_sessions, params, offset + params.size)
+            total += cold_total
+            page = sorted(hot + cold, key=lambda r: (
+                r["moyenne_generale"] is None, -(r["moyenne_generale"] or 0), -r["created_at"].timestamp()
+            ))[offset:offset + params.size]
+            # Lignes complètes pour la fusion (clés de tri), champs demandés retenus ensuite
+            if mode == "json":
+                page = [model.model_validate(r).model_dump(mode="json") for r in page]
+        else:
+            # Champs demandés seuls dans la liste de colonnes du SELECT
+            page = [model.model_validate(r).model_dump(mode=mode)
+                    for r in self._search_rows(values, offset, params.size, fields)]
         
         # Calculer les métadonnées de pagination
         total_pages = (total + params.size - 1) // params.size
         has_next = params.page < total_pages
         has_prev = params.page > 1
         
+        if params.compact:
+            header = list(fields or RESULT_FIELDS)
+            page = [header, *[[r[name] for name in header] for r in page]]
+        
         # Convertir en schéma de réponse
         result_data = {
-            "results": [ExamResultResponse.model_validate(result).model_dump() for result in results],
+            "results": page,
             "total": total,
             "page": params.page,
             "size": params.size,
@@ -95,25 +129,165 @@ class ResultsService:
         # Mettre en cache
         await cache_manager.cache_search_results(cache_key, result_data)
         
+        return self._search_response(result_data, params)
+    
+    @staticmethod
+    def _search_response(result_data: Dict[str, Any], params: SearchParams) -> Union[SearchResponse, Dict[str, Any]]:
+        if params.fields or params.compact:
+            return result_data
         return SearchResponse(**result_data)
     
-    def get_result_by_id(self, result_id: uuid.UUID) -> Optional[ExamResult]:
-        """Récupère un résultat par son ID"""
-        return self.db.query(ExamResult).options(
-            joinedload(ExamResult.etablissement),
-            joinedload(ExamResult.serie),
-            joinedload(ExamResult.wilaya),
-            joinedload(ExamResult.session)
-        ).filter(
-            and_(
-                ExamResult.id == result_id,
-                ExamResult.is_published == True
+    @staticmethod
+    def parse_fields(fields: Optional[str], detail: bool = False) -> Optional[List[str]]:
+        """Champs demandés (fields=nni,decision,...) dans l'ordre de la réponse complète ; None pour tous"""
+        if not fields:
+            return None
+        allowed = RESULT_DETAIL_FIELDS if detail else RESULT_FIELDS
+        requested = {name.strip() for name in fields.split(",") if name.strip()}
+        unknown = requested.difference(allowed)
+        if unknown:
+            raise ValueError(f"Champs inconnus: {', '.join(sorted(unknown))}. Disponibles: {', '.join(allowed)}")
+        return [name for name in allowed if name in requested] or None
+    
+    @staticmethod
+    def _search_values(params: SearchParams) -> Dict[str, Any]:
+        """Valeurs des filtres présents, dans l'ordre de SEARCH_FILTERS (leurs noms forment la forme du gabarit)"""
+        values = {}
+        for name in SEARCH_FILTERS:
+            value = getattr(params, name)
+            if value:
+                # Recherche floue sur le nom
+                values[name] = f"%{value}%" if name == "nom" else value
+        return values
+    
+    @staticmethod
+    def _search_filters(shape: tuple) -> list:
+        return [SEARCH_FILTERS[name]() for name in shape]
+    
+    def _search_count(self, values: Dict[str, Any]) -> int:
+        shape = tuple(values)
+        query = statements.get("results.search_count", lambda: select(func.count()).select_from(
+            ResultsSearch
+        ).where(*self._search_filters(shape)), *shape)
+        return self.db.execute(query, values).scalar()
+    
+    def _search_rows(self, values: Dict[str, Any], offset: int, limit: int,
+                     fields: Optional[Tuple[str, ...]] = None) -> list:
+        """Page de la projection triée par moyenne décroissante (NULLS LAST), puis par date de création.
+        Avec fields, lignes réduites à ces colonnes au lieu d'objets ResultsSearch complets"""
+        shape = tuple(values)
+        columns = [getattr(ResultsSearch, name) for name in fields] if fields else [ResultsSearch]
+        query = statements.get("results.search_page", lambda: select(*columns).where(
+            *self._search_filters(shape)
+        ).order_by(
+            ResultsSearch.moyenne_generale.desc().nullslast(),
+            desc(ResultsSearch.created_at)
+        ).offset(bindparam("offset")).limit(bindparam("limit")), *shape, fields)
+        result = self.db.execute(query, {**values, "offset": offset, "limit": limit})
+        return result.all() if fields else result.scalars().all()
+    
+    async def batch_lookup(self, request: BatchLookupRequest) -> Optional[BatchLookupResponse]:
+        """Résultats d'une liste de NNI (ou de n° de dossier) d'une session, dans l'ordre demandé.
+        
+        Les candidats déjà lus viennent du cache en un seul MGET, les autres d'une seule requête
+        indexée (= ANY(:values)) ou de l'archive froide ; les absents sont marqués found=False.
+        None si la session n'existe pas.
+        """
+        if len(request.values) > settings.batch_lookup_max_keys:
+            raise ValueError(f"Au plus {settings.batch_lookup_max_keys} identifiants par requête")
+        
+        session = self._get_session(request.year, request.exam_type)
+        if not session:
+            return None
+        
+        # Clés par génération de la session : une republication (data_version) les rend caduques.
+        # Les absents sont aussi mis en cache (valeur null)
+        prefix = f"batch:{session.id}:{session.data_version or 0}:{request.key}"
+        wanted = list(dict.fromkeys(request.values))
+        cached = await cache_manager.get_many([f"{prefix}:{value}" for value in wanted])
+        found = {value: cached[f"{prefix}:{value}"] for value in wanted if f"{prefix}:{value}" in cached}
+        
+        missing = [value for value in wanted if value not in found]
+        if missing:
+            fetched = dict.fromkeys(missing)
+            for row in self._batch_rows(session, request.key, missing):
+                # Plusieurs lignes pour un même identifiant : la première (meilleure moyenne)
+                if fetched[row[request.key]] is None:
+                    fetched[row[request.key]] = row
+            found.update(fetched)
+            await cache_manager.set_many(
+                {f"{prefix}:{value}": row for value, row in fetched.items()}, settings.cache_ttl_results
             )
-        ).first()
+        
+        results = [BatchLookupItem(value=value, found=found[value] is not None, result=found[value])
+                   for value in request.values]
+        return BatchLookupResponse(
+            year=request.year,
+            exam_type=request.exam_type,
+            key=request.key,
+            total=len(results),
+            found=sum(1 for item in results if item.found),
+            results=results
+        )
+    
+    def _data_version(self, year: Optional[int], exam_type: Optional[str]) -> int:
+        """Génération des sessions couvertes par une recherche : data_version de la session si
+        année et type sont donnés, sinon somme des data_version des sessions correspondantes"""
+        values = {name: value for name, value in (("year", year), ("exam_type", exam_type)) if value is not None}
+        shape = tuple(values)
+        query = statements.get("results.data_version", lambda: select(
+            func.coalesce(func.sum(ExamSession.data_version), 0)
+        ).where(*[getattr(ExamSession, name) == bindparam(name) for name in shape]), *shape)
+        return self.db.execute(query, values).scalar()
+    
+    def _get_session(self, year: int, exam_type: str) -> Optional[ExamSession]:
+        query = statements.get("results.session", lambda: select(ExamSession).where(
+            ExamSession.year == bindparam("year"), ExamSession.exam_type == bindparam("exam_type")
+        ))
+        return self.db.execute(query, {"year": year, "exam_type": exam_type}).scalars().first()
+    
+    def _batch_rows(self, session: ExamSession, key: str, values: List[str]) -> List[Dict[str, Any]]:
+        """Résultats publiés de la session dont key (nni ou numero_dossier) est dans values"""
+        if session.is_archived and archive_reader.has_archive(session.id):
+            return ArchiveService(self.db).lookup(session.id, key, values)
+        
+        # Un seul texte SQL quel que soit le nombre de valeurs (tableau lié) : gabarit et requête
+        # préparée réutilisés, parcours de l'index idx_results_search_nni / _numero_dossier
+        query = statements.get("results.batch", lambda: select(ResultsSearch).where(
+            getattr(ResultsSearch, key) == any_(bindparam("values", type_=ARRAY(String))),
+            ResultsSearch.session_id == bindparam("session_id")
+        ).order_by(
+            ResultsSearch.moyenne_generale.desc().nullslast(),
+            desc(ResultsSearch.created_at)
+        ), key)
+        rows = self.db.execute(query, {"values": values, "session_id": session.id}).scalars()
+        return [ExamResultResponse.model_validate(r).model_dump() for r in rows]
+    
+    def get_result_by_id(self, result_id: uuid.UUID) -> Optional[ResultsSearch]:
+        """Récupère un résultat publié par son ID (projection, puis archive froide des sessions archivées)"""
+        query = statements.get("results.by_id", lambda: select(ResultsSearch).where(
+            ResultsSearch.id == bindparam("result_id")
+        ))
+        result = self.db.execute(query, {"result_id": result_id}).scalars().first()
+        return result or ArchiveService(self.db).find_result(result_id)
+    
+    def get_result_fields(self, result_id: uuid.UUID, fields: List[str]) -> Optional[Dict[str, Any]]:
+        """Champs demandés d'un résultat publié (colonnes de la projection, sinon archive froide)"""
+        fields = tuple(fields)
+        query = statements.get("results.by_id_fields", lambda: select(
+            *[getattr(ResultsSearch, name) for name in fields]
+        ).where(ResultsSearch.id == bindparam("result_id")), fields)
+        result = self.db.execute(query, {"result_id": result_id}).first()
+        result = result or ArchiveService(self.db).find_result(result_id)
+        if not result:
+            return None
+        return _fields_model(fields, detail=True).model_validate(result).model_dump(mode="json")
     
     def increment_view_count(self, result_id: uuid.UUID):
         """Incrémente le compteur de vues"""
-        self.db.query(ExamResult).filter(ExamResult.id == result_id).update(
-            {ExamResult.view_count: ExamResult.view_count + 1}
-        )
+        for model in (ExamResult, ResultsSearch):
+            query = statements.get("results.view_count", lambda: update(model).where(
+                model.id == bindparam("result_id")
+            ).values(view_count=model.view_count + 1).execution_options(synchronize_session=False), model.__tablename__)
+            self.db.execute(query, {"result_id": result_id})
         self.db.commit()
\ No newline at end of file
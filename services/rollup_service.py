@@ -0,0 +1,64 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import func, and_, select, delete, insert, literal
+from models.database import ExamResult, ExamSession, ResultsRollup
+
+class RollupService:
+    """Alimentation de la table d'agrégats results_rollup, session par session"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def rebuild_session(self, session_id: int) -> bool:
+        """Remplace les agrégats d'une session par ceux calculés sur ses résultats publiés"""
+
+        session = self.db.query(ExamSession).filter(ExamSession.id == session_id).first()
+        if not session:
+            return False
+
+        dimensions = (
+            ExamResult.wilaya_id,
+            ExamResult.etablissement_id,
+            ExamResult.serie_id,
+            ExamResult.sexe,
+            ExamResult.decision
+        )
+
+        aggregated = select(
+            literal(session.id),
+            literal(session.year),
+            literal(session.exam_type),
+            *dimensions,
+            func.count(ExamResult.id),
+            func.count(ExamResult.moyenne_generale),
+            func.coalesce(func.sum(ExamResult.moyenne_generale), 0)
+        ).where(
+            and_(ExamResult.session_id == session.id, ExamResult.is_published == True)
+        ).group_by(*dimensions)
+
+        self.db.execute(delete(ResultsRollup).where(ResultsRollup.session_id == session.id))
+        self.db.execute(
+            insert(ResultsRollup).from_select(
+                [
+                    "session_id", "year", "exam_type",
+                    "wilaya_id", "etablissement_id", "serie_id", "sexe", "decision",
+                    "total_candidats", "total_notes", "somme_moyennes"
+                ],
+                aggregated
+            )
+        )
+        self.db.commit()
+        return True
+
+    def rebuild_missing(self) -> int:
+        """Construit les agrégats des sessions publiées qui n'en ont pas encore (reprise de l'historique)"""
+
+        missing = self.db.query(ExamSession.id).filter(
+            and_(
+                ExamSession.is_published == True,
+                ~select(ResultsRollup.id).where(ResultsRollup.session_id == ExamSession.id).exists()
+            )
+        ).all()
+
+        for (session_id,) in missing:
+            self.rebuild_session(session_id)
+        return len(missing)
@@ -0,0 +1,156 @@
+from typing import List, Optional
+from sqlalchemy import and_, case, delete, func, insert, literal, or_, select, update
+from sqlalchemy.orm import Session, aliased
+from models.database import ExamResult, ExamSession, RefEtablissement, RefWilaya, RefSerie, ResultsSearch
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Colonnes recopiées telles quelles depuis exam_results
+RESULT_COLUMNS = [
+    "id", "session_id", "etablissement_id", "serie_id", "wilaya_id",
+    "nni", "numero_dossier", "nom_complet_fr", "nom_complet_ar", "nom_pere", "lieu_naissance",
+    "date_naissance", "sexe", "type_candidat", "centre_examen",
+    "moyenne_generale", "total_points", "decision", "mention",
+    "rang_etablissement", "rang_wilaya", "rang_national",
+    "is_published", "view_count", "published_at", "created_at"
+]
+
+def _wilaya_payload(wilaya):
+    return case((wilaya.id.isnot(None), func.jsonb_build_object(
+        "id", wilaya.id, "code", wilaya.code, "name_fr", wilaya.name_fr, "name_ar", wilaya.name_ar,
+        "name_en", wilaya.name_en, "created_at", wilaya.created_at
+    )), else_=None)
+
+def _etablissement_payload(etablissement, wilaya):
+    return case((etablissement.id.isnot(None), func.jsonb_build_object(
+        "id", etablissement.id, "code", etablissement.code, "name_fr", etablissement.name_fr,
+        "name_ar", etablissement.name_ar, "type_etablissement", etablissement.type_etablissement,
+        "wilaya_id", etablissement.wilaya_id, "phone", etablissement.phone, "email", etablissement.email,
+        "status", etablissement.status, "wilaya", _wilaya_payload(wilaya)
+    )), else_=None)
+
+def _serie_payload(serie):
+    return case((serie.id.isnot(None), func.jsonb_build_object(
+        "id", serie.id, "code", serie.code, "name_fr", serie.name_fr, "name_ar", serie.name_ar,
+        "exam_type", serie.exam_type
+    )), else_=None)
+
+class SearchProjectionService:
+    """Alimentation de exam_results_search, projection dénormalisée des résultats publiés.
+
+    Une session est remplacée en bloc (fin d'upload, publication, archivage) ; la modification
+    d'une référence ne réécrit que ses propres colonnes dans les lignes qui la citent.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def refresh_session(self, session_id: int) -> int:
+        """Remplace les lignes d'une session par ses résultats publiés présents dans exam_results"""
+
+        session = self.db.query(ExamSession).filter(ExamSession.id == session_id).first()
+        if not session:
+            return 0
+
+        etablissement_wilaya = aliased(RefWilaya)
+        rows = select(
+            *[getattr(ExamResult, name) for name in RESULT_COLUMNS],
+            literal(session.year),
+            literal(session.exam_type),
+            RefSerie.code,
+            _etablissement_payload(RefEtablissement, etablissement_wilaya),
+            _serie_payload(RefSerie),
+            _wilaya_payload(RefWilaya)
+        ).outerjoin(
+            RefEtablissement, RefEtablissement.id == ExamResult.etablissement_id
+        ).outerjoin(
+            etablissement_wilaya, etablissement_wilaya.id == RefEtablissement.wilaya_id
+        ).outerjoin(
+            RefSerie, RefSerie.id == ExamResult.serie_id
+        ).outerjoin(
+            RefWilaya, RefWilaya.id == ExamResult.wilaya_id
+        ).where(
+            and_(ExamResult.session_id == session.id, ExamResult.is_published == True)
+        )
+
+        self.db.execute(delete(ResultsSearch).where(ResultsSearch.session_id == session.id))
+        inserted = self.db.execute(insert(ResultsSearch).from_select(
+            RESULT_COLUMNS + ["year", "exam_type", "serie_code", "etablissement", "serie", "wilaya"], rows
+        )).rowcount
+        self.db.commit()
+
+        logger.info(f"Projection de recherche de la session {session.id}: {inserted} lignes")
+        return inserted
+
+    def rebuild_all(self) -> int:
+        """Reconstruit la projection de toutes les sessions (mise en service, modification directe en base)"""
+        sessions = [s.id for s in self.db.query(ExamSession.id).order_by(ExamSession.id)]
+        for session_id in sessions:
+            self.refresh_session(session_id)
+        return len(sessions)
+
+    def refresh_references(self, wilaya_id: Optional[int] = None, etablissement_id: Optional[int] = None,
+                           serie_id: Optional[int] = None) -> int:
+        """Recopie une référence modifiée dans les lignes qui la citent ; retourne les lignes modifiées"""
+
+        updated = 0
+        if wilaya_id:
+            updated += self.db.execute(
+                update(ResultsSearch).where(ResultsSearch.wilaya_id == wilaya_id).values(
+                    wilaya=select(_wilaya_payload(RefWilaya)).where(RefWilaya.id == wilaya_id).scalar_subquery()
+                )
+            ).rowcount
+            # La wilaya figure aussi dans le détail des établissements qui y sont rattachés
+            updated += self._refresh_etablissements(RefEtablissement.wilaya_id == wilaya_id)
+
+        if etablissement_id:
+            updated += self._refresh_etablissements(RefEtablissement.id == etablissement_id)
+
+        if serie_id:
+            updated += self.db.execute(
+                update(ResultsSearch).where(ResultsSearch.serie_id == serie_id).values(
+                    serie=select(_serie_payload(RefSerie)).where(RefSerie.id == serie_id).scalar_subquery(),
+                    serie_code=select(RefSerie.code).where(RefSerie.id == serie_id).scalar_subquery()
+                )
+            ).rowcount
+
+        self.db.commit()
+        return updated
+
+    def sessions_citing(self, wilaya_id: Optional[int] = None, etablissement_id: Optional[int] = None,
+                        serie_id: Optional[int] = None) -> List[int]:
+        """Sessions dont la projection cite une référence (mêmes lignes que refresh_references)"""
+        conditions = []
+        if wilaya_id:
+            conditions.append(ResultsSearch.wilaya_id == wilaya_id)
+            conditions.append(ResultsSearch.etablissement_id.in_(
+                select(RefEtablissement.id).where(RefEtablissement.wilaya_id == wilaya_id)
+            ))
+        if etablissement_id:
+            conditions.append(ResultsSearch.etablissement_id == etablissement_id)
+        if serie_id:
+            conditions.append(ResultsSearch.serie_id == serie_id)
+        if not conditions:
+            return []
+
+        rows = self.db.execute(
+            select(ResultsSearch.session_id).where(or_(*conditions)).distinct()
+        ).all()
+        return [session_id for (session_id,) in rows]
+
+    def _refresh_etablissements(self, condition) -> int:
+        etablissement_wilaya = aliased(RefWilaya)
+        payload = select(
+            _etablissement_payload(RefEtablissement, etablissement_wilaya)
+        ).outerjoin(
+            etablissement_wilaya, etablissement_wilaya.id == RefEtablissement.wilaya_id
+        ).where(
+            RefEtablissement.id == ResultsSearch.etablissement_id
+        ).scalar_subquery()
+
+        return self.db.execute(
+            update(ResultsSearch).where(
+                ResultsSearch.etablissement_id.in_(select(RefEtablissement.id).where(condition))
+            ).values(etablissement=payload)
+        ).rowcount
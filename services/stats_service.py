@@ -1,46 +1,67 @@
 from typing import List, Dict, Any, Optional
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc, and_
+from sqlalchemy import func, and_, select, bindparam
 from models.database import (
     ExamResult, ExamSession, RefEtablissement, RefWilaya, RefSerie
 )
 from models.schemas import StatsEtablissement, StatsWilaya
 from core.cache import cache_manager
+from core.archive_reader import archive_reader
+from core.statements import statements
+from services.ranking_service import RankingService
+from services.leaderboard_service import LeaderboardService
+from services.archive_service import ArchiveService
+
+# Condition commune des gabarits : résultats publiés de la session passée en bindparam
+def _published_in_session():
+    return and_(ExamResult.session_id == bindparam("session_id"), ExamResult.is_published == True)
 
 class StatsService:
     
     def __init__(self, db: Session):
         self.db = db
     
-    async def get_wilaya_stats(self, wilaya_id: int, year: int, exam_type: str) -> Optional[StatsWilaya]:
-        """Récupère les statistiques d'une wilaya avec cache"""
+    async def get_wilaya_stats(self, wilaya_id: int, year: int, exam_type: str,
+                               refresh: bool = False) -> Optional[StatsWilaya]:
+        """Récupère les statistiques d'une wilaya avec cache (refresh : recalcul forcé)"""
+        
+        data_version = self._data_version(year, exam_type)
+        if data_version is None:
+            return None
         
         # Vérifier le cache
-        cached_stats = await cache_manager.get_cached_stats("wilaya", wilaya_id, year)
-        if cached_stats and cached_stats.get("exam_type") == exam_type:
-            return StatsWilaya(**cached_stats)
+        if not refresh:
+            cached_stats = await cache_manager.get_cached_stats("wilaya", wilaya_id, year, exam_type, data_version)
+            if cached_stats:
+                return StatsWilaya(**cached_stats)
+        
+        stats_data = self.compute_wilaya_stats(wilaya_id, year, exam_type)
+        if not stats_data:
+            return None
+        
+        # Mettre en cache
+        await cache_manager.cache_stats("wilaya", wilaya_id, year, exam_type, data_version, stats_data)
+        
+        return StatsWilaya(**stats_data)
+    
+    def compute_wilaya_stats(self, wilaya_id: int, year: int, exam_type: str) -> Optional[Dict[str, Any]]:
+        """Calcule les statistiques d'une wilaya depuis la base (sans cache)"""
         
         # Récupérer la session
-        session = self.db.query(ExamSession).filter(
-            and_(ExamSession.year == year, ExamSession.exam_type == exam_type)
-        ).first()
+        session = self._get_session(year, exam_type)
         
         if not session:
             return None
         
         # Récupérer la wilaya
-        wilaya = self.db.query(RefWilaya).filter(RefWilaya.id == wilaya_id).first()
+        wilaya = self.db.execute(statements.get("stats.wilaya", lambda: select(RefWilaya).where(
+            RefWilaya.id == bindparam("wilaya_id")
+        )), {"wilaya_id": wilaya_id}).scalars().first()
         if not wilaya:
             return None
         
         # Calculer les statistiques
-        results = self.db.query(ExamResult).filter(
-            and_(
-                ExamResult.session_id == session.id,
-                ExamResult.wilaya_id == wilaya_id,
-                ExamResult.is_published == True
-            )
-        ).all()
+        results = self._session_results(session, wilaya_id=wilaya_id)
         
         if not results:
             return None
@@ -56,7 +77,9 @@ class StatsService:
         
         # Statistiques par série
         stats_par_serie = {}
-        series = self.db.query(RefSerie).filter(RefSerie.exam_type == exam_type).all()
+        series = self.db.execute(statements.get("stats.series", lambda: select(RefSerie).where(
+            RefSerie.exam_type == bindparam("exam_type")
+        )), {"exam_type": exam_type}).scalars().all()
         
         for serie in series:
             serie_results = [r for r in results if r.serie_id == serie.id]
@@ -70,23 +93,8 @@ class StatsService:
                     "taux_reussite": round((len(serie_admis) / len(serie_results) * 100), 2)
                 }
         
-        # Calculer le rang national (simplifié)
-        all_wilayas_stats = self.db.query(
-            ExamResult.wilaya_id,
-            func.count(ExamResult.id).label('total'),
-            func.count().filter(ExamResult.decision.in_(['Admis', 'Passable'])).label('admis')
-        ).filter(
-            and_(ExamResult.session_id == session.id, ExamResult.is_published == True)
-        ).group_by(ExamResult.wilaya_id).all()
-        
-        wilaya_rates = []
-        for w_stat in all_wilayas_stats:
-            if w_stat.total > 0:
-                rate = (w_stat.admis / w_stat.total) * 100
-                wilaya_rates.append((w_stat.wilaya_id, rate))
-        
-        wilaya_rates.sort(key=lambda x: x[1], reverse=True)
-        rang_national = next((i+1 for i, (w_id, _) in enumerate(wilaya_rates) if w_id == wilaya_id), None)
+        # Rang national pré-calculé à la publication
+        rang_national = RankingService(self.db).get_entity_rank(session.id, "wilaya", wilaya_id)
         
         stats_data = {
             "wilaya_id": wilaya_id,
@@ -100,40 +108,51 @@ class StatsService:
             "exam_type": exam_type
         }
         
-        # Mettre en cache
-        await cache_manager.cache_stats("wilaya", wilaya_id, year, stats_data)
-        
-        return StatsWilaya(**stats_data)
+        return stats_data
     
-    async def get_etablissement_stats(self, etablissement_id: int, year: int, exam_type: str) -> Optional[StatsEtablissement]:
-        """Récupère les statistiques d'un établissement"""
+    async def get_etablissement_stats(self, etablissement_id: int, year: int, exam_type: str,
+                                      refresh: bool = False) -> Optional[StatsEtablissement]:
+        """Récupère les statistiques d'un établissement avec cache (refresh : recalcul forcé)"""
+        
+        data_version = self._data_version(year, exam_type)
+        if data_version is None:
+            return None
         
         # Vérifier le cache
-        cached_stats = await cache_manager.get_cached_stats("etablissement", etablissement_id, year)
-        if cached_stats and cached_stats.get("exam_type") == exam_type:
-            return StatsEtablissement(**cached_stats)
+        if not refresh:
+            cached_stats = await cache_manager.get_cached_stats(
+                "etablissement", etablissement_id, year, exam_type, data_version
+            )
+            if cached_stats:
+                return StatsEtablissement(**cached_stats)
+        
+        stats_data = self.compute_etablissement_stats(etablissement_id, year, exam_type)
+        if not stats_data:
+            return None
+        
+        # Mettre en cache
+        await cache_manager.cache_stats("etablissement", etablissement_id, year, exam_type, data_version, stats_data)
+        
+        return StatsEtablissement(**stats_data)
+    
+    def compute_etablissement_stats(self, etablissement_id: int, year: int, exam_type: str) -> Optional[Dict[str, Any]]:
+        """Calcule les statistiques d'un établissement depuis la base (sans cache)"""
         
         # Récupérer la session
-        session = self.db.query(ExamSession).filter(
-            and_(ExamSession.year == year, ExamSession.exam_type == exam_type)
-        ).first()
+        session = self._get_session(year, exam_type)
         
         if not session:
             return None
         
         # Récupérer l'établissement
-        etablissement = self.db.query(RefEtablissement).filter(RefEtablissement.id == etablissement_id).first()
+        etablissement = self.db.execute(statements.get("stats.etablissement", lambda: select(RefEtablissement).where(
+            RefEtablissement.id == bindparam("etablissement_id")
+        )), {"etablissement_id": etablissement_id}).scalars().first()
         if not etablissement:
             return None
         
         # Calculer les statistiques
-        results = self.db.query(ExamResult).filter(
-            and_(
-                ExamResult.session_id == session.id,
-                ExamResult.etablissement_id == etablissement_id,
-                ExamResult.is_published == True
-            )
-        ).all()
+        results = self._session_results(session, etablissement_id=etablissement_id)
         
         if not results:
             return None
@@ -147,27 +166,8 @@ class StatsService:
         moyennes = [r.moyenne_generale for r in results if r.moyenne_generale is not None]
         moyenne_etablissement = round(sum(moyennes) / len(moyennes), 2) if moyennes else None
         
-        # Rang dans la wilaya
-        wilaya_etablissements = self.db.query(
-            ExamResult.etablissement_id,
-            func.count(ExamResult.id).label('total'),
-            func.count().filter(ExamResult.decision.in_(['Admis', 'Passable'])).label('admis')
-        ).filter(
-            and_(
-                ExamResult.session_id == session.id,
-                ExamResult.wilaya_id == etablissement.wilaya_id,
-                ExamResult.is_published == True
-            )
-        ).group_by(ExamResult.etablissement_id).all()
-        
-        etab_rates = []
-        for e_stat in wilaya_etablissements:
-            if e_stat.total > 0:
-                rate = (e_stat.admis / e_stat.total) * 100
-                etab_rates.append((e_stat.etablissement_id, rate))
-        
-        etab_rates.sort(key=lambda x: x[1], reverse=True)
-        rang_wilaya = next((i+1 for i, (e_id, _) in enumerate(etab_rates) if e_id == etablissement_id), None)
+        # Rang dans la wilaya pré-calculé à la publication
+        rang_wilaya = RankingService(self.db).get_entity_rank(session.id, "etablissement", etablissement_id)
         
         stats_data = {
             "etablissement_id": etablissement_id,
@@ -180,48 +180,72 @@ class StatsService:
             "exam_type": exam_type
         }
         
-        # Mettre en cache
-        await cache_manager.cache_stats("etablissement", etablissement_id, year, stats_data)
+        return stats_data
+    
+    async def get_global_stats(self, year: int, exam_type: str, refresh: bool = False) -> Dict[str, Any]:
+        """Récupère les statistiques globales avec cache (refresh : recalcul forcé)"""
         
-        return StatsEtablissement(**stats_data)
+        data_version = self._data_version(year, exam_type)
+        if data_version is None:
+            return {}
+        
+        if not refresh:
+            cached_stats = await cache_manager.get_cached_stats("global", 0, year, exam_type, data_version)
+            if cached_stats:
+                return cached_stats
+        
+        stats = self.compute_global_stats(year, exam_type)
+        if stats:
+            await cache_manager.cache_stats("global", 0, year, exam_type, data_version, stats)
+        return stats
     
-    def get_global_stats(self, year: int, exam_type: str) -> Dict[str, Any]:
-        """Récupère les statistiques globales"""
+    def compute_global_stats(self, year: int, exam_type: str) -> Dict[str, Any]:
+        """Calcule les statistiques globales depuis la base (sans cache)"""
         
-        session = self.db.query(ExamSession).filter(
-            and_(ExamSession.year == year, ExamSession.exam_type == exam_type)
-        ).first()
+        session = self._get_session(year, exam_type)
         
         if not session:
             return {}
         
-        # Statistiques par wilaya
-        wilaya_stats = self.db.query(
-            RefWilaya.id,
-            RefWilaya.name_fr,
-            RefWilaya.name_ar,
-            func.count(ExamResult.id).label('total_candidats'),
-            func.count().filter(ExamResult.decision.in_(['Admis', 'Passable'])).label('total_admis'),
-            func.avg(ExamResult.moyenne_generale).label('moyenne')
-        ).join(
-            ExamResult, RefWilaya.id == ExamResult.wilaya_id
-        ).filter(
-            and_(ExamResult.session_id == session.id, ExamResult.is_published == True)
-        ).group_by(RefWilaya.id, RefWilaya.name_fr, RefWilaya.name_ar).all()
-        
-        # Statistiques par série
-        serie_stats = self.db.query(
-            RefSerie.id,
-            RefSerie.code,
-            RefSerie.name_fr,
-            RefSerie.name_ar,
-            func.count(ExamResult.id).label('total_candidats'),
-            func.count().filter(ExamResult.decision.in_(['Admis', 'Passable'])).label('total_admis')
-        ).join(
-            ExamResult, RefSerie.id == ExamResult.serie_id
-        ).filter(
-            and_(ExamResult.session_id == session.id, ExamResult.is_published == True)
-        ).group_by(RefSerie.id, RefSerie.code, RefSerie.name_fr, RefSerie.name_ar).all()
+        if self._is_cold(session):
+            wilaya_stats, serie_stats, total_etablissements = ArchiveService(self.db).global_aggregates(session.id)
+        else:
+            published = {"session_id": session.id}
+            
+            # Statistiques par wilaya
+            wilaya_stats = self.db.execute(statements.get("stats.global_wilayas", lambda: select(
+                RefWilaya.id,
+                RefWilaya.name_fr,
+                RefWilaya.name_ar,
+                func.count(ExamResult.id).label('total_candidats'),
+                func.count().filter(ExamResult.decision.in_(['Admis', 'Passable'])).label('total_admis'),
+                func.avg(ExamResult.moyenne_generale).label('moyenne')
+            ).join(
+                ExamResult, RefWilaya.id == ExamResult.wilaya_id
+            ).where(
+                _published_in_session()
+            ).group_by(RefWilaya.id, RefWilaya.name_fr, RefWilaya.name_ar)), published).all()
+            
+            # Statistiques par série
+            serie_stats = self.db.execute(statements.get("stats.global_series", lambda: select(
+                RefSerie.id,
+                RefSerie.code,
+                RefSerie.name_fr,
+                RefSerie.name_ar,
+                func.count(ExamResult.id).label('total_candidats'),
+                func.count().filter(ExamResult.decision.in_(['Admis', 'Passable'])).label('total_admis')
+            ).join(
+                ExamResult, RefSerie.id == ExamResult.serie_id
+            ).where(
+                _published_in_session()
+            ).group_by(RefSerie.id, RefSerie.code, RefSerie.name_fr, RefSerie.name_ar)), published).all()
+            
+            # Calculer le nombre d'établissements ayant des candidats
+            total_etablissements = self.db.execute(statements.get("stats.global_etablissements", lambda: select(
+                func.count(func.distinct(ExamResult.etablissement_id))
+            ).where(
+                _published_in_session()
+            )), published).scalar()
         
         # Trier les wilayas par taux de réussite décroissant
         wilayas_sorted = []
@@ -259,13 +283,6 @@ class StatsService:
         # Trier par taux de réussite décroissant
         series_sorted.sort(key=lambda x: x["taux_reussite"], reverse=True)
 
-        # Calculer le nombre d'établissements ayant des candidats
-        total_etablissements = self.db.query(
-            func.count(func.distinct(ExamResult.etablissement_id))
-        ).filter(
-            and_(ExamResult.session_id == session.id, ExamResult.is_published == True)
-        ).scalar()
-
         return {
             "year": year,
             "exam_type": exam_type,
@@ -277,18 +294,30 @@ class StatsService:
             "series": series_sorted
         }
     
-    def get_top_students(self, year: int, exam_type: str, limit: int = 10) -> List[Dict[str, Any]]:
-        """Récupère le top des élèves pour une année donnée"""
+    async def get_top_students(self, year: int, exam_type: str, limit: int = 10,
+                               wilaya_id: Optional[int] = None, serie_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Récupère le top des élèves pour une année donnée (national, par wilaya ou par série)"""
         
-        session = self.db.query(ExamSession).filter(
-            and_(ExamSession.year == year, ExamSession.exam_type == exam_type)
-        ).first()
+        session = self._get_session(year, exam_type)
         
         if not session:
             return []
         
-        # Récupérer les meilleurs élèves
-        top_students = self.db.query(
+        if self._is_cold(session):
+            return ArchiveService(self.db).top_students(session.id, limit, wilaya_id, serie_id)
+        
+        # Servi depuis les leaderboards tant que la limite reste dans le top K
+        top_students = await LeaderboardService(self.db).get_top_students(
+            session.id, limit, wilaya_id, serie_id, data_version=session.data_version or 0
+        )
+        if top_students is not None:
+            return top_students
+        
+        # Récupérer les meilleurs élèves ; NULLS LAST (sans effet, moyennes non nulles) :
+        # même ordre que les index de classement
+        values = {"session_id": session.id, "limit": limit}
+        filters = {name: value for name, value in (("wilaya_id", wilaya_id), ("serie_id", serie_id)) if value}
+        query = statements.get("stats.top_students", lambda: select(
             ExamResult.id,
             ExamResult.nom_complet_fr,
             ExamResult.moyenne_generale,
@@ -302,14 +331,14 @@ class StatsService:
             RefSerie, ExamResult.serie_id == RefSerie.id
         ).join(
             RefEtablissement, ExamResult.etablissement_id == RefEtablissement.id
-        ).filter(
-            and_(
-                ExamResult.session_id == session.id,
-                ExamResult.is_published == True,
-                ExamResult.decision.in_(['Admis', 'Passable']),
-                ExamResult.moyenne_generale.isnot(None)
-            )
-        ).order_by(desc(ExamResult.moyenne_generale)).limit(limit).all()
+        ).where(
+            _published_in_session(),
+            ExamResult.decision.in_(['Admis', 'Passable']),
+            ExamResult.moyenne_generale.isnot(None),
+            *[getattr(ExamResult, name) == bindparam(name) for name in filters]
+        ).order_by(ExamResult.moyenne_generale.desc().nullslast()).limit(bindparam("limit")), *filters)
+        
+        top_students = self.db.execute(query, {**values, **filters}).all()
         
         return [
             {
@@ -324,59 +353,47 @@ class StatsService:
             for student in top_students
         ]
     
-    def get_top_schools(self, year: int, exam_type: str, limit: int = 10) -> List[Dict[str, Any]]:
-        """Récupère le top des écoles pour une année donnée"""
+    async def get_top_schools(self, year: int, exam_type: str, limit: int = 10,
+                              wilaya_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Récupère le top des écoles pour une année donnée (national ou par wilaya)"""
         
-        session = self.db.query(ExamSession).filter(
-            and_(ExamSession.year == year, ExamSession.exam_type == exam_type)
-        ).first()
+        session = self._get_session(year, exam_type)
         
         if not session:
             return []
         
-        # Calculer les statistiques par établissement
-        etablissement_stats = self.db.query(
-            RefEtablissement.id,
-            RefEtablissement.name_fr,
-            RefEtablissement.name_ar,
-            RefWilaya.name_fr.label('wilaya_name'),
-            func.count(ExamResult.id).label('total_candidats'),
-            func.count().filter(ExamResult.decision.in_(['Admis', 'Passable'])).label('total_admis'),
-            func.avg(ExamResult.moyenne_generale).label('moyenne_etablissement')
-        ).join(
-            ExamResult, RefEtablissement.id == ExamResult.etablissement_id
-        ).join(
-            RefWilaya, RefEtablissement.wilaya_id == RefWilaya.id
-        ).filter(
-            and_(
-                ExamResult.session_id == session.id,
-                ExamResult.is_published == True
-            )
-        ).group_by(
-            RefEtablissement.id,
-            RefEtablissement.name_fr,
-            RefEtablissement.name_ar,
-            RefWilaya.name_fr
-        ).having(
-            func.count(ExamResult.id) >= 5  # Au moins 5 candidats pour être considéré
-        ).all()
-        
-        # Calculer le taux de réussite et trier
-        schools_with_rates = []
-        for etab in etablissement_stats:
-            if etab.total_candidats > 0:
-                taux_reussite = round((etab.total_admis / etab.total_candidats * 100), 2)
-                schools_with_rates.append({
-                    "id": etab.id,
-                    "nom": etab.name_fr,
-                    "wilaya": etab.wilaya_name,
-                    "candidats": etab.total_candidats,
-                    "admis": etab.total_admis,
-                    "taux_reussite": taux_reussite,
-                    "moyenne": round(float(etab.moyenne_etablissement), 2) if etab.moyenne_etablissement else None
-                })
-        
-        # Trier par taux de réussite puis par moyenne
-        schools_with_rates.sort(key=lambda x: (x["taux_reussite"], x["moyenne"] or 0), reverse=True)
+        if self._is_cold(session):
+            return ArchiveService(self.db).top_schools(session.id, limit, wilaya_id)
         
-        return schools_with_rates[:limit]
\ No newline at end of file
+        # Trié par taux de réussite puis par moyenne (au moins 5 candidats par école)
+        return await LeaderboardService(self.db).get_top_schools(
+            session.id, limit, wilaya_id, data_version=session.data_version or 0
+        )
+    
+    def _get_session(self, year: int, exam_type: str) -> Optional[ExamSession]:
+        """Session d'une année et d'un type d'examen (lue par chaque page de statistiques)"""
+        query = statements.get("stats.session", lambda: select(ExamSession).where(
+            ExamSession.year == bindparam("year"), ExamSession.exam_type == bindparam("exam_type")
+        ))
+        return self.db.execute(query, {"year": year, "exam_type": exam_type}).scalars().first()
+    
+    def _data_version(self, year: int, exam_type: str) -> Optional[int]:
+        """Génération de la session (clé des caches de statistiques) ; None si la session n'existe pas"""
+        session = self._get_session(year, exam_type)
+        return (session.data_version or 0) if session else None
+    
+    @staticmethod
+    def _is_cold(session: ExamSession) -> bool:
+        """Résultats de la session hors de la base, dans son archive froide"""
+        return bool(session.is_archived) and archive_reader.has_archive(session.id)
+    
+    def _session_results(self, session: ExamSession, **equals) -> list:
+        """Résultats publiés d'une session filtrés par égalité (base ou archive froide)"""
+        if self._is_cold(session):
+            return ArchiveService(self.db).session_results(session.id, **equals)
+        
+        names = tuple(sorted(equals))
+        query = statements.get("stats.session_results", lambda: select(ExamResult).where(
+            _published_in_session(), *[getattr(ExamResult, name) == bindparam(name) for name in names]
+        ), *names)
+        return self.db.execute(query, {"session_id": session.id, **equals}).scalars().all()
@@ -0,0 +1,129 @@
+from typing import List, Dict, Any, Optional
+from sqlalchemy.orm import Session
+from sqlalchemy import func, and_, case
+from models.database import ResultsRollup, RefEtablissement, RefWilaya, RefSerie
+from services.ranking_service import DECISIONS_ADMIS
+
+COMPARE_DIMENSIONS = {
+    "wilaya": ResultsRollup.wilaya_id,
+    "etablissement": ResultsRollup.etablissement_id,
+    "serie": ResultsRollup.serie_id,
+    "sexe": ResultsRollup.sexe
+}
+
+class TrendsService:
+    """Tendances et comparaisons pluriannuelles, calculées uniquement sur results_rollup"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def _measures(self):
+        return (
+            func.sum(ResultsRollup.total_candidats).label('candidats'),
+            func.sum(
+                case((ResultsRollup.decision.in_(DECISIONS_ADMIS), ResultsRollup.total_candidats), else_=0)
+            ).label('admis'),
+            func.sum(ResultsRollup.somme_moyennes).label('somme_moyennes'),
+            func.sum(ResultsRollup.total_notes).label('total_notes')
+        )
+
+    @staticmethod
+    def _year_stats(row) -> Dict[str, Any]:
+        candidats = int(row.candidats or 0)
+        admis = int(row.admis or 0)
+        return {
+            "candidats": candidats,
+            "admis": admis,
+            "taux_reussite": round(admis / candidats * 100, 2) if candidats else 0,
+            "moyenne": round(float(row.somme_moyennes) / row.total_notes, 2) if row.total_notes else None
+        }
+
+    def get_trends(self, exam_type: str, from_year: Optional[int] = None, to_year: Optional[int] = None,
+                   wilaya_id: Optional[int] = None, etablissement_id: Optional[int] = None,
+                   serie_id: Optional[int] = None, sexe: Optional[str] = None) -> Dict[str, Any]:
+        """Évolution annuelle des effectifs, du taux de réussite et de la moyenne"""
+
+        query = self.db.query(ResultsRollup.year, *self._measures()).filter(ResultsRollup.exam_type == exam_type)
+
+        if from_year:
+            query = query.filter(ResultsRollup.year >= from_year)
+        if to_year:
+            query = query.filter(ResultsRollup.year <= to_year)
+        if wilaya_id:
+            query = query.filter(ResultsRollup.wilaya_id == wilaya_id)
+        if etablissement_id:
+            query = query.filter(ResultsRollup.etablissement_id == etablissement_id)
+        if serie_id:
+            query = query.filter(ResultsRollup.serie_id == serie_id)
+        if sexe:
+            query = query.filter(ResultsRollup.sexe == sexe)
+
+        rows = query.group_by(ResultsRollup.year).order_by(ResultsRollup.year).all()
+
+        annees = []
+        previous = None
+        for row in rows:
+            stats = {"year": row.year, **self._year_stats(row)}
+            stats["evolution_taux"] = round(stats["taux_reussite"] - previous["taux_reussite"], 2) if previous else None
+            annees.append(stats)
+            previous = stats
+
+        return {
+            "exam_type": exam_type,
+            "filtres": {
+                "wilaya_id": wilaya_id,
+                "etablissement_id": etablissement_id,
+                "serie_id": serie_id,
+                "sexe": sexe
+            },
+            "annees": annees
+        }
+
+    def compare_years(self, exam_type: str, years: List[int], group_by: str = "wilaya") -> Dict[str, Any]:
+        """Compare plusieurs années, dimension par dimension (wilaya, établissement, série, sexe)"""
+
+        if group_by not in COMPARE_DIMENSIONS:
+            raise ValueError(f"Dimension inconnue: {group_by}. Valeurs possibles: {', '.join(COMPARE_DIMENSIONS)}")
+
+        dimension = COMPARE_DIMENSIONS[group_by]
+        years = sorted(set(years))
+
+        rows = self.db.query(
+            dimension.label('group_id'), ResultsRollup.year, *self._measures()
+        ).filter(
+            and_(
+                ResultsRollup.exam_type == exam_type,
+                ResultsRollup.year.in_(years),
+                dimension.isnot(None)
+            )
+        ).group_by(dimension, ResultsRollup.year).all()
+
+        groups: Dict[Any, Dict[str, Any]] = {}
+        for row in rows:
+            group = groups.setdefault(row.group_id, {"group_id": row.group_id, "annees": {}})
+            group["annees"][row.year] = self._year_stats(row)
+
+        names = self._group_names(group_by, list(groups))
+        for group in groups.values():
+            group["nom"] = names.get(group["group_id"])
+            present = [y for y in years if y in group["annees"]]
+            if len(present) >= 2:
+                first, last = group["annees"][present[0]], group["annees"][present[-1]]
+                group["evolution_taux"] = round(last["taux_reussite"] - first["taux_reussite"], 2)
+            else:
+                group["evolution_taux"] = None
+
+        return {
+            "exam_type": exam_type,
+            "years": years,
+            "group_by": group_by,
+            "groupes": sorted(groups.values(), key=lambda g: str(g["nom"] or g["group_id"]))
+        }
+
+    def _group_names(self, group_by: str, group_ids: List[Any]) -> Dict[Any, str]:
+        if group_by == "sexe":
+            return {"M": "Masculin", "F": "Féminin"}
+
+        model = {"wilaya": RefWilaya, "etablissement": RefEtablissement, "serie": RefSerie}[group_by]
+        rows = self.db.query(model.id, model.name_fr).filter(model.id.in_(group_ids)).all()
+        return {row.id: row.name_fr for row in rows}
@@ -1,13 +1,29 @@
-import pandas as pd
 import uuid
-from typing import List, Dict, Any, Tuple, Optional
+from typing import TYPE_CHECKING, List, Dict, Any, Tuple, Optional
 from sqlalchemy.orm import Session
 from sqlalchemy import and_
 from fastapi import UploadFile
 from models.database import ExamResult, ExamSession, RefEtablissement, RefWilaya, RefSerie
 from models.schemas import BulkUploadResponse, BulkUploadStatus
+from services.publication_service import schedule_refresh
+from services.leaderboard_service import LeaderboardService
+from core.metrics import metrics
+from config import settings
 import asyncio
 import json
+import logging
+import time
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Champs d'un résultat qui influencent les leaderboards
+LEADERBOARD_FIELDS = (
+    "is_published", "decision", "moyenne_generale", "nom_complet_fr",
+    "wilaya_id", "serie_id", "etablissement_id"
+)
 
 class UploadService:
     
@@ -26,6 +42,9 @@ class UploadService:
         # Lire le fichier
         content = await file.read()
         
+        # Import différé : pandas (et openpyxl) ne sont chargés que par les processus qui reçoivent un upload
+        import pandas as pd
+
         # Déterminer le type de fichier et lire les données
         if file.filename.endswith('.csv'):
             df = pd.read_csv(pd.io.common.StringIO(content.decode('utf-8')))
@@ -49,7 +68,7 @@ class UploadService:
         )
         
         # Lancer le traitement en arrière-plan
-        print(f"Lancement traitement pour tâche {task_id} avec session_id {session_id}")
+        logger.info("Lancement traitement pour tâche %s avec session_id %s", task_id, session_id)
         asyncio.create_task(self._process_upload_async(task_id, df, session_id))
         
         return BulkUploadResponse(
@@ -58,11 +77,12 @@ class UploadService:
             total_rows=total_rows
         )
     
-    async def _process_upload_async(self, task_id: str, df: pd.DataFrame, session_id: int):
+    async def _process_upload_async(self, task_id: str, df: "pd.DataFrame", session_id: int):
         """Traite l'upload de manière asynchrone"""
         
         task_status = UploadService._upload_tasks[task_id]
         task_status.status = "processing"
+        started = time.perf_counter()
         
         try:
             # Vérifier que la session existe
@@ -77,10 +97,14 @@ class UploadService:
             wilayas_cache = {w.code: w.id for w in self.db.query(RefWilaya).all()}
             series_cache = {s.code: s.id for s in self.db.query(RefSerie).all()}
             
+            # Leaderboards mis à jour au fil de l'ingestion, lot par lot une fois le lot validé
+            leaderboards = LeaderboardService(self.db)
+            pending = []  # (id, valeurs, valeurs précédentes) du lot en cours
+            
             success_count = 0
             error_count = 0
             
-            print(f"Début traitement {len(df)} lignes pour la tâche {task_id}")
+            logger.info("Début traitement %d lignes pour la tâche %s", len(df), task_id)
             
             for index, row in df.iterrows():
                 try:
@@ -98,27 +122,30 @@ class UploadService:
                         
                         if existing:
                             # Mettre à jour
+                            previous = {key: getattr(existing, key) for key in LEADERBOARD_FIELDS}
                             for key, value in result_data.items():
                                 setattr(existing, key, value)
-                            print(f"Ligne {index + 1}: Mise à jour NNI {result_data['nni']}")
+                            pending.append((existing.id, result_data, previous))
+                            logger.debug("Ligne %d: Mise à jour NNI %s", index + 1, result_data["nni"])
                         else:
                             # Créer nouveau
-                            result = ExamResult(**result_data)
+                            result = ExamResult(id=uuid.uuid4(), **result_data)
                             self.db.add(result)
-                            print(f"Ligne {index + 1}: Ajout NNI {result_data['nni']}")
+                            pending.append((result.id, result_data, None))
+                            logger.debug("Ligne %d: Ajout NNI %s", index + 1, result_data["nni"])
                         
                         success_count += 1
                     else:
                         error_count += 1
                         error_msg = f"Ligne {index + 2}: Données invalides"
                         task_status.errors.append(error_msg)
-                        print(error_msg)
+                        logger.debug(error_msg)
                     
                 except Exception as e:
                     error_count += 1
                     error_msg = f"Ligne {index + 2}: {str(e)}"
                     task_status.errors.append(error_msg)
-                    print(f"Erreur: {error_msg}")
+                    logger.debug("Erreur: %s", error_msg)
                 
                 # Mettre à jour le progrès
                 task_status.processed_rows = index + 1
@@ -126,39 +153,64 @@ class UploadService:
                 task_status.error_count = error_count
                 task_status.progress = int((index + 1) / len(df) * 100)
                 
+                if (index + 1) % settings.upload_progress_log_every == 0:
+                    logger.info(
+                        "Tâche %s: %d/%d lignes (%d succès, %d erreurs)",
+                        task_id, index + 1, len(df), success_count, error_count
+                    )
+                
                 # Commit par batches pour la performance
                 if (index + 1) % 100 == 0:
                     try:
                         self.db.commit()
-                        print(f"Commit batch à la ligne {index + 1}")
+                        logger.debug("Commit batch à la ligne %d", index + 1)
                     except Exception as e:
-                        print(f"Erreur commit batch: {e}")
+                        logger.error("Erreur commit batch: %s", e)
                         self.db.rollback()
+                        pending = []  # Lot annulé : rien à reporter sur les tableaux
+                    await self._record_leaderboards(leaderboards, session_id, pending)
+                    pending = []
             
             # Commit final
             try:
                 self.db.commit()
-                print(f"Commit final - {success_count} succès, {error_count} erreurs")
+                metrics.record_upload(success_count, error_count, time.perf_counter() - started)
+                logger.info("Commit final - %d succès, %d erreurs", success_count, error_count)
             except Exception as e:
-                print(f"Erreur commit final: {e}")
+                logger.error("Erreur commit final: %s", e)
                 self.db.rollback()
                 task_status.status = "failed"
                 task_status.errors.append(f"Erreur lors du commit final: {str(e)}")
                 return
+            await self._record_leaderboards(leaderboards, session_id, pending)
+            
+            # Classements et données dérivées recalculés en tâche de fond, avec sa propre session et
+            # à la suite d'un recalcul déjà en cours pour la session (publication simultanée)
+            schedule_refresh(session_id)
             
             # Finaliser le statut
             task_status.status = "completed"
             task_status.progress = 100
-            print(f"Traitement terminé pour la tâche {task_id}")
+            logger.info("Traitement terminé pour la tâche %s", task_id)
             
         except Exception as e:
-            print(f"Erreur globale dans _process_upload_async: {e}")
+            logger.exception("Erreur globale dans _process_upload_async: %s", e)
             task_status.status = "failed"
             task_status.errors.append(f"Erreur globale: {str(e)}")
             self.db.rollback()
     
-    def _validate_and_map_row(self, row: pd.Series, session_id: int, etablissements_cache: Dict, wilayas_cache: Dict, series_cache: Dict) -> Dict[str, Any]:
+    @staticmethod
+    async def _record_leaderboards(leaderboards: LeaderboardService, session_id: int, committed: List[tuple]):
+        """Reporte sur les leaderboards les lignes d'un lot validé ; un échec n'interrompt pas l'upload
+        (les tableaux sont reconstruits par le recalcul de fin d'upload)"""
+        try:
+            await leaderboards.record_results(session_id, committed)
+        except Exception as e:
+            logger.warning("Leaderboards non mis à jour pour la session %s: %s", session_id, e)
+    
+    def _validate_and_map_row(self, row: "pd.Series", session_id: int, etablissements_cache: Dict, wilayas_cache: Dict, series_cache: Dict) -> Dict[str, Any]:
         """Valide et mappe une ligne du fichier vers un ExamResult"""
+        import pandas as pd
         
         # Mapping des colonnes selon le format mauritanien
         # (basé sur les exemples fournis dans la demande)
@@ -238,5 +290,5 @@ class UploadService:
     
     def get_upload_status(self, task_id: str) -> Optional[BulkUploadStatus]:
         """Récupère le statut d'un upload"""
-        print(f"Recherche tâche {task_id}, tâches disponibles: {list(UploadService._upload_tasks.keys())}")
+        logger.debug("Recherche tâche %s, tâches disponibles: %s", task_id, list(UploadService._upload_tasks))
         return UploadService._upload_tasks.get(task_id)
\ No newline at end of file
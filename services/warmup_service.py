@@ -0,0 +1,250 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from models.database import ExamSession, ResultsRollup, RefWilaya
+from models.schemas import StatsWilaya, StatsEtablissement
+from core.cache import cache_manager
+from core.coalescing import serialize_json
+from core.response_store import response_store
+from database import SessionLocal, engine
+from services.stats_service import StatsService
+from services.reference_service import ReferenceService
+from config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+# (libellé, calcul en base exécuté dans un thread, écriture du résultat dans le cache)
+WarmupJob = Tuple[str, Callable[[Session], Any], Callable[[Any], Awaitable]]
+
+# Verrou consultatif PostgreSQL : un seul processus préchauffe les sessions publiées au démarrage
+WARMUP_LOCK_KEY = 73_110_038
+
+# Références des préchauffages en cours (une tâche sans référence peut être collectée)
+_background: Set[asyncio.Task] = set()
+
+def warm_in_background(session_id: Optional[int] = None) -> asyncio.Task:
+    """Préchauffe une session (ou toutes les sessions publiées) en tâche de fond, avec sa propre
+    session SQLAlchemy : l'appelant n'attend pas la fin du préchauffage"""
+    async def run():
+        db = SessionLocal()
+        try:
+            service = WarmupService(db)
+            if session_id is None:
+                await service.warm_published()
+            else:
+                await service.warm_session(session_id)
+        except Exception as e:
+            logger.error(f"Préchauffage interrompu ({session_id or 'sessions publiées'}): {e}")
+        finally:
+            db.close()
+
+    task = asyncio.create_task(run())
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+    return task
+
+def _run_job(compute: Callable[[Session], Any]) -> Any:
+    # Une session SQLAlchemy par calcul : les threads ne partagent pas de connexion
+    db = SessionLocal()
+    try:
+        return compute(db)
+    finally:
+        db.close()
+
+class WarmupService:
+    """Préchauffage des caches : les pages les plus demandées à l'ouverture des résultats sont
+    calculées d'avance, avec un nombre borné de calculs simultanés pour ménager la base"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    async def warm_session(self, session_id: int, references: bool = True) -> Optional[Dict[str, Any]]:
+        """Stats globales, pages wilaya et établissement, tops et listes de référence d'une session publiée"""
+        # Lecture de la session, des pages persistées et des entités : hors de la boucle d'événements
+        plan = await asyncio.get_running_loop().run_in_executor(None, self._plan, session_id, references)
+        if plan is None:
+            return None
+        session, existing, jobs = plan
+        report = await self._run(f"session {session.exam_type} {session.year}", jobs)
+
+        # Les tops sont servis par les leaderboards (construits au besoin) ; instantané des tops par défaut
+        stats = StatsService(self.db)
+        params = {"year": session.year, "exam_type": session.exam_type, "limit": 10}
+        if response_store.snapshot_key("/stats/top-students", params) not in existing:
+            top_students = {"top_students": await stats.get_top_students(session.year, session.exam_type, 10)}
+            await self._snapshot(session, "/stats/top-students", params, top_students)
+        if response_store.snapshot_key("/stats/top-schools", params) not in existing:
+            top_schools = {"top_schools": await stats.get_top_schools(session.year, session.exam_type, 10)}
+            await self._snapshot(session, "/stats/top-schools", params, top_schools)
+        return report
+
+    async def warm_published(self) -> List[Dict[str, Any]]:
+        """Préchauffe toutes les sessions publiées (démarrage de l'application). Un seul processus à la
+        fois : celui qui obtient le verrou préchauffe, les autres passent. Un processus démarré après
+        reprend le verrou mais ne calcule que les pages absentes de la génération courante"""
+        loop = asyncio.get_running_loop()
+        connection = await loop.run_in_executor(None, engine.connect)
+        try:
+            locked = await loop.run_in_executor(None, self._advisory_lock, connection, "pg_try_advisory_lock")
+            if not locked:
+                logger.info("Préchauffage déjà en cours dans un autre processus")
+                return []
+            try:
+                return await self._warm_all()
+            finally:
+                await loop.run_in_executor(None, self._advisory_lock, connection, "pg_advisory_unlock")
+        finally:
+            await loop.run_in_executor(None, connection.close)
+
+    @staticmethod
+    def _advisory_lock(connection, function: str) -> bool:
+        return connection.execute(text(f"SELECT {function}(:key)"), {"key": WARMUP_LOCK_KEY}).scalar()
+
+    def _published_sessions(self) -> List[int]:
+        rows = self.db.query(ExamSession.id).filter(ExamSession.is_published == True).order_by(
+            ExamSession.year.desc(), ExamSession.exam_type
+        ).all()
+        return [session_id for (session_id,) in rows]
+
+    def _plan(self, session_id: int, references: bool) -> Optional[Tuple[ExamSession, Set[str], List[WarmupJob]]]:
+        """Session, pages déjà persistées et calculs restants (exécuté dans un thread)"""
+        session = self.db.query(ExamSession).filter(ExamSession.id == session_id).first()
+        if not session or not session.is_published:
+            return None
+
+        # Pages déjà persistées pour cette génération (préchauffage précédent, autre worker) : sautées
+        existing = self._persisted(session)
+        jobs = self._reference_jobs(session.exam_type) if references else []
+        jobs += self._session_jobs(session, existing)
+        return session, existing, jobs
+
+    async def _warm_all(self) -> List[Dict[str, Any]]:
+        sessions = await asyncio.get_running_loop().run_in_executor(None, self._published_sessions)
+
+        reports = []
+        for session_id in sessions:
+            try:
+                # Listes de référence préchauffées une seule fois
+                report = await self.warm_session(session_id, references=not reports)
+            except Exception as e:
+                logger.error(f"Préchauffage impossible pour la session {session_id}: {e}")
+                continue
+            if report:
+                reports.append(report)
+        return reports
+
+    def _persisted(self, session: ExamSession) -> Set[str]:
+        if not settings.response_store_enabled:
+            return set()
+        return response_store.persisted_keys(self.db, session.id, session.data_version)
+
+    def _reference_jobs(self, exam_type: str) -> List[WarmupJob]:
+        def store(name: str, params: dict):
+            return lambda data: cache_manager.cache_references(name, params, data)
+
+        no_filter = {"wilaya_id": None, "type_etablissement": None}
+        jobs = [
+            ("references:wilayas", lambda db: ReferenceService(db).list_wilayas(), store("wilayas", {})),
+            ("references:series", lambda db: ReferenceService(db).list_series(), store("series", {"exam_type": None})),
+            (f"references:series:{exam_type}", lambda db: ReferenceService(db).list_series(exam_type),
+             store("series", {"exam_type": exam_type})),
+            ("references:etablissements", lambda db: ReferenceService(db).list_etablissements(),
+             store("etablissements", no_filter)),
+        ]
+        for (wilaya_id,) in self.db.query(RefWilaya.id).order_by(RefWilaya.id).all():
+            jobs.append((
+                f"references:etablissements:{wilaya_id}",
+                lambda db, w=wilaya_id: ReferenceService(db).list_etablissements(w),
+                store("etablissements", {"wilaya_id": wilaya_id, "type_etablissement": None})
+            ))
+        return jobs
+
+    def _session_jobs(self, session: ExamSession, existing: Set[str]) -> List[WarmupJob]:
+        year, exam_type, data_version = session.year, session.exam_type, session.data_version or 0
+
+        def persisted(route: str, params: dict) -> bool:
+            return response_store.snapshot_key(route, dict(params, year=year, exam_type=exam_type)) in existing
+
+        def store(stats_type: str, entity_id: int, route: str, params: dict, model=None):
+            # Cache des services + instantané de la réponse HTTP correspondante
+            async def save(data):
+                await cache_manager.cache_stats(stats_type, entity_id, year, exam_type, data_version, data)
+                await self._snapshot(session, route, dict(params, year=year, exam_type=exam_type),
+                                     model(**data) if model else data)
+            return save
+
+        jobs = []
+        if not persisted("/stats/global", {}):
+            jobs.append((
+                "global", lambda db: StatsService(db).compute_global_stats(year, exam_type),
+                store("global", 0, "/stats/global", {})
+            ))
+
+        # Entités présentes dans la session : lues dans les agrégats plutôt que dans exam_results
+        wilaya_ids = self.db.query(ResultsRollup.wilaya_id).filter(
+            ResultsRollup.session_id == session.id, ResultsRollup.wilaya_id.isnot(None)
+        ).distinct().order_by(ResultsRollup.wilaya_id).all()
+        for (wilaya_id,) in wilaya_ids:
+            if persisted("/stats/wilaya/{wilaya_id}", {"wilaya_id": wilaya_id}):
+                continue
+            jobs.append((
+                f"wilaya:{wilaya_id}",
+                lambda db, w=wilaya_id: StatsService(db).compute_wilaya_stats(w, year, exam_type),
+                store("wilaya", wilaya_id, "/stats/wilaya/{wilaya_id}", {"wilaya_id": wilaya_id}, StatsWilaya)
+            ))
+
+        etablissement_ids = self.db.query(ResultsRollup.etablissement_id).filter(
+            ResultsRollup.session_id == session.id, ResultsRollup.etablissement_id.isnot(None)
+        ).distinct().order_by(ResultsRollup.etablissement_id).all()
+        for (etablissement_id,) in etablissement_ids:
+            if persisted("/stats/etablissement/{etablissement_id}", {"etablissement_id": etablissement_id}):
+                continue
+            jobs.append((
+                f"etablissement:{etablissement_id}",
+                lambda db, e=etablissement_id: StatsService(db).compute_etablissement_stats(e, year, exam_type),
+                store("etablissement", etablissement_id, "/stats/etablissement/{etablissement_id}",
+                      {"etablissement_id": etablissement_id}, StatsEtablissement)
+            ))
+        return jobs
+
+    @staticmethod
+    async def _snapshot(session: ExamSession, route: str, params: dict, payload: Any):
+        if settings.response_store_enabled:
+            key = response_store.snapshot_key(route, params)
+            # Remplace un instantané calculé par une requête depuis le changement de génération
+            await response_store.put(session.id, session.data_version, key, serialize_json(payload), replace=True)
+
+    async def _run(self, label: str, jobs: List[WarmupJob]) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        total = len(jobs)
+        progress = {"done": 0, "failed": 0}
+        log_every = max(25, total // 10)
+
+        async def run(name: str, compute, store):
+            try:
+                data = await loop.run_in_executor(pool, _run_job, compute)
+                if data:
+                    await store(data)
+            except Exception as e:
+                progress["failed"] += 1
+                logger.warning(f"Préchauffage {label}: échec de {name}: {e}")
+            progress["done"] += 1
+            if progress["done"] % log_every == 0 and progress["done"] < total:
+                logger.info(f"Préchauffage {label}: {progress['done']}/{total} entrées")
+
+        logger.info(f"Préchauffage {label}: {total} entrées, {settings.warmup_workers} workers")
+        # Le pool borne le nombre de calculs (et de connexions) simultanés
+        with ThreadPoolExecutor(max_workers=settings.warmup_workers, thread_name_prefix="warmup") as pool:
+            await asyncio.gather(*(run(*job) for job in jobs))
+
+        duration = time.perf_counter() - start
+        logger.info(
+            f"Préchauffage {label} terminé: {total - progress['failed']}/{total} entrées en {duration:.1f}s",
+            extra={"warmup": label, "entries": total, "failed": progress["failed"], "duration_s": round(duration, 2)}
+        )
+        return {"session": label, "entries": total, "failed": progress["failed"], "duration_s": round(duration, 2)}